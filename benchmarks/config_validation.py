@@ -0,0 +1,98 @@
+"""
+Benchmark validating challenge configs against the challenge schema
+
+Synthetic challenge configs are validated with
+:class:`~rcds.util.jsonschema.CompiledValidator` (which uses fastjsonschema if it
+is installed) and with
+:class:`~rcds.util.jsonschema.DefaultValidatingDraft7Validator` alone.
+
+Usage: ``poetry run python benchmarks/config_validation.py [--count N] [--runs N]``
+"""
+
+import argparse
+import copy
+import time
+from typing import Any, Dict, List
+
+import jsonschema  # type: ignore
+
+from rcds.challenge.config import get_config_schema
+from rcds.util.jsonschema import (
+    CompiledValidator,
+    DefaultValidatingDraft7Validator,
+    fastjsonschema,
+)
+
+
+def make_challenge_config(i: int) -> Dict[str, Any]:
+    config: Dict[str, Any] = {
+        "id": f"chall{i}",
+        "name": f"Challenge {i}",
+        "author": "someone",
+        "description": "A description. " * 20,
+        "category": "pwn",
+        "flag": "flag{abc}",
+        "provide": ["a.txt", {"file": "b", "as": "c"}],
+        "value": 500,
+    }
+    if i % 2 == 0:
+        config["containers"] = {
+            "main": {
+                "build": ".",
+                "ports": [1337],
+                "resources": {"limits": {"cpu": "100m", "memory": "100Mi"}},
+            },
+            "db": {"image": "postgres", "ports": [5432], "environment": {"A": "b"}},
+        }
+        config["expose"] = {"main": [{"target": 1337, "tcp": 31000 + i}]}
+    else:
+        config["flag"] = {"file": "flag.txt"}
+        config["containers"] = {
+            "web": {"build": {"context": ".", "args": {"X": "y"}}, "ports": [80]}
+        }
+        config["expose"] = {"web": [{"target": 80, "http": f"web{i}"}]}
+    return config
+
+
+def run(validator: Any, configs: List[Dict[str, Any]], runs: int) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        # Validating sets defaults on the configs
+        instances = copy.deepcopy(configs)
+        start = time.perf_counter()
+        for instance in instances:
+            assert validator.is_valid(instance)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    schema = get_config_schema(())
+    configs = [make_challenge_config(i) for i in range(args.count)]
+    if fastjsonschema is not None:
+        print(f"fastjsonschema version: {fastjsonschema.VERSION}")
+    else:
+        print("fastjsonschema is not installed")
+    for name, validator in [
+        ("CompiledValidator", CompiledValidator(schema)),
+        (
+            "DefaultValidatingDraft7Validator",
+            DefaultValidatingDraft7Validator(
+                schema=schema, format_checker=jsonschema.draft7_format_checker
+            ),
+        ),
+    ]:
+        best = run(validator, configs, args.runs)
+        print(
+            f"{name}: validate {args.count} configs in {best * 1000:.0f} ms"
+            f" (best of {args.runs})"
+        )
+
+
+if __name__ == "__main__":
+    main()
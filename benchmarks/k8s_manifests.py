@@ -0,0 +1,148 @@
+"""
+Benchmark generating manifests with the Kubernetes backend
+
+Manifests are generated for synthetic challenges with three containers each,
+both with the built-in manifest builders and with Jinja templates (the path
+used when the ``templates`` option is set). The templates are also rendered the
+way they were before they were compiled once per backend, through a Jinja
+overlay per challenge and per container, to give a baseline. Nothing is sent to
+a cluster.
+
+Usage: ``poetry run python benchmarks/k8s_manifests.py [--challenges N] [--runs N]``
+"""
+
+import argparse
+import copy
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List
+from unittest import mock
+
+import rcds
+from rcds.backends.k8s import backend as k8s
+from rcds.backends.k8s.manifests import AnyManifest
+from rcds.util.yaml import safe_load_all
+
+
+def make_challenge_config(i: int) -> Dict[str, Any]:
+    return {
+        "id": f"chall{i}",
+        "name": f"chall{i}",
+        "deployed": True,
+        "containers": {
+            "main": {
+                "image": f"registry.com/ns/chall{i}:abc",
+                "replicas": 1,
+                "ports": [1337, 8080],
+                "environment": {"FLAG": "flag{x}", "N": "1"},
+                "resources": {"limits": {"cpu": "100m", "memory": "150Mi"}},
+            },
+            "db": {"image": "postgres", "replicas": 1, "ports": [5432]},
+            "worker": {"image": "busybox", "replicas": 2},
+        },
+        "expose": {
+            "main": [
+                {"target": 1337, "tcp": 30000 + i},
+                {"target": 8080, "http": f"chall{i}"},
+            ]
+        },
+    }
+
+
+class OverlayContainerBackend(k8s.ContainerBackend):
+    """
+    Renders the templates through a Jinja overlay per challenge and per
+    container, as before they were compiled once per backend
+
+    Each overlay starts with an empty template cache, so every template is looked
+    up and compiled again for each render.
+    """
+
+    def _render_manifests(
+        self,
+        challenge: Dict[str, Any],
+        namespace: str,
+        containers: List[Dict[str, Any]],
+    ) -> List[AnyManifest]:
+        assert self._jinja_env is not None
+        manifests: List[AnyManifest] = []
+
+        def render_and_append(env: Any, template: str) -> None:
+            manifest = env.get_template(template).render().strip()
+            manifests.extend(x for x in safe_load_all(manifest) if x is not None)
+
+        challenge_env = self._jinja_env.overlay(auto_reload=True)
+        challenge_env.globals["challenge"] = challenge
+        challenge_env.globals["namespace"] = namespace
+        for template in k8s.CHALLENGE_TEMPLATES:
+            render_and_append(challenge_env, template)
+
+        for container in containers:
+            container_env = challenge_env.overlay()
+            container_env.globals["container"] = container
+            for template in k8s.CONTAINER_TEMPLATES:
+                render_and_append(container_env, template)
+
+        return manifests
+
+
+def make_backend(
+    root: Path, options: Dict[str, Any], cls: Any = k8s.ContainerBackend
+) -> k8s.ContainerBackend:
+    project = rcds.Project(root, docker_client=mock.Mock())
+    with mock.patch.object(k8s.config, "load_kube_config"):
+        return cls(project, options)
+
+
+def run(backend: k8s.ContainerBackend, challenges: int, runs: int) -> float:
+    configs = [make_challenge_config(i) for i in range(challenges)]
+    best = float("inf")
+    for _ in range(runs):
+        # Generating manifests modifies the challenge's expose config
+        stubs: List[Any] = [
+            SimpleNamespace(config=config) for config in copy.deepcopy(configs)
+        ]
+        start = time.perf_counter()
+        for challenge in stubs:
+            backend.gen_manifests_for_challenge(challenge)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--challenges", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    options = {
+        "domain": "example.com",
+        "annotations": {"ingress": {"a": "b"}, "service": {"c": "d"}},
+        "tolerations": [{"key": "k", "operator": "Exists"}],
+        "affinity": {"nodeAffinity": {}},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "rcds.yml").write_text(
+            "docker:\n  image:\n    prefix: registry.com/ns\n"
+        )
+        # An empty directory, so that the built-in templates are used
+        (root / "templates").mkdir()
+        template_options = dict(options, templates="templates")
+        for name, backend_options, cls in [
+            ("builders", options, k8s.ContainerBackend),
+            ("templates", template_options, k8s.ContainerBackend),
+            ("templates (baseline)", template_options, OverlayContainerBackend),
+        ]:
+            backend = make_backend(root, copy.deepcopy(backend_options), cls)
+            best = run(backend, args.challenges, args.runs)
+            print(
+                f"{name}: {args.challenges} challenges in {best * 1000:.0f} ms"
+                f" (best of {args.runs})"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark loading and dumping YAML with :mod:`rcds.util.yaml`
+
+Synthetic challenge configs are loaded, and the data given to the ``yaml``
+filter of the Kubernetes templates is dumped, both with :mod:`rcds.util.yaml`
+(which uses libyaml if PyYAML was built with it) and with PyYAML's pure-Python
+loader and dumper.
+
+Usage: ``poetry run python benchmarks/yaml_loader.py [--count N] [--runs N]``
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+import yaml
+
+from rcds.util import yaml as rcds_yaml
+
+
+def make_challenge_config(i: int) -> Dict[str, Any]:
+    return {
+        "name": f"Challenge {i}",
+        "author": ["someone", "someone else"],
+        "description": "A description, which is usually a few lines long.\n" * 5,
+        "flag": {"file": "flag.txt"},
+        "provide": ["./chall", {"file": "./libc.so.6", "as": "libc.so.6"}],
+        "containers": {
+            "main": {
+                "build": {"context": ".", "args": {"FLAG": f"flag{{{i}}}"}},
+                "ports": [1337],
+                "resources": {"limits": {"cpu": "100m", "memory": "150Mi"}},
+            },
+            "db": {"image": "postgres", "ports": [5432]},
+        },
+        "expose": {"main": [{"target": 1337, "tcp": 30000 + i}]},
+    }
+
+
+FILTER_DATA = {
+    "limits": {"cpu": "100m", "memory": "150Mi"},
+    "requests": {"cpu": "50m"},
+    "tolerations": [{"key": "k", "operator": "Exists", "effect": "NoSchedule"}] * 3,
+}
+
+
+def best_of(runs: int, fn: Callable[..., Any], *args: Any) -> float:
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=600)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    documents: List[str] = [
+        yaml.safe_dump(make_challenge_config(i)) for i in range(args.count)
+    ]
+    print(f"libyaml available: {rcds_yaml.HAS_LIBYAML}")
+    for name, load, dump in [
+        ("rcds.util.yaml", rcds_yaml.safe_load, rcds_yaml.safe_dump),
+        ("pure Python", yaml.safe_load, yaml.safe_dump),
+    ]:
+        load_time = best_of(args.runs, lambda f: [f(doc) for doc in documents], load)
+        dump_time = best_of(
+            args.runs, lambda f: [f(FILTER_DATA) for _ in range(args.count)], dump
+        )
+        print(
+            f"{name}: load {args.count} configs in {load_time * 1000:.0f} ms,"
+            f" dump {args.count} times in {dump_time * 1000:.0f} ms"
+            f" (best of {args.runs})"
+        )
+
+
+if __name__ == "__main__":
+    main()
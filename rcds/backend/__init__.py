@@ -2,4 +2,5 @@ from .backend import BackendBase  # noqa: F401
 from .backend import BackendContainerRuntime  # noqa: F401
 from .backend import BackendScoreboard  # noqa: F401
 from .backend import BackendsInfo  # noqa: F401
+from .backend import SyncError  # noqa: F401
 from .backend import load_backend_module  # noqa: F401
@@ -1,11 +1,34 @@
 from abc import ABC, abstractmethod
 from importlib import import_module
-from typing import TYPE_CHECKING, Any, Dict
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Optional
 
 if TYPE_CHECKING:
     import rcds
 
 
+class SyncError(RuntimeError):
+    """
+    Raised by a backend's ``commit`` when one or more parts of the deployment could
+    not be synced
+
+    Backends should sync as much as possible before raising it, so that one failure
+    does not hold up everything else.
+
+    :ivar errors: The error encountered for each part that failed, by name (for
+        example, a challenge ID)
+    """
+
+    errors: Dict[str, Exception]
+
+    def __init__(self, errors: Dict[str, Exception], kind: str = "challenges"):
+        """
+        :param errors: The error encountered for each part that failed
+        :param str kind: What the names in ``errors`` identify, for the message
+        """
+        super().__init__(f"Failed to sync {kind}: " + ", ".join(sorted(errors.keys())))
+        self.errors = errors
+
+
 class BackendBase(ABC):
     def patch_challenge_schema(self, schema: Dict[str, Any]):
         pass
@@ -13,13 +36,25 @@ class BackendBase(ABC):
 
 class BackendScoreboard(BackendBase):
     @abstractmethod
-    def commit(self) -> bool:
+    def commit(self, challenges: Optional[Iterable["rcds.Challenge"]] = None) -> bool:
+        """
+        Sync the project's challenges to the scoreboard
+
+        :param challenges: (Optional) only sync these challenges. Other challenges in
+            the project must be left as they are, and not be deleted.
+        """
         raise NotImplementedError()
 
 
 class BackendContainerRuntime(BackendBase):
     @abstractmethod
-    def commit(self) -> bool:
+    def commit(self, challenges: Optional[Iterable["rcds.Challenge"]] = None) -> bool:
+        """
+        Sync the project's challenges to the container runtime
+
+        :param challenges: (Optional) only sync these challenges. Other challenges in
+            the project must be left as they are, and not be deleted.
+        """
         raise NotImplementedError()
 
 
@@ -1,16 +1,23 @@
 import itertools
 from pathlib import Path
-from typing import Any, Dict, List
-
-import yaml
-from jinja2 import Environment, Template
+from typing import Any, Dict, Iterable, List, Optional, Set, cast
+
+from jinja2 import (
+    BaseLoader,
+    ChoiceLoader,
+    Environment,
+    FileSystemLoader,
+    Template,
+)
 from kubernetes import config  # type: ignore
 
 import rcds
 import rcds.backend
 from rcds.util import load_any
 from rcds.util.jsonschema import DefaultValidatingDraft7Validator
+from rcds.util.yaml import safe_load_all
 
+from . import builders
 from .jinja import jinja_env
 from .manifests import AnyManifest, sync_manifests
 
@@ -19,11 +26,16 @@ options_schema_validator = DefaultValidatingDraft7Validator(
 )
 
 
+CHALLENGE_TEMPLATES = ["namespace.yaml", "network-policy.yaml"]
+CONTAINER_TEMPLATES = ["deployment.yaml", "service.yaml", "ingress.yaml"]
+
+
 class ContainerBackend(rcds.backend.BackendContainerRuntime):
     _project: rcds.Project
     _options: Dict[str, Any]
     _namespace_template: Template
-    _jinja_env: Environment
+    _jinja_env: Optional[Environment]
+    _templates: Optional[Dict[str, Template]]
 
     def __init__(self, project: rcds.Project, options: Dict[str, Any]):
         self._project = project
@@ -34,15 +46,44 @@ class ContainerBackend(rcds.backend.BackendContainerRuntime):
             raise ValueError("Invalid options")
 
         self._namespace_template = Template(self._options["namespaceTemplate"])
-        self._jinja_env = jinja_env.overlay()
-        self._jinja_env.globals["options"] = self._options
+        self._jinja_env = None
+        self._templates = None
+        if "templates" in self._options:
+            # Templates in the user's directory take precedence over the built-in
+            # ones
+            self._jinja_env = jinja_env.overlay(
+                loader=ChoiceLoader(
+                    [
+                        FileSystemLoader(
+                            str(self._project.root / self._options["templates"])
+                        ),
+                        cast(BaseLoader, jinja_env.loader),
+                    ]
+                )
+            )
+            self._jinja_env.globals["options"] = self._options
+            # Templates are compiled once here; per-challenge and per-container
+            # values are passed as variables when rendering
+            self._templates = {
+                name: self._jinja_env.get_template(name)
+                for name in CHALLENGE_TEMPLATES + CONTAINER_TEMPLATES
+            }
 
         config.load_kube_config(context=self._options.get("kubeContext", None))
 
-    def commit(self) -> bool:
-        deployed_challs = filter(
-            lambda c: c.config["deployed"], self._project.challenges.values()
-        )
+    def commit(self, challenges: Optional[Iterable[rcds.Challenge]] = None) -> bool:
+        keep_namespaces: Set[str] = set()
+        if challenges is None:
+            challenges = self._project.challenges.values()
+        else:
+            challenges = list(challenges)
+            # Leave the namespaces of all other deployed challenges alone
+            keep_namespaces = {
+                self.get_namespace_for_challenge(chall)
+                for chall in self._project.challenges.values()
+                if chall.config["deployed"] and chall not in challenges
+            }
+        deployed_challs = filter(lambda c: c.config["deployed"], challenges)
         # TODO: auto assignment of expose params
         manifests = list(
             itertools.chain.from_iterable(
@@ -52,7 +93,12 @@ class ContainerBackend(rcds.backend.BackendContainerRuntime):
                 )
             )
         )
-        sync_manifests(manifests)
+        sync_manifests(
+            manifests,
+            concurrency=self._options["concurrency"],
+            use_server_side_apply=self._options["serverSideApply"],
+            keep_namespaces=keep_namespaces,
+        )
         return True
 
     def get_namespace_for_challenge(self, challenge: rcds.Challenge) -> str:
@@ -64,19 +110,8 @@ class ContainerBackend(rcds.backend.BackendContainerRuntime):
         if "containers" not in challenge.config:
             return []
 
-        manifests: List[Dict[str, Any]] = []
-
-        def render_and_append(env: Environment, template: str) -> None:
-            nonlocal manifests
-            manifest = env.get_template(template).render().strip()
-            manifests += filter(lambda x: x is not None, yaml.safe_load_all(manifest))
-
-        challenge_env: Environment = self._jinja_env.overlay()
-        challenge_env.globals["challenge"] = challenge.config
-        challenge_env.globals["namespace"] = self.get_namespace_for_challenge(challenge)
-
-        render_and_append(challenge_env, "namespace.yaml")
-        render_and_append(challenge_env, "network-policy.yaml")
+        namespace = self.get_namespace_for_challenge(challenge)
+        containers: List[Dict[str, Any]] = []
 
         for container_name, container_config in challenge.config["containers"].items():
             expose_config = challenge.config.get("expose", dict()).get(
@@ -95,17 +130,64 @@ class ContainerBackend(rcds.backend.BackendContainerRuntime):
                     if "tcp" in expose_port:
                         expose_port["host"] = self._options["domain"]
 
-            container_env: Environment = challenge_env.overlay()
-            container_env.globals["container"] = {
+            container: Dict[str, Any] = {
                 "name": container_name,
                 "config": container_config,
             }
             if expose_config is not None:
-                container_env.globals["container"]["expose"] = expose_config
+                container["expose"] = expose_config
+            containers.append(container)
+
+        if self._templates is not None:
+            return self._render_manifests(challenge.config, namespace, containers)
+        return self._build_manifests(challenge.config, namespace, containers)
+
+    def _build_manifests(
+        self,
+        challenge: Dict[str, Any],
+        namespace: str,
+        containers: List[Dict[str, Any]],
+    ) -> List[AnyManifest]:
+        manifests: List[Optional[AnyManifest]] = [
+            builders.build_namespace(challenge, namespace),
+            builders.build_network_policy(challenge, namespace),
+        ]
+        for container in containers:
+            for build in (
+                builders.build_deployment,
+                builders.build_service,
+                builders.build_ingress,
+            ):
+                manifests.append(build(challenge, namespace, container, self._options))
+        return [manifest for manifest in manifests if manifest is not None]
+
+    def _render_manifests(
+        self,
+        challenge: Dict[str, Any],
+        namespace: str,
+        containers: List[Dict[str, Any]],
+    ) -> List[AnyManifest]:
+        assert self._templates is not None
+        manifests: List[AnyManifest] = []
 
-            render_and_append(container_env, "deployment.yaml")
-            render_and_append(container_env, "service.yaml")
-            render_and_append(container_env, "ingress.yaml")
+        def render_and_append(template: str, context: Dict[str, Any]) -> None:
+            nonlocal manifests
+            assert self._templates is not None
+            manifest = self._templates[template].render(context).strip()
+            manifests += filter(lambda x: x is not None, safe_load_all(manifest))
+
+        challenge_context: Dict[str, Any] = {
+            "challenge": challenge,
+            "namespace": namespace,
+        }
+
+        for template in CHALLENGE_TEMPLATES:
+            render_and_append(template, challenge_context)
+
+        for container in containers:
+            container_context = dict(challenge_context, container=container)
+            for template in CONTAINER_TEMPLATES:
+                render_and_append(template, container_context)
 
         return manifests
 
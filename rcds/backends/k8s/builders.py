@@ -0,0 +1,226 @@
+"""
+Native builders for the manifests that the k8s backend creates
+
+Each builder produces the same objects as the corresponding template under
+``templates/``, without rendering and re-parsing YAML.
+"""
+
+from copy import deepcopy
+from typing import Any, Dict, List, Optional
+
+from .manifests import AnyManifest
+
+
+def common_labels(challenge: Dict[str, Any]) -> Dict[str, str]:
+    return {
+        "app.kubernetes.io/managed-by": "rcds",
+        "rcds.redpwn.net/challenge-id": str(challenge["id"]),
+    }
+
+
+def container_labels(container: Dict[str, Any]) -> Dict[str, str]:
+    # The templates label a container as public whenever ``container.expose is
+    # not none``, which also holds when ``expose`` is undefined; every container
+    # is therefore labelled public. This is kept so that the selectors of
+    # existing deployments do not change.
+    return {
+        "rcds.redpwn.net/container-name": str(container["name"]),
+        "rcds.redpwn.net/visibility": "public",
+    }
+
+
+def pod_labels(challenge: Dict[str, Any], container: Dict[str, Any]) -> Dict[str, str]:
+    return {**common_labels(challenge), **container_labels(container)}
+
+
+def build_namespace(challenge: Dict[str, Any], namespace: str) -> AnyManifest:
+    return {
+        "apiVersion": "v1",
+        "kind": "Namespace",
+        "metadata": {
+            "name": namespace,
+            "labels": {"name": namespace, **common_labels(challenge)},
+        },
+    }
+
+
+def build_network_policy(challenge: Dict[str, Any], namespace: str) -> AnyManifest:
+    return {
+        "apiVersion": "networking.k8s.io/v1",
+        "kind": "NetworkPolicy",
+        "metadata": {
+            "namespace": namespace,
+            "name": "network-policy-private",
+            "labels": common_labels(challenge),
+        },
+        "spec": {
+            "podSelector": {
+                "matchLabels": {
+                    **common_labels(challenge),
+                    "rcds.redpwn.net/visibility": "private",
+                }
+            },
+            "policyTypes": ["Ingress", "Egress"],
+            "ingress": [
+                {
+                    "from": [
+                        {"namespaceSelector": {"matchLabels": common_labels(challenge)}}
+                    ]
+                }
+            ],
+            "egress": [
+                {
+                    "to": [
+                        {"namespaceSelector": {"matchLabels": common_labels(challenge)}}
+                    ]
+                }
+            ],
+        },
+    }
+
+
+def build_deployment(
+    challenge: Dict[str, Any],
+    namespace: str,
+    container: Dict[str, Any],
+    options: Dict[str, Any],
+) -> AnyManifest:
+    config = container["config"]
+    container_spec: Dict[str, Any] = {
+        "name": container["name"],
+        "image": config["image"],
+    }
+    if config.get("ports"):
+        container_spec["ports"] = [
+            {"containerPort": port, "name": f"port-{port}"} for port in config["ports"]
+        ]
+    if config.get("environment"):
+        container_spec["env"] = [
+            {"name": name, "value": str(value)}
+            for name, value in config["environment"].items()
+        ]
+    if config.get("resources"):
+        container_spec["resources"] = deepcopy(config["resources"])
+
+    pod_spec: Dict[str, Any] = {
+        "containers": [container_spec],
+        "automountServiceAccountToken": False,
+    }
+    if options.get("tolerations"):
+        pod_spec["tolerations"] = deepcopy(options["tolerations"])
+    if options.get("affinity"):
+        pod_spec["affinity"] = deepcopy(options["affinity"])
+
+    return {
+        "apiVersion": "apps/v1",
+        "kind": "Deployment",
+        "metadata": {
+            "namespace": namespace,
+            "name": container["name"],
+            "labels": pod_labels(challenge, container),
+        },
+        "spec": {
+            "replicas": config["replicas"],
+            "selector": {"matchLabels": pod_labels(challenge, container)},
+            "template": {
+                "metadata": {"labels": pod_labels(challenge, container)},
+                "spec": pod_spec,
+            },
+        },
+    }
+
+
+def _get_annotations(options: Dict[str, Any], kind: str) -> Optional[Dict[str, str]]:
+    annotations = options.get("annotations")
+    if not annotations or not annotations.get(kind):
+        return None
+    return dict(annotations[kind])
+
+
+def build_service(
+    challenge: Dict[str, Any],
+    namespace: str,
+    container: Dict[str, Any],
+    options: Dict[str, Any],
+) -> Optional[AnyManifest]:
+    config = container["config"]
+    if not config.get("ports"):
+        return None
+    expose: List[Dict[str, Any]] = container.get("expose") or []
+
+    metadata: Dict[str, Any] = {
+        "namespace": namespace,
+        "name": container["name"],
+        "labels": pod_labels(challenge, container),
+    }
+    annotations = _get_annotations(options, "service")
+    if annotations is not None:
+        metadata["annotations"] = annotations
+
+    ports: List[Dict[str, Any]] = []
+    for port in config["ports"]:
+        port_spec: Dict[str, Any] = {
+            "port": port,
+            "targetPort": port,
+            "name": f"port-{port}",
+        }
+        exposed_port = next((p for p in expose if p["target"] == port), None)
+        if exposed_port is not None and exposed_port.get("tcp"):
+            port_spec["nodePort"] = exposed_port["tcp"]
+        ports.append(port_spec)
+
+    return {
+        "apiVersion": "v1",
+        "kind": "Service",
+        "metadata": metadata,
+        "spec": {
+            "type": "NodePort" if any("tcp" in p for p in expose) else "ClusterIP",
+            "selector": pod_labels(challenge, container),
+            "ports": ports,
+        },
+    }
+
+
+def build_ingress(
+    challenge: Dict[str, Any],
+    namespace: str,
+    container: Dict[str, Any],
+    options: Dict[str, Any],
+) -> Optional[AnyManifest]:
+    http_ports = [p for p in container.get("expose") or [] if "http" in p]
+    if len(http_ports) == 0:
+        return None
+
+    metadata: Dict[str, Any] = {
+        "namespace": namespace,
+        "name": container["name"],
+        "labels": pod_labels(challenge, container),
+    }
+    annotations = _get_annotations(options, "ingress")
+    if annotations is not None:
+        metadata["annotations"] = annotations
+
+    return {
+        "apiVersion": "networking.k8s.io/v1beta1",
+        "kind": "Ingress",
+        "metadata": metadata,
+        "spec": {
+            "rules": [
+                {
+                    "host": http_port["http"],
+                    "http": {
+                        "paths": [
+                            {
+                                "path": "/",
+                                "backend": {
+                                    "serviceName": container["name"],
+                                    "servicePort": http_port["target"],
+                                },
+                            }
+                        ]
+                    },
+                }
+                for http_port in http_ports
+            ]
+        },
+    }
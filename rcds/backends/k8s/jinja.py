@@ -1,12 +1,14 @@
 from textwrap import dedent
 from typing import Any, Dict, Optional
 
-import yaml
 from jinja2 import Environment, PackageLoader, filters
 
+from rcds.util.yaml import safe_dump
+
 jinja_env = Environment(
     loader=PackageLoader("rcds.backends.k8s", "templates"),
     autoescape=False,
+    auto_reload=False,
     trim_blocks=True,
     lstrip_blocks=True,
 )
@@ -17,7 +19,7 @@ def jinja_filter_indent(data: str, *args, **kwargs) -> str:
 
 
 def jinja_filter_yaml(data: Dict[str, Any], indent: Optional[int] = None) -> str:
-    output = yaml.dump(data).strip()
+    output = safe_dump(data).strip()
     if indent is not None:
         output = jinja_filter_indent(output, indent)
     return output
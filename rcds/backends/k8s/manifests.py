@@ -1,8 +1,14 @@
+import hashlib
+import json
 import re
-from typing import Any, Callable, Dict, Iterable, List, Set
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, cast
 
 from kubernetes import client  # type: ignore
 
+from rcds.backend import SyncError
+
 AnyManifest = Dict[str, Any]
 
 
@@ -16,6 +22,10 @@ KIND_TO_API_VERISON = {
 }
 
 
+MANIFEST_HASH_ANNOTATION = "rcds.redpwn.net/manifest-hash"
+FIELD_MANAGER = "rcds"
+
+
 camel_case_to_snake_case_re = re.compile(r"(?=[A-Z])")
 
 
@@ -27,6 +37,15 @@ def get_api_method_for_kind(api_client: Any, method: str, kind: str) -> Callable
     return getattr(api_client, method + kind_to_api_method_postfix(kind))
 
 
+def get_list_all_method_for_kind(api_client: Any, kind: str) -> Callable:
+    return getattr(
+        api_client,
+        "list"
+        + camel_case_to_snake_case_re.sub("_", kind).lower()
+        + "_for_all_namespaces",
+    )
+
+
 def labels_to_label_selector(labels: Dict[str, str]) -> str:
     selector = ""
     for k, v in labels.items():
@@ -34,19 +53,246 @@ def labels_to_label_selector(labels: Dict[str, str]) -> str:
     return selector[:-1]
 
 
-def sync_manifests(all_manifests: Iterable[Dict[str, Any]]):
-    v1 = client.CoreV1Api()
-    appsv1 = client.AppsV1Api()
-    networkingv1 = client.NetworkingV1Api()
-    networkingv1beta1 = client.NetworkingV1beta1Api()
+def get_api_clients(*, server_side_apply: bool = False) -> Dict[str, Any]:
+    """
+    Get API clients for each API version that manifests may use
 
-    api_version_to_client = {
-        "v1": v1,
-        "apps/v1": appsv1,
-        "networking.k8s.io/v1": networkingv1,
-        "networking.k8s.io/v1beta1": networkingv1beta1,
+    :param bool server_side_apply: If true, the clients send all requests with the
+        server-side apply content type. Such clients should only be used for
+        applying objects (see :func:`server_side_apply`).
+    """
+    api_client = None
+    if server_side_apply:
+        api_client = client.ApiClient()
+        api_client.set_default_header("Content-Type", "application/apply-patch+yaml")
+    return {
+        "v1": client.CoreV1Api(api_client),
+        "apps/v1": client.AppsV1Api(api_client),
+        "networking.k8s.io/v1": client.NetworkingV1Api(api_client),
+        "networking.k8s.io/v1beta1": client.NetworkingV1beta1Api(api_client),
     }
 
+
+def server_side_apply(
+    api_client: Any, kind: str, namespace: str, manifest: Dict[str, Any]
+) -> None:
+    """
+    Create or update an object using server-side apply, as field manager
+    :const:`FIELD_MANAGER`
+
+    :param api_client: An API client from :func:`get_api_clients`, created with
+        ``server_side_apply=True``
+    :param str kind: The kind of the object
+    :param str namespace: The namespace of the object (for namespaces, its name)
+    :param manifest: The object's manifest
+    """
+    name = manifest["metadata"]["name"]
+    # JSON is valid YAML; pass it as a string so the client does not try to
+    # serialize it according to the content type
+    body = json.dumps(manifest)
+    if kind == "Namespace":
+        api_client.patch_namespace(name, body, field_manager=FIELD_MANAGER, force=True)
+    else:
+        get_api_method_for_kind(api_client, "patch", kind)(
+            name, namespace, body, field_manager=FIELD_MANAGER, force=True
+        )
+
+
+def _is_immutable_field_error(e: Exception) -> bool:
+    return (
+        isinstance(e, client.rest.ApiException)
+        and e.status == 422
+        and "immutable" in str(e.body)
+    )
+
+
+def get_manifest_hash(manifest: Dict[str, Any]) -> str:
+    """
+    Get a hash of a manifest's contents, ignoring any existing hash annotation
+    """
+    manifest = dict(manifest)
+    metadata = manifest["metadata"] = dict(manifest["metadata"])
+    if "annotations" in metadata:
+        annotations = metadata["annotations"] = dict(metadata["annotations"])
+        annotations.pop(MANIFEST_HASH_ANNOTATION, None)
+        if len(annotations) == 0:
+            del metadata["annotations"]
+    return hashlib.sha256(
+        json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _annotate_hash(manifest: Dict[str, Any]) -> str:
+    manifest_hash = get_manifest_hash(manifest)
+    manifest["metadata"].setdefault("annotations", dict())
+    manifest["metadata"]["annotations"][MANIFEST_HASH_ANNOTATION] = manifest_hash
+    return manifest_hash
+
+
+def _is_unchanged(server_obj: Optional[Any], manifest_hash: str) -> bool:
+    if server_obj is None:
+        return False
+    annotations = server_obj.metadata.annotations or dict()
+    return annotations.get(MANIFEST_HASH_ANNOTATION, None) == manifest_hash
+
+
+def _sync_namespace(
+    api_version_to_client: Dict[str, Any],
+    namespace_manifest: Dict[str, Any],
+    manifests_by_kind: Dict[str, List[Dict[str, Any]]],
+    server_namespace: Optional[Any],
+    server_objects_by_kind: Dict[str, Dict[str, Any]],
+    log: Callable[[str], None],
+    api_version_to_apply_client: Optional[Dict[str, Any]],
+) -> "Counter[str]":
+    v1 = api_version_to_client["v1"]
+    namespace = namespace_manifest["metadata"]["name"]
+    counts: "Counter[str]" = Counter()
+
+    # TODO: Potentially decouple this from the namespace's labels?
+    # Common labels for rCDS manifests in this namespace
+    ns_labels: Dict[str, str] = dict(namespace_manifest["metadata"]["labels"])
+    ns_labels.pop("name")
+
+    namespace_hash = _annotate_hash(namespace_manifest)
+    if _is_unchanged(server_namespace, namespace_hash):
+        counts["unchanged"] += 1
+    elif api_version_to_apply_client is not None:
+        log(f"APPLY Namespace {namespace}")
+        server_side_apply(
+            api_version_to_apply_client["v1"],
+            "Namespace",
+            namespace,
+            namespace_manifest,
+        )
+        counts["created" if server_namespace is None else "patched"] += 1
+    elif server_namespace is None:
+        # the namespace doesn't exist; create it
+        log(f"CREATE Namespace {namespace}")
+        v1.create_namespace(namespace_manifest)
+        counts["created"] += 1
+    else:
+        # the namespace already exists; patch it
+        log(f"PATCH Namespace {namespace}")
+        v1.patch_namespace(namespace, namespace_manifest)
+        counts["patched"] += 1
+
+    # Process all manifest kinds we know about in this namespace
+    for kind in MANIFEST_KINDS:
+        manifests = manifests_by_kind.get(kind, [])
+        server_manifests: Dict[str, Any] = {
+            name: obj
+            for name, obj in server_objects_by_kind.get(kind, dict()).items()
+            if all(
+                (obj.metadata.labels or dict()).get(k, None) == v
+                for k, v in ns_labels.items()
+            )
+        }
+        for manifest in manifests:
+            manifest_name = manifest["metadata"]["name"]
+            api = api_version_to_client[manifest["apiVersion"]]
+            manifest_hash = _annotate_hash(manifest)
+            server_manifest = server_manifests.pop(manifest_name, None)
+            if _is_unchanged(server_manifest, manifest_hash):
+                counts["unchanged"] += 1
+            elif api_version_to_apply_client is not None:
+                apply_api = api_version_to_apply_client[manifest["apiVersion"]]
+                log(f"APPLY {kind} {namespace}/{manifest_name}")
+                try:
+                    server_side_apply(apply_api, kind, namespace, manifest)
+                except client.rest.ApiException as e:
+                    if not _is_immutable_field_error(e):
+                        raise
+                    # An immutable field was changed; the object must be recreated
+                    log(f"DELETE {kind} {namespace}/{manifest_name}")
+                    get_api_method_for_kind(api, "delete", kind)(
+                        manifest_name, namespace
+                    )
+                    log(f"APPLY {kind} {namespace}/{manifest_name}")
+                    server_side_apply(apply_api, kind, namespace, manifest)
+                counts["created" if server_manifest is None else "patched"] += 1
+            elif server_manifest is None:
+                # the manifest doesn't exist; create it
+                log(f"CREATE {kind} {namespace}/{manifest_name}")
+                get_api_method_for_kind(api, "create", kind)(namespace, manifest)
+                counts["created"] += 1
+            else:
+                # the manifest already exists; patch it
+                log(f"PATCH {kind} {namespace}/{manifest_name}")
+                try:
+                    get_api_method_for_kind(api, "patch", kind)(
+                        manifest_name, namespace, manifest
+                    )
+                except client.rest.ApiException:
+                    # Conflict of some sort - let's just delete and recreate it
+                    log(f"DELETE {kind} {namespace}/{manifest_name}")
+                    get_api_method_for_kind(api, "delete", kind)(
+                        manifest_name, namespace
+                    )
+                    log(f"CREATE {kind} {namespace}/{manifest_name}")
+                    get_api_method_for_kind(api, "create", kind)(namespace, manifest)
+                counts["patched"] += 1
+        for manifest_name in server_manifests.keys():
+            log(f"DELETE {kind} {namespace}/{manifest_name}")
+            get_api_method_for_kind(
+                api_version_to_client[KIND_TO_API_VERISON[kind]], "delete", kind
+            )(manifest_name, namespace)
+            counts["deleted"] += 1
+
+    return counts
+
+
+def sync_manifests(
+    all_manifests: Iterable[Dict[str, Any]],
+    *,
+    concurrency: int = 1,
+    use_server_side_apply: bool = False,
+    api_version_to_client: Optional[Dict[str, Any]] = None,
+    api_version_to_apply_client: Optional[Dict[str, Any]] = None,
+    keep_namespaces: Iterable[str] = (),
+) -> "Counter[str]":
+    """
+    Sync manifests to the cluster, deleting any rCDS-managed objects which are not
+    present in ``all_manifests`` (except those within ``keep_namespaces``)
+
+    Existing objects are listed once per kind across all namespaces, rather than once
+    per kind per namespace. Namespaces are then synced in parallel. Output for each
+    namespace is printed in the order that the namespaces appear in
+    ``all_manifests``. If syncing a namespace fails, the remaining namespaces are
+    still synced, and a :class:`~rcds.backend.SyncError` is raised at the end.
+
+    Each object is annotated with a hash of its manifest
+    (:const:`MANIFEST_HASH_ANNOTATION`); objects whose hash matches the one on the
+    server are not patched.
+
+    By default, existing objects are updated with a strategic merge patch, and are
+    deleted and recreated if the patch fails for any reason. If
+    ``use_server_side_apply`` is set, objects are instead created and updated with a
+    single server-side apply (see :func:`server_side_apply`), and are only recreated
+    if the apply fails because an immutable field was changed.
+
+    :param all_manifests: The manifests to sync
+    :param int concurrency: The maximum number of namespaces to sync at once
+    :param bool use_server_side_apply: Whether to use server-side apply
+    :param api_version_to_client: (Optional) the API client to use for each API
+        version, defaults to :func:`get_api_clients`
+    :param api_version_to_apply_client: (Optional) the API client to use for each
+        API version for server-side apply, defaults to :func:`get_api_clients` with
+        ``server_side_apply=True``
+    :param keep_namespaces: Namespaces which have no manifests in
+        ``all_manifests``, but should be left as they are instead of being deleted
+    :returns: The number of objects ``created``, ``patched``, ``unchanged``, and
+        ``deleted``
+    :raises SyncError: if any namespace failed to sync
+    """
+    if api_version_to_client is None:
+        api_version_to_client = get_api_clients()
+    if not use_server_side_apply:
+        api_version_to_apply_client = None
+    elif api_version_to_apply_client is None:
+        api_version_to_apply_client = get_api_clients(server_side_apply=True)
+    v1 = api_version_to_client["v1"]
+
     manifests_by_namespace_kind: Dict[str, Dict[str, List[Dict[str, Any]]]] = dict()
     namespaces: List[Dict[str, Any]] = []
 
@@ -60,80 +306,63 @@ def sync_manifests(all_manifests: Iterable[Dict[str, Any]]):
             manifests_by_namespace_kind[namespace].setdefault(kind, [])
             manifests_by_namespace_kind[namespace][kind].append(manifest)
 
-    server_namespaces_names: Set[str] = set(
-        map(
-            lambda ns: ns.metadata.name,
-            v1.list_namespace(label_selector="app.kubernetes.io/managed-by=rcds").items,
-        )
-    )
+    server_namespaces: Dict[str, Any] = {
+        ns.metadata.name: ns
+        for ns in v1.list_namespace(
+            label_selector="app.kubernetes.io/managed-by=rcds"
+        ).items
+    }
+
+    # Snapshot of all rCDS-managed objects in the cluster, by kind, namespace, and name
+    server_objects: Dict[str, Dict[str, Dict[str, Any]]] = dict()
+    for kind in MANIFEST_KINDS:
+        for obj in get_list_all_method_for_kind(
+            api_version_to_client[KIND_TO_API_VERISON[kind]], kind
+        )(label_selector="app.kubernetes.io/managed-by=rcds").items:
+            server_objects.setdefault(obj.metadata.namespace, dict()).setdefault(
+                kind, dict()
+            )[obj.metadata.name] = obj
 
-    for namespace_manifest in namespaces:
-        namespace = namespace_manifest["metadata"]["name"]
-
-        try:
-            server_namespaces_names.remove(namespace)
-            # the namespace already exists; patch it
-            print(f"PATCH Namespace {namespace}")
-            v1.patch_namespace(namespace, namespace_manifest)
-        except KeyError:
-            # the namespace doesn't exist; create it
-            print(f"CREATE Namespace {namespace}")
-            v1.create_namespace(namespace_manifest)
-
-        # TODO: Potentially decouple this from the namespace's labels?
-        # Common labels for rCDS manifests in this namespace
-        ns_labels: Dict[str, str] = namespace_manifest["metadata"]["labels"]
-        ns_labels.pop("name")
-
-        # Process all manifest kinds we know about in this namespace
-        for kind in MANIFEST_KINDS:
-            manifests = manifests_by_namespace_kind[namespace].get(kind, [])
-            server_manifest_names: Set[str] = set(
-                map(
-                    lambda m: m.metadata.name,
-                    get_api_method_for_kind(
-                        api_version_to_client[KIND_TO_API_VERISON[kind]], "list", kind
-                    )(
-                        namespace, label_selector=labels_to_label_selector(ns_labels)
-                    ).items,
+    counts: "Counter[str]" = Counter(created=0, patched=0, unchanged=0, deleted=0)
+    outputs: List[List[str]] = [[] for _ in namespaces]
+    errors: Dict[str, Exception] = dict()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures: List["Future[Counter[str]]"] = []
+        for namespace_manifest, output in zip(namespaces, outputs):
+            namespace = namespace_manifest["metadata"]["name"]
+            futures.append(
+                executor.submit(
+                    _sync_namespace,
+                    api_version_to_client,
+                    namespace_manifest,
+                    manifests_by_namespace_kind.get(namespace, dict()),
+                    server_namespaces.pop(namespace, None),
+                    server_objects.get(namespace, dict()),
+                    output.append,
+                    api_version_to_apply_client,
                 )
             )
-            for manifest in manifests:
-                manifest_name = manifest["metadata"]["name"]
-                try:
-                    server_manifest_names.remove(manifest_name)
-                    # the manifest already exists; patch it
-                    print(f"PATCH {kind} {namespace}/{manifest_name}")
-                    try:
-                        get_api_method_for_kind(
-                            api_version_to_client[manifest["apiVersion"]], "patch", kind
-                        )(manifest_name, namespace, manifest)
-                    except client.rest.ApiException:
-                        # Conflict of some sort - let's just delete and recreate it
-                        print(f"DELETE {kind} {namespace}/{manifest_name}")
-                        get_api_method_for_kind(
-                            api_version_to_client[manifest["apiVersion"]],
-                            "delete",
-                            kind,
-                        )(manifest_name, namespace)
-                        print(f"CREATE {kind} {namespace}/{manifest_name}")
-                        get_api_method_for_kind(
-                            api_version_to_client[manifest["apiVersion"]],
-                            "create",
-                            kind,
-                        )(namespace, manifest)
-                except KeyError:
-                    # the manifest doesn't exist; create it
-                    print(f"CREATE {kind} {namespace}/{manifest_name}")
-                    get_api_method_for_kind(
-                        api_version_to_client[manifest["apiVersion"]], "create", kind
-                    )(namespace, manifest)
-            for manifest_name in server_manifest_names:
-                print(f"DELETE {kind} {namespace}/{manifest_name}")
-                get_api_method_for_kind(
-                    api_version_to_client[KIND_TO_API_VERISON[kind]], "delete", kind
-                )(manifest_name, namespace)
-
-    for namespace_name in server_namespaces_names:
+        for namespace_manifest, output, future in zip(namespaces, outputs, futures):
+            namespace = namespace_manifest["metadata"]["name"]
+            error = future.exception()
+            for line in output:
+                print(line)
+            if error is not None:
+                print(f"ERROR Namespace {namespace}: {error}")
+                errors[namespace] = cast(Exception, error)
+            else:
+                counts.update(future.result())
+
+    for namespace_name in sorted(set(server_namespaces.keys()) - set(keep_namespaces)):
         print(f"DELETE Namespace {namespace_name}")
         v1.delete_namespace(namespace_name)
+        counts["deleted"] += 1
+
+    print(
+        f"{counts['created']} created, {counts['patched']} patched, "
+        f"{counts['unchanged']} unchanged, {counts['deleted']} deleted"
+    )
+
+    if len(errors) != 0:
+        raise SyncError(errors, "namespaces")
+    return counts
@@ -1,11 +1,26 @@
+import itertools
 import os
-from hashlib import sha256
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Set
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    cast,
+)
 
 import rcds
 import rcds.backend
-from rcds.util import deep_merge, load_any
+from rcds.backend import SyncError
+from rcds.util import load_any
 from rcds.util.jsonschema import DefaultValidatingDraft7Validator
 
 from .rctf import RCTFAdminV1
@@ -14,6 +29,43 @@ options_schema_validator = DefaultValidatingDraft7Validator(
     schema=load_any(Path(__file__).parent / "options.schema.yaml")
 )
 
+T = TypeVar("T")
+
+
+class ChallengeFile(NamedTuple):
+    """
+    A file provided with a challenge
+    """
+
+    name: str
+    sha256: str
+    path: Path
+
+
+def _normalize_files(files: Any) -> Any:
+    if not isinstance(files, list):
+        return files
+    # The order of a challenge's files does not matter
+    return sorted(files, key=lambda f: (f.get("name"), f.get("url")))
+
+
+def _is_up_to_date(remote: Dict[str, Any], local: Dict[str, Any]) -> bool:
+    """
+    Check whether a challenge from rCTF matches a challenge built by
+    :meth:`ScoreboardBackend.build_challenge`
+
+    rCTF returns fields which are not set by rCDS (e.g. the challenge id); only
+    the fields which rCDS sets are compared.
+    """
+    for key, value in local.items():
+        remote_value = remote.get(key)
+        if key == "files":
+            value = _normalize_files(value)
+            remote_value = _normalize_files(remote_value)
+        if remote_value != value:
+            return False
+    return True
+
 
 class ScoreboardBackend(rcds.backend.BackendScoreboard):
     _project: rcds.Project
@@ -34,7 +86,12 @@ class ScoreboardBackend(rcds.backend.BackendScoreboard):
         if not options_schema_validator.is_valid(self._options):
             raise ValueError("Invalid options")
 
-        self._adminv1 = RCTFAdminV1(self._options["url"], self._options["token"])
+        self._adminv1 = RCTFAdminV1(
+            self._options["url"],
+            self._options["token"],
+            pool_size=self._options["concurrency"],
+            timeout=self._options["timeout"],
+        )
 
     def patch_challenge_schema(self, schema: Dict[str, Any]) -> None:
         # Disallow regex flags
@@ -64,31 +121,87 @@ class ScoreboardBackend(rcds.backend.BackendScoreboard):
 
         schema["required"] += ["author", "category", "tiebreakEligible", "sortWeight"]
 
-    def commit(self) -> bool:
+    def commit(self, challenges: Optional[Iterable[rcds.Challenge]] = None) -> bool:
+        if challenges is None:
+            challenges = self._project.challenges.values()
+        challenges = list(challenges)
+
         # Validate challenges
-        for challenge in self._project.challenges.values():
+        for challenge in challenges:
             self.validate_challenge(challenge)
 
-        for challenge in self._project.challenges.values():
+        for challenge in challenges:
             self.preprocess_challenge(challenge)
 
         # Begin actual commit
-        remote_challenges: Set[str] = set(
-            c["id"]
-            for c in self._adminv1.list_challenges()
+        remote_challenges: Dict[str, Dict[str, Any]] = {
+            c["id"]: c for c in self._adminv1.list_challenges()
+        }
+        remote_to_delete: Set[str] = set(
+            chall_id
+            for chall_id, c in remote_challenges.items()
             if c.get("managedBy", None) == "rcds"
         )
+        # Leave all other visible challenges alone
         for challenge in self._project.challenges.values():
-            if not challenge.config["visible"]:
-                continue
-            try:
-                remote_challenges.remove(challenge.config["id"])
-            except KeyError:
-                pass
-            self.commit_challenge(challenge)
-        for chall_id in remote_challenges:
+            if challenge.config["visible"] and challenge not in challenges:
+                remote_to_delete.discard(challenge.config["id"])
+        visible_challenges = [c for c in challenges if c.config["visible"]]
+        for challenge in visible_challenges:
+            remote_to_delete.discard(challenge.config["id"])
+        counts: "Counter[str]" = Counter(created=0, updated=0, unchanged=0, deleted=0)
+        errors: Dict[str, Exception] = dict()
+        with ThreadPoolExecutor(max_workers=self._options["concurrency"]) as executor:
+            challenge_files = self._map_challenges(
+                executor, self.get_challenge_files, visible_challenges, errors
+            )
+            # Files are uploaded once for the whole project, so identical files in
+            # multiple challenges are only uploaded once
+            file_urls = self.get_file_urls(
+                itertools.chain.from_iterable(challenge_files.values())
+            )
+            rctf_challenges = self._map_challenges(
+                executor,
+                lambda challenge: self.build_challenge(
+                    challenge, challenge_files[challenge.config["id"]], file_urls
+                ),
+                [c for c in visible_challenges if c.config["id"] in challenge_files],
+                errors,
+            )
+            challenges_to_put: List[rcds.Challenge] = []
+            for challenge in visible_challenges:
+                chall_id = challenge.config["id"]
+                if chall_id not in rctf_challenges:
+                    continue
+                if chall_id in remote_challenges and _is_up_to_date(
+                    remote_challenges[chall_id], rctf_challenges[chall_id]
+                ):
+                    counts["unchanged"] += 1
+                else:
+                    challenges_to_put.append(challenge)
+            put_challenges = self._map_challenges(
+                executor,
+                lambda challenge: self._adminv1.put_challenge(
+                    challenge.config["id"], rctf_challenges[challenge.config["id"]]
+                ),
+                challenges_to_put,
+                errors,
+            )
+        for chall_id in put_challenges:
+            if chall_id in remote_challenges:
+                counts["updated"] += 1
+            else:
+                counts["created"] += 1
+        for chall_id in remote_to_delete:
             print(f"Deleting {chall_id}")
             self._adminv1.delete_challenge(chall_id)
+            counts["deleted"] += 1
+        print(
+            f"{counts['created']} created, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged, {counts['deleted']} deleted"
+        )
+        if len(errors) != 0:
+            raise SyncError(errors)
         return True
 
     def validate_challenge(self, challenge: rcds.Challenge) -> None:
@@ -111,8 +224,82 @@ class ScoreboardBackend(rcds.backend.BackendScoreboard):
                     chall_id
                 )
 
-    def commit_challenge(self, challenge: rcds.Challenge) -> None:
-        chall_id = challenge.config["id"]
+    @staticmethod
+    def _map_challenges(
+        executor: ThreadPoolExecutor,
+        fn: Callable[[rcds.Challenge], T],
+        challenges: List[rcds.Challenge],
+        errors: Dict[str, Exception],
+    ) -> Dict[str, T]:
+        """
+        Call ``fn`` on each challenge on ``executor``, recording any errors in
+        ``errors``
+
+        :returns: The result for each challenge that did not fail, by challenge id
+        """
+        futures: List["Future[T]"] = [
+            executor.submit(fn, challenge) for challenge in challenges
+        ]
+        results: Dict[str, T] = dict()
+        for challenge, future in zip(challenges, futures):
+            error = future.exception()
+            if error is not None:
+                print(f"ERROR {challenge.config['id']}: {error}")
+                errors[challenge.config["id"]] = cast(Exception, error)
+            else:
+                results[challenge.config["id"]] = future.result()
+        return results
+
+    def get_challenge_files(self, challenge: rcds.Challenge) -> List[ChallengeFile]:
+        """
+        Get the files to provide for a challenge, along with their hashes
+        """
+        am_ctx = challenge.get_asset_manager_context()
+        return [
+            ChallengeFile(filename, am_ctx.get_sha256(filename), am_ctx.get(filename))
+            for filename in sorted(am_ctx.ls())
+        ]
+
+    def get_file_urls(
+        self, files: Iterable[ChallengeFile]
+    ) -> Dict[Tuple[str, str], str]:
+        """
+        Get the urls of files, uploading those which have not already been uploaded
+
+        :returns: The url of each file, by (name, sha256)
+        """
+        paths: Dict[Tuple[str, str], Path] = dict()
+        for f in files:
+            paths.setdefault((f.name, f.sha256), f.path)
+        keys = list(paths.keys())
+        file_urls: Dict[Tuple[str, str], str] = {
+            key: url
+            for key, url in zip(keys, self._adminv1.query_uploads(keys))
+            if url is not None
+        }
+        uploads = [key for key in keys if key not in file_urls]
+        file_urls.update(
+            zip(
+                uploads,
+                self._adminv1.upload_files(
+                    [(name, paths[(name, h)]) for name, h in uploads]
+                ),
+            )
+        )
+        return file_urls
+
+    def build_challenge(
+        self,
+        challenge: rcds.Challenge,
+        files: List[ChallengeFile],
+        file_urls: Dict[Tuple[str, str], str],
+    ) -> Dict[str, Any]:
+        """
+        Build the rCTF representation of a challenge
+
+        :param files: The challenge's files (see :meth:`get_challenge_files`)
+        :param file_urls: The urls of the files (see :meth:`get_file_urls`)
+        """
         rctf_challenge: Dict[str, Any] = {"managedBy": "rcds"}
         for common_field in [
             "name",
@@ -136,35 +323,10 @@ class ScoreboardBackend(rcds.backend.BackendScoreboard):
                 "min": self._options["scoring"]["minPoints"],
                 "max": self._options["scoring"]["maxPoints"],
             }
-
-        am_ctx = challenge.get_asset_manager_context()
-        file_hashes: Dict[str, str] = dict()
-        for filename in am_ctx.ls():
-            h = sha256()
-            with am_ctx.get(filename).open("rb") as fd:
-                for chunk in iter(lambda: fd.read(5245288), b""):
-                    h.update(chunk)
-            file_hashes[filename] = h.hexdigest()
-        file_urls: Dict[str, str] = {
-            f: u
-            for f, u in self._adminv1.get_url_for_files(file_hashes).items()
-            if u is not None
-        }
-        deep_merge(
-            file_urls,
-            self._adminv1.create_upload(
-                {
-                    name: am_ctx.get(name).read_bytes()
-                    for name in am_ctx.ls()
-                    if name not in file_urls
-                }
-            ),
-        )
         rctf_challenge["files"] = [
-            {"name": name, "url": url} for name, url in file_urls.items()
+            {"name": f.name, "url": file_urls[(f.name, f.sha256)]} for f in files
         ]
-
-        self._adminv1.put_challenge(chall_id, rctf_challenge)
+        return rctf_challenge
 
 
 class BackendsInfo(rcds.backend.BackendsInfo):
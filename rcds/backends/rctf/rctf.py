@@ -1,20 +1,165 @@
+import io
+import json
 from base64 import b64encode
-from typing import Any, Dict, List, Optional
+from functools import partial
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 from urllib.parse import quote, urljoin
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests_toolbelt.sessions import BaseUrlSession  # type: ignore
+from urllib3.util.retry import Retry
+
+UPLOAD_BATCH_SIZE = 32 * 1024 * 1024
+"""
+The maximum size (after encoding) of the files sent in a single upload request,
+unless a single file is larger
+"""
+
+QUERY_BATCH_SIZE = 500
+"""
+The maximum number of files queried in a single upload query request
+"""
+
+# Must be a multiple of 3, so that chunks can be base64-encoded separately
+_UPLOAD_CHUNK_SIZE = 3 * 1024 * 1024
+
+
+def _get_encoded_size(data: Union[bytes, Path]) -> int:
+    size = data.stat().st_size if isinstance(data, Path) else len(data)
+    # Every (possibly partial) group of 3 bytes is encoded as 4 characters
+    return 4 * -(-size // 3)
+
+
+class _UploadBody:
+    """
+    The JSON body of an upload request, which is generated as it is sent
+
+    Files are read and base64-encoded one chunk at a time, so the memory used does
+    not depend on the size of the files. The length of the body is computed
+    beforehand, so that it can be sent with a ``Content-Length`` header.
+    """
+
+    _uploads: Sequence[Tuple[str, Union[bytes, Path]]]
+    _length: int
+
+    _PREFIX = b'{"files":['
+    _SUFFIX = b"]}"
+
+    def __init__(self, uploads: Sequence[Tuple[str, Union[bytes, Path]]]):
+        self._uploads = uploads
+        # Files are separated by commas
+        self._length = len(self._PREFIX) + len(self._SUFFIX) + max(len(uploads) - 1, 0)
+        for name, data in uploads:
+            file_prefix, file_suffix = self._get_file_delimiters(name)
+            self._length += (
+                len(file_prefix) + _get_encoded_size(data) + len(file_suffix)
+            )
+
+    @staticmethod
+    def _get_file_delimiters(name: str) -> Tuple[bytes, bytes]:
+        # json.dumps escapes all non-ASCII characters by default
+        return (
+            b'{"name":' + json.dumps(name).encode() + b',"data":"data:;base64,',
+            b'"}',
+        )
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._PREFIX
+        for i, (name, data) in enumerate(self._uploads):
+            if i != 0:
+                yield b","
+            file_prefix, file_suffix = self._get_file_delimiters(name)
+            yield file_prefix
+            fd: BinaryIO
+            if isinstance(data, Path):
+                fd = data.open("rb")
+            else:
+                fd = io.BytesIO(data)
+            with fd:
+                for chunk in iter(partial(fd.read, _UPLOAD_CHUNK_SIZE), b""):
+                    yield b64encode(chunk)
+            yield file_suffix
+        yield self._SUFFIX
+
+
+class _AdminSession(BaseUrlSession):
+    """
+    A session which applies a default timeout to all requests
+    """
+
+    timeout: float
+
+    def __init__(self, base_url: str, timeout: float):
+        super().__init__(base_url)
+        self.timeout = timeout
+
+    def request(self, method: str, url: str, *args: Any, **kwargs: Any) -> Any:
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, *args, **kwargs)
+
+
+def _get_retry(retries: int) -> Retry:
+    kwargs: Dict[str, Any] = dict(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=[429, 502, 503, 504],
+        raise_on_status=False,
+    )
+    # Every request rCDS makes is idempotent, so all methods are retried
+    try:
+        return Retry(allowed_methods=None, **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=False, **kwargs)  # type: ignore
 
 
 class RCTFAdminV1:
 
     session: requests.Session
 
-    def __init__(self, endpoint: str, login_token: Optional[str]):
-        self.session = BaseUrlSession(urljoin(endpoint, "api/v1/admin/"))
+    def __init__(
+        self,
+        endpoint: str,
+        login_token: Optional[str],
+        *,
+        pool_size: int = 10,
+        timeout: float = 60,
+        retries: int = 3,
+    ):
+        """
+        :param str endpoint: The URL of the rCTF instance
+        :param login_token: The login token of an admin account
+        :param int pool_size: The maximum number of connections to keep open, which
+            should be at least the number of threads making requests at once
+        :param float timeout: The timeout for each request, in seconds
+        :param int retries: The number of times to retry requests which fail to
+            connect, or which fail with a status indicating that the server is
+            temporarily unavailable
+        """
+        self.session = _AdminSession(urljoin(endpoint, "api/v1/admin/"), timeout)
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=_get_retry(retries)
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         if login_token is not None:
-            login_resp = requests.post(
+            login_resp = self.session.post(
                 urljoin(endpoint, "api/v1/auth/login"), json={"teamToken": login_token}
             ).json()
             if login_resp["kind"] == "goodLogin":
@@ -43,27 +188,73 @@ class RCTFAdminV1:
         r = self.session.delete("challs/" + quote(chall_id)).json()
         self.assertResponseKind(r, "goodChallengeDelete")
 
-    def create_upload(self, uploads: Dict[str, bytes]) -> Dict[str, str]:
+    def upload_files(
+        self,
+        uploads: Sequence[Tuple[str, Union[bytes, Path]]],
+        batch_size: int = UPLOAD_BATCH_SIZE,
+    ) -> List[str]:
         """
-        :param uploads: uploads {name: data}
-        :return: urls {name: url}
+        Upload files, streaming them from disk where possible
+
+        Files are sent in batches of up to ``batch_size`` bytes (after encoding),
+        one request per batch; files larger than ``batch_size`` are sent alone.
+        Multiple files may have the same name.
+
+        :param uploads: uploads [(name, data)], where data is either the contents of
+            the file or the path to it
+        :param batch_size: the maximum size of a request
+        :return: the url of each upload, in order
         """
-        if len(uploads) == 0:
-            return {}
-        payload = [
-            {"name": name, "data": "data:;base64," + b64encode(data).decode()}
-            for name, data in uploads.items()
-        ]
-        r = self.session.post("upload", json={"files": payload}).json()
-        self.assertResponseKind(r, "goodFilesUpload")
-        return {f["name"]: f["url"] for f in r["data"]}
-
-    def get_url_for_files(self, files: Dict[str, str]) -> Dict[str, Optional[str]]:
+        urls: List[str] = []
+        for batch in self._batch_uploads(uploads, batch_size):
+            r = self.session.post(
+                "upload",
+                data=_UploadBody(batch),
+                headers={"Content-Type": "application/json"},
+            ).json()
+            self.assertResponseKind(r, "goodFilesUpload")
+            # rCTF responds with the uploads in the order they were sent
+            urls += [f["url"] for f in r["data"]]
+        return urls
+
+    @staticmethod
+    def _batch_uploads(
+        uploads: Sequence[Tuple[str, Union[bytes, Path]]], batch_size: int
+    ) -> Iterator[List[Tuple[str, Union[bytes, Path]]]]:
+        batch: List[Tuple[str, Union[bytes, Path]]] = []
+        batch_length = 0
+        for name, data in uploads:
+            length = _get_encoded_size(data)
+            if len(batch) != 0 and batch_length + length > batch_size:
+                yield batch
+                batch = []
+                batch_length = 0
+            batch.append((name, data))
+            batch_length += length
+        if len(batch) != 0:
+            yield batch
+
+    def query_uploads(
+        self, files: Sequence[Tuple[str, str]], batch_size: int = QUERY_BATCH_SIZE
+    ) -> List[Optional[str]]:
         """
-        :param files: files to get {name: sha256}
-        :return: urls {name: url}
+        Get the urls of files which have already been uploaded
+
+        Files are queried in batches of up to ``batch_size`` files, one request per
+        batch.
+
+        :param files: files to get [(name, sha256)]
+        :param batch_size: the maximum number of files to query in a request
+        :return: the url of each file, or ``None`` if it has not been uploaded, in
+            order
         """
-        payload = [{"name": name, "sha256": sha256} for name, sha256 in files.items()]
-        r = self.session.post("upload/query", json={"uploads": payload}).json()
-        self.assertResponseKind(r, "goodUploadsQuery")
-        return {f["name"]: f["url"] for f in r["data"]}
+        urls: List[Optional[str]] = []
+        for i in range(0, len(files), batch_size):
+            payload = [
+                {"name": name, "sha256": sha256}
+                for name, sha256 in files[i : i + batch_size]
+            ]
+            r = self.session.post("upload/query", json={"uploads": payload}).json()
+            self.assertResponseKind(r, "goodUploadsQuery")
+            urls += [f["url"] for f in r["data"]]
+        return urls
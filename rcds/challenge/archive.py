@@ -0,0 +1,221 @@
+"""
+Reproducible archives of directories, for providing to competitors
+"""
+
+import gzip
+import hashlib
+import os
+import shutil
+import stat
+import tarfile
+import zipfile
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, BinaryIO, List, Optional, Tuple
+
+import pathspec  # type: ignore
+
+from ..util import JSONCache
+
+if TYPE_CHECKING:
+    from ..project.blobs import BlobStore
+
+IGNORE_FILE = ".rcdsignore"
+
+FORMATS = ["tar.gz", "zip"]
+
+# Bump when the layout of generated archives changes, to invalidate caches
+_VERSION = 1
+
+# The timestamp given to every archive member; zip files cannot represent
+# anything earlier than 1980
+_MTIME = 315532800  # 1980-01-01T00:00:00Z
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def load_ignore_file(root: Path) -> Optional[pathspec.PathSpec]:
+    """
+    Load the :const:`IGNORE_FILE` in a directory, if present
+
+    The file uses the same syntax as a ``.gitignore``.
+
+    :param pathlib.Path root: Path to the directory containing the ignore file
+    :returns: A spec matching ignored paths (relative to ``root``), or ``None`` if
+        there is no ignore file
+    """
+    ignore_file = root / IGNORE_FILE
+    if not ignore_file.is_file():
+        return None
+    with ignore_file.open("r") as fd:
+        return pathspec.PathSpec.from_lines("gitwildmatch", fd)
+
+
+class Archive:
+    """
+    An archive of a directory, which is generated reproducibly: archiving the same
+    files always produces the same bytes
+
+    Members are stored in sorted order, under a top-level directory with the same
+    name as the archived directory, with a fixed timestamp and owner. Only the
+    executable bit of each file's mode is kept. Files and directories matching the
+    patterns in an :const:`IGNORE_FILE` at the root of the directory are left out.
+    """
+
+    root: Path
+    format: str
+    _members: List[Tuple[PurePosixPath, Path, bool]]
+
+    def __init__(self, root: Path, format: str):
+        """
+        :param pathlib.Path root: The directory to archive
+        :param str format: The archive format, one of :const:`FORMATS`
+        :raises ValueError: if the directory does not exist or the format is not
+            supported
+        """
+        if not root.is_dir():
+            raise ValueError(f"Provided directory does not exist: '{str(root)}'")
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported archive format '{format}'")
+        self.root = root
+        self.format = format
+        self._members = self._walk()
+
+    def _walk(self) -> List[Tuple[PurePosixPath, Path, bool]]:
+        spec = load_ignore_file(self.root)
+        members = [(PurePosixPath(self.root.name), self.root, True)]
+        for dirpath, dirnames, filenames in os.walk(str(self.root)):
+            dirnames.sort()
+            parent = Path(dirpath)
+            rel_parent = PurePosixPath(parent.relative_to(self.root).as_posix())
+            for name in list(dirnames):
+                rel_path = rel_parent / name
+                # Directories are matched with a trailing slash, so that
+                # directory-only patterns apply to them
+                if spec is not None and spec.match_file(f"{rel_path}/"):
+                    dirnames.remove(name)
+                    continue
+                members.append((self.root.name / rel_path, parent / name, True))
+            for name in sorted(filenames):
+                rel_path = rel_parent / name
+                if rel_path == PurePosixPath(IGNORE_FILE) or (
+                    spec is not None and spec.match_file(str(rel_path))
+                ):
+                    continue
+                members.append((self.root.name / rel_path, parent / name, False))
+        members.sort(key=lambda member: member[0].parts)
+        return members
+
+    def get_mtime(self) -> float:
+        """
+        Get the last time that the archived directory, or anything in it, was
+        modified
+
+        Deleting a file modifies the directory that contained it, so this also
+        changes when files are removed.
+        """
+        mtime = self.root.stat().st_mtime
+        ignore_file = self.root / IGNORE_FILE
+        if ignore_file.is_file():
+            mtime = max(mtime, ignore_file.stat().st_mtime)
+        for _, path, _ in self._members:
+            mtime = max(mtime, path.stat().st_mtime)
+        return mtime
+
+    def get_digest(self) -> str:
+        """
+        Get a digest of the archive's inputs: the format, and the name, mode, and
+        contents of every member
+
+        Archives with the same digest are byte-for-byte identical.
+        """
+        h = hashlib.sha256(f"{_VERSION}:{self.format}\0".encode())
+        for name, path, is_dir in self._members:
+            h.update(f"{name}\0{self._get_mode(path, is_dir):o}\0".encode())
+            if is_dir:
+                continue
+            file_hash = hashlib.sha256()
+            with path.open("rb") as fd:
+                for chunk in iter(partial(fd.read, _CHUNK_SIZE), b""):
+                    file_hash.update(chunk)
+            h.update(file_hash.digest())
+        return h.hexdigest()
+
+    @staticmethod
+    def _get_mode(path: Path, is_dir: bool) -> int:
+        if is_dir or path.stat().st_mode & stat.S_IXUSR:
+            return 0o755
+        return 0o644
+
+    def write(self, fd: BinaryIO) -> None:
+        """
+        Write the archive
+
+        File contents are streamed into the archive, so the directory does not need
+        to fit in memory.
+
+        :param fd: The file to write the archive to
+        """
+        if self.format == "zip":
+            self._write_zip(fd)
+        else:
+            self._write_tar_gz(fd)
+
+    def _write_tar_gz(self, fd: BinaryIO) -> None:
+        # The gzip header would otherwise contain the current time
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=fd, mtime=0
+        ) as gzip_fd, tarfile.open(
+            fileobj=gzip_fd, mode="w", format=tarfile.PAX_FORMAT
+        ) as tar:
+            for name, path, is_dir in self._members:
+                info = tarfile.TarInfo(str(name))
+                info.mtime = _MTIME
+                info.mode = self._get_mode(path, is_dir)
+                if is_dir:
+                    info.type = tarfile.DIRTYPE
+                    tar.addfile(info)
+                    continue
+                info.size = path.stat().st_size
+                with path.open("rb") as member_fd:
+                    tar.addfile(info, member_fd)
+
+    def _write_zip(self, fd: BinaryIO) -> None:
+        with zipfile.ZipFile(fd, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for name, path, is_dir in self._members:
+                info = zipfile.ZipInfo(
+                    str(name) + ("/" if is_dir else ""), date_time=(1980, 1, 1, 0, 0, 0)
+                )
+                info.create_system = 3  # Unix, so that the mode is used
+                mode = self._get_mode(path, is_dir)
+                info.external_attr = (
+                    (stat.S_IFDIR if is_dir else stat.S_IFREG) | mode
+                ) << 16
+                if is_dir:
+                    info.external_attr |= 0x10  # MS-DOS directory flag
+                    zf.writestr(info, b"")
+                    continue
+                info.compress_type = zipfile.ZIP_DEFLATED
+                info.file_size = path.stat().st_size
+                with path.open("rb") as member_fd, zf.open(info, "w") as zip_member_fd:
+                    shutil.copyfileobj(member_fd, zip_member_fd, _CHUNK_SIZE)
+
+    def open_cached(self, cache: JSONCache, blobs: "BlobStore") -> BinaryIO:
+        """
+        Open this archive, generating it unless an identical archive is already in
+        a blob store
+
+        ``cache`` maps the :meth:`get_digest` of each archive to its blob (see
+        :meth:`BlobStore.open_generated
+        <rcds.project.blobs.BlobStore.open_generated>`), so a directory is only
+        compressed again once its contents change. The returned file is meant to be
+        returned by an asset thunk (see :meth:`AssetManagerTransaction.add
+        <rcds.project.assets.AssetManagerTransaction.add>`), which adds a reference
+        to its blob. Archives are deleted from the store once no asset refers to
+        them, so the cache does not grow as archives are replaced.
+
+        :param JSONCache cache: The cache mapping archive digests to blobs
+        :param BlobStore blobs: The blob store that assets are added to
+        :returns: The archive, open for reading
+        """
+        return blobs.open_generated(cache, self.get_digest(), self.write)
@@ -1,9 +1,13 @@
 import re
-from pathlib import Path
-from typing import TYPE_CHECKING, Any, Callable, Dict, List, cast
+import time
+from functools import partial
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, cast
 
 from ..util import SUPPORTED_EXTENSIONS, deep_merge, find_files
+from .archive import Archive
 from .config import ConfigLoader
+from .docker import ContainerManager
 
 if TYPE_CHECKING:
     import rcds
@@ -29,6 +33,14 @@ class ChallengeLoader:
         self.project = project
         self._config_loader = ConfigLoader(self.project)
 
+    def _find_config(self, root: Path) -> Path:
+        try:
+            return find_files(
+                ["challenge"], SUPPORTED_EXTENSIONS, path=root, recurse=False
+            )["challenge"]
+        except KeyError:
+            raise ValueError(f"No config file found at '{root}'")
+
     def load(self, root: Path):
         """
         Load a challenge by path
@@ -37,15 +49,27 @@ class ChallengeLoader:
 
         :param pathlib.Path root: Path to challenge root
         """
-        try:
-            cfg_file = find_files(
-                ["challenge"], SUPPORTED_EXTENSIONS, path=root, recurse=False
-            )["challenge"]
-        except KeyError:
-            raise ValueError(f"No config file found at '{root}'")
-        config = self._config_loader.load_config(cfg_file)
+        config = self._config_loader.load_config(self._find_config(root))
         return Challenge(self.project, root, config)
 
+    def load_all(self, roots: List[Path], jobs: int = 1) -> List["Challenge"]:
+        """
+        Load several challenges by path
+
+        Configs are parsed and validated in a pool of ``jobs`` processes; see
+        :meth:`rcds.challenge.config.ConfigLoader.load_configs`.
+
+        :param List[pathlib.Path] roots: Paths to challenge roots
+        :param int jobs: The number of processes to use
+        """
+        configs = self._config_loader.load_configs(
+            [self._find_config(root) for root in roots], jobs=jobs
+        )
+        return [
+            Challenge(self.project, root, config)
+            for root, config in zip(roots, configs)
+        ]
+
 
 class Challenge:
     """
@@ -61,6 +85,7 @@ class Challenge:
     context: Dict[str, Any]  # overrides to Jinja context
     _asset_manager_context: "AssetManagerContext"
     _asset_sources: List[Callable[["AssetManagerTransaction"], None]]
+    _container_manager: Optional[ContainerManager] = None
 
     def __init__(self, project: "Project", root: Path, config: dict):
         self.project = project
@@ -81,11 +106,65 @@ class Challenge:
             if isinstance(provide, str):
                 path = self.root / Path(provide)
                 name = path.name
+            elif "archive" in provide:
+                self._add_archive_asset(transaction, provide)
+                continue
+            elif "container" in provide:
+                self._add_container_asset(transaction, provide)
+                continue
             else:
                 path = self.root / Path(provide["file"])
                 name = provide["as"]
             transaction.add_file(name, path)
 
+    def _add_archive_asset(
+        self, transaction: "AssetManagerTransaction", provide: Dict[str, Any]
+    ) -> None:
+        name = provide.get("as")
+        archive_format = provide.get("format")
+        if archive_format is None:
+            archive_format = (
+                "zip" if name is not None and name.endswith(".zip") else "tar.gz"
+            )
+        archive = Archive(
+            (self.root / Path(provide["archive"])).resolve(), archive_format
+        )
+        if name is None:
+            name = f"{archive.root.name}.{archive_format}"
+        transaction.add(
+            name,
+            archive.get_mtime(),
+            partial(
+                archive.open_cached,
+                self.project.archive_cache,
+                self.project.asset_manager.blobs,
+            ),
+        )
+
+    def _add_container_asset(
+        self, transaction: "AssetManagerTransaction", provide: Dict[str, Any]
+    ) -> None:
+        container = self.get_container_manager().containers[provide["container"]]
+        path = provide["path"]
+        name = provide.get("as", PurePosixPath(path).name)
+        cache = self.project.image_file_cache
+        # Images are only pulled when the asset is created, so the file can only be
+        # known to be unchanged if its key can be found without pulling the image
+        # (e.g. if it is built by rCDS); otherwise, the current time is used as its
+        # mtime, so that the asset is checked against the image again
+        key = container.get_file_key(path, pull=False)
+        blob = cache.get(key) if key is not None else None
+        ctx = self._asset_manager_context
+        if blob is not None and ctx.exists(name) and ctx.get_sha256(name) == blob:
+            mtime = ctx.get_mtime(name)
+        else:
+            mtime = time.time()
+        transaction.add(
+            name,
+            mtime,
+            partial(container.open_file, path, cache, self.project.asset_manager.blobs),
+        )
+
     def register_asset_source(
         self, do_add: Callable[["AssetManagerTransaction"], None]
     ) -> None:
@@ -106,6 +185,15 @@ class Challenge:
     def get_asset_manager_context(self) -> "AssetManagerContext":
         return self._asset_manager_context
 
+    def get_container_manager(self) -> ContainerManager:
+        """
+        Get the :class:`~rcds.challenge.docker.ContainerManager` for this challenge's
+        containers, which is created when first requested
+        """
+        if self._container_manager is None:
+            self._container_manager = ContainerManager(self)
+        return self._container_manager
+
     def get_relative_path(self) -> Path:
         """
         Utiity function to get this challenge's path relative to the project root
@@ -1,12 +1,20 @@
+import builtins
+import hashlib
+import json
 import re
+import warnings
+from concurrent.futures import Future, ProcessPoolExecutor
 from copy import deepcopy
 from itertools import tee
 from pathlib import Path
+from types import SimpleNamespace
 from typing import (
     TYPE_CHECKING,
     Any,
     Dict,
+    Generator,
     Iterable,
+    List,
     Optional,
     Pattern,
     Tuple,
@@ -15,19 +23,40 @@ from typing import (
 )
 from warnings import warn
 
-import jsonschema  # type: ignore
-
 from rcds import errors
 
-from ..util import deep_merge, load_any
-from ..util.jsonschema import DefaultValidatingDraft7Validator
+from ..util import JSONCache, deep_merge, hash_file, load_any
+from ..util.jsonschema import get_schema_digest, get_validator
 
 if TYPE_CHECKING:
     from rcds import Project
+    from rcds.backend import BackendBase
 
 
 config_schema = load_any(Path(__file__).parent / "challenge.schema.yaml")
 
+# Bump when a change to config loading would change the configs loaded from the
+# same files, to invalidate parsed configs cached by previous versions
+CONFIG_CACHE_VERSION = 1
+
+
+def get_config_schema(backends: Iterable["BackendBase"]) -> Dict[str, Any]:
+    """
+    Get the challenge config schema, as patched by the given backends
+
+    A new copy of the schema is patched on every call, so changes to a backend's
+    patches are always seen, and backends are not kept alive. Validators are still
+    only built once per process for each patched schema, since
+    :func:`~rcds.util.jsonschema.get_validator` memoizes them by the schema's
+    contents.
+
+    :param backends: The backends to patch the schema with, in order
+    """
+    schema = deepcopy(config_schema)
+    for backend in backends:
+        backend.patch_challenge_schema(schema)
+    return schema
+
 
 class TargetNotFoundError(errors.ValidationError):
     pass
@@ -40,6 +69,9 @@ class TargetFileNotFoundError(TargetNotFoundError):
         super().__init__(message)
         self.target = target
 
+    def __reduce__(self):
+        return (type(self), (str(self), self.target))
+
 
 class InvalidFlagError(errors.ValidationError):
     pass
@@ -54,28 +86,61 @@ class ConfigLoader:
     config_schema: Dict[str, Any]
     config_schema_validator: Any
     _flag_regex: Optional[Pattern[str]] = None
+    _cache: Optional[JSONCache]
+    _cache_salt: str
 
     def __init__(self, project: "Project"):
         """
         :param rcds.Project project: project context to use
         """
         self.project = project
-        self.config_schema = deepcopy(config_schema)
 
         # Load flag regex if present
         if "flagFormat" in self.project.config:
             self._flag_regex = re.compile(f"^{self.project.config['flagFormat']}$")
 
         # Backend config patching
-        for backend in [
-            self.project.container_backend,
-            self.project.scoreboard_backend,
-        ]:
-            if backend is not None:
-                backend.patch_challenge_schema(self.config_schema)
-        self.config_schema_validator = DefaultValidatingDraft7Validator(
-            schema=self.config_schema, format_checker=jsonschema.draft7_format_checker
+        self.config_schema = get_config_schema(
+            backend
+            for backend in [
+                self.project.container_backend,
+                self.project.scoreboard_backend,
+            ]
+            if backend is not None
         )
+        self._init_validator()
+
+        self._cache = self.project.config_cache
+        # Everything other than the challenge's own files that parsing depends on
+        self._cache_salt = hashlib.sha256(
+            json.dumps(
+                [
+                    CONFIG_CACHE_VERSION,
+                    self.project.config,
+                    get_schema_digest(self.config_schema),
+                ],
+                sort_keys=True,
+                default=str,
+            ).encode()
+        ).hexdigest()
+
+    def _init_validator(self) -> None:
+        self.config_schema_validator = get_validator(self.config_schema)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the project's root and config are needed to parse configs; the
+        # project itself (with its backends and Docker client) cannot be pickled
+        state = self.__dict__.copy()
+        state["project"] = SimpleNamespace(
+            root=self.project.root, config=self.project.config
+        )
+        del state["config_schema_validator"]
+        state["_cache"] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_validator()
 
     def _apply_defaults(self, config: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -106,13 +171,16 @@ class ConfigLoader:
         return config
 
     def parse_config(
-        self, config_file: Path
+        self, config_file: Path, dependencies: Optional[Dict[str, str]] = None
     ) -> Iterable[Union[errors.ValidationError, Dict[str, Any]]]:
         """
         Load and validate a config file, returning both the config and any
         errors encountered.
 
         :param pathlib.Path config_file: The challenge config to load
+        :param dependencies: (Optional) dict to add the paths (relative to the
+            challenge root) and SHA-256 hashes of any other files whose contents were
+            read into the config to
         :returns: Iterable containing any errors (all instances of
             :class:`rcds.errors.ValidationError`) and the parsed config. The config will
             always be last.
@@ -166,6 +234,22 @@ class ConfigLoader:
                 for f in config["provide"]:
                     if isinstance(f, str):
                         f = Path(f)
+                    elif "container" in f:
+                        if f["container"] not in config.get("containers", dict()):
+                            yield TargetNotFoundError(
+                                f'`provide` references container "{f["container"]}"'
+                                " but it is not defined in `containers`"
+                            )
+                        continue
+                    elif "archive" in f:
+                        f = Path(f["archive"])
+                        if not (root / f).is_dir():
+                            yield TargetFileNotFoundError(
+                                f'`provide` references directory "{str(f)}" which '
+                                f"does not exist",
+                                f,
+                            )
+                        continue
                     else:
                         f = Path(f["file"])
                     if not (root / f).is_file():
@@ -183,6 +267,8 @@ class ConfigLoader:
                             with f_resolved.open("r") as fd:
                                 flag = fd.read().strip()
                             config["flag"] = flag
+                            if dependencies is not None:
+                                dependencies[str(f)] = hash_file(f_resolved)
                         else:
                             yield TargetFileNotFoundError(
                                 f'`flag.file` references file "{str(f)}" which does '
@@ -205,7 +291,7 @@ class ConfigLoader:
         yield config
 
     def check_config(
-        self, config_file: Path
+        self, config_file: Path, dependencies: Optional[Dict[str, str]] = None
     ) -> Tuple[Optional[Dict[str, Any]], Optional[Iterable[errors.ValidationError]]]:
         """
         Load and validate a config file, returning any errors encountered.
@@ -217,8 +303,9 @@ class ConfigLoader:
         This method wraps :meth:`parse_config`.
 
         :param pathlib.Path config_file: The challenge config to load
+        :param dependencies: (Optional) see :meth:`parse_config`
         """
-        load_data = self.parse_config(config_file)
+        load_data = self.parse_config(config_file, dependencies)
         load_data, load_data_dup = tee(load_data)
         first = next(load_data_dup)
         if isinstance(first, errors.ValidationError):
@@ -235,14 +322,196 @@ class ConfigLoader:
         Loads a config file, or throw an exception if it is not valid
 
         This method wraps :meth:`check_config`, and throws the first error returned
-        if there are any errors.
+        if there are any errors. Valid configs are cached in the project's
+        :attr:`rcds.Project.config_cache`, and are only parsed again if the config
+        file, the project config, or the challenge schema (including patches by
+        backends) has changed.
 
         :param pathlib.Path config_file: The challenge config to load
         :returns: The loaded config
         """
-        config, errors = self.check_config(config_file)
-        if errors is not None:
-            raise next(iter(errors))
-        # errors is None
-        assert config is not None
-        return config
+        return self.load_configs([config_file])[0]
+
+    def load_configs(
+        self, config_files: List[Path], jobs: int = 1
+    ) -> List[Dict[str, Any]]:
+        """
+        Loads several config files, or throw the first error encountered
+
+        Config files which are not cached (see :meth:`load_config`) are parsed and
+        validated in a pool of ``jobs`` processes. The configs returned, and the error
+        thrown if any config is invalid, do not depend on the number of processes
+        used.
+
+        :param List[pathlib.Path] config_files: The challenge configs to load
+        :param int jobs: The number of processes to use
+        :returns: The loaded configs, in the same order as ``config_files``
+        """
+        digests = [self._get_cache_digest(config_file) for config_file in config_files]
+        cached = [
+            self._get_cached(config_file, digest)
+            for config_file, digest in zip(config_files, digests)
+        ]
+        uncached_results = self._load_uncached(
+            [
+                config_file
+                for config_file, result in zip(config_files, cached)
+                if result is None
+            ],
+            jobs,
+        )
+        configs: List[Dict[str, Any]] = []
+        new_entries: Dict[str, Any] = dict()
+        try:
+            for config_file, digest, result in zip(config_files, digests, cached):
+                if result is None:
+                    result = next(uncached_results)
+                    entry = _make_cache_entry(digest, result)
+                    if entry is not None:
+                        new_entries[_get_cache_key(config_file)] = entry
+                config, _, caught_warnings = result
+                for message in caught_warnings:
+                    warn(message)
+                if isinstance(config, BaseException):
+                    raise config
+                configs.append(config)
+        finally:
+            uncached_results.close()
+            if self._cache is not None and len(new_entries) > 0:
+                self._cache.update(new_entries)
+        return configs
+
+    def _get_cache_digest(self, config_file: Path) -> str:
+        h = hashlib.sha256(self._cache_salt.encode())
+        relative_path = config_file.resolve().relative_to(self.project.root.resolve())
+        h.update(relative_path.as_posix().encode() + b"\0")
+        h.update(config_file.read_bytes())
+        return h.hexdigest()
+
+    def _get_cached(self, config_file: Path, digest: str) -> Optional["_LoadResult"]:
+        """
+        Get a config from the cache, if it is still valid
+        """
+        if self._cache is None:
+            return None
+        entry = self._cache.get(_get_cache_key(config_file))
+        if entry is None or entry["digest"] != digest:
+            return None
+        root = config_file.parent
+        for dependency, dependency_hash in entry["dependencies"].items():
+            dependency_path = root / dependency
+            if not dependency_path.is_file():
+                return None
+            if hash_file(dependency_path) != dependency_hash:
+                return None
+        config = deepcopy(entry["config"])
+        # Provided files are only checked for existence, so check them here
+        for provide in config.get("provide", []):
+            if isinstance(provide, str) or "file" in provide:
+                f = provide if isinstance(provide, str) else provide["file"]
+                if not (root / f).is_file():
+                    return None
+            elif "archive" in provide:
+                if not (root / provide["archive"]).is_dir():
+                    return None
+        caught_warnings: List[Warning] = []
+        for category_name, message in entry["warnings"]:
+            category = getattr(builtins, category_name, None)
+            if not (isinstance(category, type) and issubclass(category, Warning)):
+                category = UserWarning
+            caught_warnings.append(category(message))
+        return (config, entry["dependencies"], caught_warnings)
+
+    def _load_uncached(
+        self, config_files: List[Path], jobs: int
+    ) -> Generator["_LoadResult", None, None]:
+        """
+        Load config files, in a pool of ``jobs`` processes if there is more than one,
+        yielding the results in order
+        """
+        if jobs <= 1 or len(config_files) <= 1:
+            for config_file in config_files:
+                yield _load_config_capturing(self, config_file)
+            return
+
+        # Split files into contiguous chunks so that this loader is only pickled
+        # once per chunk, while still having enough chunks to balance the load
+        chunk_size = -(-len(config_files) // (jobs * 4))
+        chunks = [
+            config_files[i : i + chunk_size]
+            for i in range(0, len(config_files), chunk_size)
+        ]
+        with ProcessPoolExecutor(max_workers=min(jobs, len(chunks))) as executor:
+            futures: List["Future[List[_LoadResult]]"] = [
+                executor.submit(_load_config_chunk, self, chunk) for chunk in chunks
+            ]
+            try:
+                for future in futures:
+                    yield from future.result()
+            finally:
+                for future in futures:
+                    future.cancel()
+
+
+# A loaded config (or the error raised while loading it), the hashes of the other
+# files it depends on, and the warnings emitted while loading it
+_LoadResult = Tuple[Union[Dict[str, Any], BaseException], Dict[str, str], List[Warning]]
+
+
+def _get_cache_key(config_file: Path) -> str:
+    return str(config_file.resolve())
+
+
+def _make_cache_entry(digest: str, result: _LoadResult) -> Optional[Dict[str, Any]]:
+    config, dependencies, caught_warnings = result
+    if isinstance(config, BaseException):
+        # Only valid configs are cached
+        return None
+    try:
+        # Copy the config, since callers are free to modify the config returned
+        cached_config = json.loads(json.dumps(config))
+    except (TypeError, ValueError):
+        return None
+    if cached_config != config:
+        # The config has values which cannot be represented in JSON
+        return None
+    return {
+        "digest": digest,
+        "config": cached_config,
+        "dependencies": dependencies,
+        "warnings": [[type(w).__name__, str(w)] for w in caught_warnings],
+    }
+
+
+def _load_config_capturing(
+    config_loader: ConfigLoader, config_file: Path
+) -> _LoadResult:
+    """
+    Load a config file without the cache, capturing errors and warnings so that they
+    can be raised by the caller
+    """
+    dependencies: Dict[str, str] = dict()
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        result: Union[Dict[str, Any], BaseException]
+        try:
+            config, errors = config_loader.check_config(config_file, dependencies)
+            if errors is not None:
+                raise next(iter(errors))
+            assert config is not None
+            result = config
+        except Exception as e:
+            result = e
+    return (result, dependencies, [cast(Warning, w.message) for w in caught])
+
+
+def _load_config_chunk(
+    config_loader: ConfigLoader, config_files: List[Path]
+) -> List[_LoadResult]:
+    """
+    Load config files in a worker process
+    """
+    return [
+        _load_config_capturing(config_loader, config_file)
+        for config_file in config_files
+    ]
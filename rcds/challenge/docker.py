@@ -1,15 +1,35 @@
 import base64
 import collections.abc
 import hashlib
+import io
 import json
+import posixpath
+import shutil
+import tarfile
+import time
+from functools import partial
 from pathlib import Path, PurePosixPath
-from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, Type, Union, cast
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    BinaryIO,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Type,
+    Union,
+    cast,
+)
 
 import docker  # type: ignore
 import pathspec  # type: ignore
 
+from ..util import JSONCache
+
 if TYPE_CHECKING:
     from ..project import Project
+    from ..project.blobs import BlobStore
     from .challenge import Challenge
 
 
@@ -21,6 +41,46 @@ def flatten(i: Iterable[Union[str, Iterable[str]]]) -> Iterable[str]:
             yield x
 
 
+def load_dockerignore(root: Path) -> Optional[pathspec.PathSpec]:
+    """
+    Load the ``.dockerignore`` file in a directory, if present
+
+    :param pathlib.Path root: Path to the directory containing the ``.dockerignore``
+    :returns: A spec matching ignored paths (relative to ``root``), or ``None`` if
+        there is no ``.dockerignore``
+    """
+    dockerignore = root / ".dockerignore"
+    if not dockerignore.exists():
+        return None
+    with dockerignore.open("r") as fd:
+        return pathspec.PathSpec.from_lines(
+            "gitwildmatch",
+            flatten(
+                # pathspec's behavior with negated patterns is different than that
+                # of docker (and its own behavior with non-negated patterns) in that
+                # patterns ending with `/` will match files in subdirectories, but
+                # not a file with the same name, and pattens not ending in `/` will
+                # only match files, but not files in subdirectories. For example,
+                # the pattern `!/a` will exclude `a`, but not `a/b`, and the pattern
+                # `!/a/` will exclude `a/b`, but not `a`. Since docker treats these
+                # interchangeably, we automatically insert the corresponding ignore
+                # rule into the rules list if a negated pattern is detected (insert
+                # `!/a/` if `!/a` is detected and vice versa).
+                # FIXME: normalize / parse the lines better to support e.g. comments
+                (
+                    (
+                        [line[:-2] + "\n", line]
+                        if line[-2] == "/"
+                        else [line, line[:-1] + "/\n"]
+                    )
+                    if line[0] == "!"
+                    else line
+                )
+                for line in fd
+            ),
+        )
+
+
 def get_context_files(root: Path) -> Iterator[Path]:
     """
     Generate a list of all files in the build context of the specified Dockerfile
@@ -29,53 +89,123 @@ def get_context_files(root: Path) -> Iterator[Path]:
         analyze
     """
     files: Iterator[Path] = root.rglob("*")
-    dockerignore = root / ".dockerignore"
-    if dockerignore.exists():
-        with dockerignore.open("r") as fd:
-            spec = pathspec.PathSpec.from_lines(
-                "gitwildmatch",
-                flatten(
-                    # pathspec's behavior with negated patterns is different than that
-                    # of docker (and its own behavior with non-negated patterns) in that
-                    # patterns ending with `/` will match files in subdirectories, but
-                    # not a file with the same name, and pattens not ending in `/` will
-                    # only match files, but not files in subdirectories. For example,
-                    # the pattern `!/a` will exclude `a`, but not `a/b`, and the pattern
-                    # `!/a/` will exclude `a/b`, but not `a`. Since docker treats these
-                    # interchangeably, we automatically insert the corresponding ignore
-                    # rule into the rules list if a negated pattern is detected (insert
-                    # `!/a/` if `!/a` is detected and vice versa).
-                    # FIXME: normalize / parse the lines better to support e.g. comments
-                    (
-                        (
-                            [line[:-2] + "\n", line]
-                            if line[-2] == "/"
-                            else [line, line[:-1] + "/\n"]
-                        )
-                        if line[0] == "!"
-                        else line
-                    )
-                    for line in fd
-                ),
-            )
+    spec = load_dockerignore(root)
+    if spec is not None:
         files = filter(lambda p: not spec.match_file(p.relative_to(root)), files)
     return filter(lambda p: p.is_file(), files)
 
 
-def generate_sum(root: Path) -> str:
+def _get_context_signature(root: Path, files: Iterable[Path]) -> str:
+    """
+    Generate a digest of the stat signature (path, size, mtime, inode) of all files
+    in a build context
+    """
+    h = hashlib.sha256()
+    for f in files:
+        st = f.stat()
+        h.update(
+            json.dumps(
+                [str(f.relative_to(root)), st.st_size, st.st_mtime_ns, st.st_ino]
+            ).encode()
+        )
+    return h.hexdigest()
+
+
+def generate_sum(root: Path, cache: Optional[JSONCache] = None) -> str:
     """
     Generate a checksum of all files in the build context of the specified directory
 
     :param pathlib.Path root: Path to the containing directory of the Dockerfile to
         analyze
+    :param cache: (Optional) cache of previously generated checksums. If provided,
+        files in the build context are only read if the path, size, modification
+        time, or inode of a file in the build context has changed since the checksum
+        was last generated.
+    :type cache: :class:`rcds.util.JSONCache`
     """
+    files = sorted(get_context_files(root), key=lambda f: str(f.relative_to(root)))
+    if cache is not None:
+        cache_key = str(root.resolve())
+        signature = _get_context_signature(root, files)
+        cached = cache.get(cache_key)
+        if cached is not None and cached["signature"] == signature:
+            return cached["sum"]
     h = hashlib.sha256()
-    for f in sorted(get_context_files(root), key=lambda f: str(f.relative_to(root))):
+    for f in files:
         h.update(bytes(f.relative_to(root)))
         with f.open("rb") as fd:
             for chunk in iter(lambda: fd.read(524288), b""):
                 h.update(chunk)
-    return h.hexdigest()
+    checksum = h.hexdigest()
+    if cache is not None:
+        cache.set(cache_key, {"signature": signature, "sum": checksum})
+    return checksum
+
+
+class _ChunkReader(io.RawIOBase):
+    """
+    A file-like object reading from an iterator of chunks of bytes, e.g. a streamed
+    HTTP response
+    """
+
+    _chunks: Iterator[bytes]
+    _buffer: bytes
+
+    def __init__(self, chunks: Iterable[bytes]):
+        self._chunks = iter(chunks)
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while len(self._buffer) == 0:
+            try:
+                self._buffer = next(self._chunks)
+            except StopIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+# The maximum number of symbolic links to follow when extracting a file from an
+# image (the same as Linux's limit)
+_MAX_SYMLINKS = 40
+
+
+def extract_file(container, path: str, fd: BinaryIO) -> None:
+    """
+    Copy a file out of a (not necessarily running) container
+
+    Symbolic links (e.g. ``/lib/x86_64-linux-gnu/libc.so.6``) are followed, so the
+    file that they point to is copied.
+
+    :param container: The container to copy the file from
+    :type container: :class:`docker.models.containers.Container`
+    :param str path: The absolute path to the file in the container
+    :param fd: The file to write the contents to
+    :raises ValueError: if the path is not a file
+    """
+    for _ in range(_MAX_SYMLINKS):
+        chunks, _ = container.get_archive(path)
+        # The archive is read as a stream, so the file does not need to fit in
+        # memory
+        reader = io.BufferedReader(_ChunkReader(chunks))
+        with tarfile.open(fileobj=reader, mode="r|") as tar:
+            member = tar.next()
+            if member is not None and member.issym():
+                path = posixpath.normpath(
+                    posixpath.join(posixpath.dirname(path), member.linkname)
+                )
+                continue
+            member_fd = tar.extractfile(member) if member is not None else None
+            if member_fd is None:
+                raise ValueError(f"'{path}' is not a file")
+            shutil.copyfileobj(member_fd, fd, 1024 * 1024)
+            return
+    raise ValueError(f"Too many levels of symbolic links at '{path}'")
 
 
 class Container:
@@ -88,6 +218,7 @@ class Container:
     project: "Project"
     name: str
     config: Dict[str, Any]
+    _image_id: Optional[str] = None
 
     IS_BUILDABLE: bool = False
 
@@ -127,6 +258,101 @@ class Container:
         """
         pass
 
+    def _get_image_id(self) -> str:
+        """
+        Get the ID of this container's image, pulling the image first so that it is
+        up to date with the registry
+
+        The image is only pulled once per :class:`Container`.
+        """
+        if self._image_id is None:
+            self._image_id = self.project.docker_client.images.pull(
+                self.get_full_tag()
+            ).id
+        return cast(str, self._image_id)
+
+    def _get_image_key(self, pull: bool = True) -> Optional[str]:
+        """
+        Get a key identifying the contents of this container's image, for caching
+        files extracted from it
+
+        :param bool pull: Whether the image may be pulled to find the key
+        :returns: The key, or ``None`` if ``pull`` is false and the contents of the
+            image cannot be identified without pulling it
+        """
+        tag = self.get_full_tag()
+        if "@" in tag:
+            # Images referenced by digest never change
+            return tag
+        # The tag of an image which is not built by rCDS (e.g. `redis:latest`) can
+        # be moved to a different image, so the image's ID is used instead
+        return self._get_image_id() if pull else None
+
+    def _create_container(self):
+        """
+        Create (but do not start) a container from this container's image
+
+        :returns: The container
+        :rtype: :class:`docker.models.containers.Container`
+        """
+        # The container is never started; a command is given in case the image does
+        # not have one
+        return self.project.docker_client.containers.create(
+            self._get_image_id(), command=["true"]
+        )
+
+    def get_file_key(self, path: str, pull: bool = True) -> Optional[str]:
+        """
+        Get a key identifying the contents of a file in this container's image
+
+        Files from buildable containers are keyed by the image's full tag, which
+        contains the checksum of the build context. Files from other containers are
+        keyed by the ID of the image, which is pulled to find it (unless the image
+        is referenced by digest).
+
+        :param str path: The absolute path to the file in the image
+        :param bool pull: Whether the image may be pulled to find the key
+        :returns: The key, or ``None`` if ``pull`` is false and the image would need
+            to be pulled
+        """
+        image_key = self._get_image_key(pull=pull)
+        if image_key is None:
+            return None
+        return hashlib.sha256(json.dumps([image_key, path]).encode()).hexdigest()
+
+    def _extract_file(self, path: str, fd: BinaryIO) -> None:
+        container = self._create_container()
+        try:
+            extract_file(container, path, fd)
+        finally:
+            container.remove(force=True)
+
+    def open_file(self, path: str, cache: JSONCache, blobs: "BlobStore") -> BinaryIO:
+        """
+        Open a file from this container's image, extracting it unless it is already
+        in a blob store
+
+        The file is copied out of a container which is created from the image, but
+        never started. If the image does not exist locally, it is pulled. Buildable
+        images must already be built (see :meth:`build`).
+
+        ``cache`` maps the :meth:`get_file_key` of each extracted file to its blob
+        (see :meth:`BlobStore.open_generated
+        <rcds.project.blobs.BlobStore.open_generated>`), so a file is only extracted
+        again once the image changes. Like :meth:`Archive.open_cached
+        <rcds.challenge.archive.Archive.open_cached>`, the returned file is meant to
+        be returned by an asset thunk, and extracted files are deleted from the
+        store once no asset refers to them.
+
+        :param str path: The absolute path to the file in the image
+        :param JSONCache cache: The cache mapping file keys to blobs
+        :param BlobStore blobs: The blob store that assets are added to
+        :returns: The file, open for reading
+        """
+        return blobs.open_generated(
+            cache, cast(str, self.get_file_key(path)), partial(self._extract_file, path)
+        )
+
 
 class BuildableContainer(Container):
     """
@@ -136,6 +362,8 @@ class BuildableContainer(Container):
     root: Path
     dockerfile: str
     buildargs: Dict[str, str]
+    _content_hash: Optional[str] = None
+    _image: Optional[str] = None
 
     IS_BUILDABLE: bool = True
 
@@ -152,8 +380,24 @@ class BuildableContainer(Container):
             self.root = self.challenge.root / Path(build["context"])
             self.dockerfile = build.get("dockerfile", "Dockerfile")
             self.buildargs = cast(Dict[str, str], build.get("args", dict()))
-        self.content_hash = generate_sum(self.root)
-        self.image = self.manager.get_docker_image(self)
+
+    @property
+    def content_hash(self) -> str:
+        """
+        The checksum of this container's build context, computed on first access
+        """
+        if self._content_hash is None:
+            self._content_hash = generate_sum(self.root, self.project.context_sum_cache)
+        return self._content_hash
+
+    @property
+    def image(self) -> str:
+        """
+        The image name (without a tag) for this container, computed on first access
+        """
+        if self._image is None:
+            self._image = self.manager.get_docker_image(self)
+        return self._image
 
     def _build(self) -> None:
         self.project.docker_client.images.build(
@@ -167,21 +411,47 @@ class BuildableContainer(Container):
         self.project.docker_client.images.push(
             self.image, tag=self.content_hash, auth_config=self.manager._auth_config
         )
+        self.project.registry_cache.set(self.get_full_tag(), time.time())
 
     def get_full_tag(self) -> str:
         return f"{self.image}:{self.content_hash}"
 
+    def _get_image_key(self, pull: bool = True) -> Optional[str]:
+        return self.get_full_tag()
+
+    def _create_container(self):
+        client = self.project.docker_client
+        tag = self.get_full_tag()
+        try:
+            return client.containers.create(tag, command=["true"])
+        except docker.errors.ImageNotFound:
+            client.images.pull(tag, auth_config=self.manager._auth_config)
+            return client.containers.create(tag, command=["true"])
+
     def is_built(self) -> bool:
         """
         Checks if a container built with a build context with a matching hash exists,
         either locally or remotely.
 
+        Tags which have been seen in the registry within the last
+        ``docker.registryCacheTtl`` seconds (see the project config) are assumed to
+        still exist, and the registry is not queried.
+
         :returns: Whether or not the image was found
         """
+        tag = self.get_full_tag()
+        confirmed_at = self.project.registry_cache.get(tag)
+        if (
+            confirmed_at is not None
+            and time.time() - confirmed_at
+            < self.project.config["docker"]["registryCacheTtl"]
+        ):
+            return True
         try:
             self.project.docker_client.images.get_registry_data(
-                self.get_full_tag(), auth_config=self.manager._auth_config
+                tag, auth_config=self.manager._auth_config
             )
+            self.project.registry_cache.set(tag, time.time())
             return True
         except docker.errors.NotFound:
             pass  # continue
@@ -220,10 +490,15 @@ class ContainerManager:
     project: "Project"
     config: Dict[str, Dict[str, Any]]
     containers: Dict[str, Container]
-    _auth_config: Dict[str, str]
+    _auth_config_cache: Optional[Dict[str, str]] = None
 
     def __init__(self, challenge: "Challenge"):
         """
+        If the challenge is deployed, the full image tag of each container is written
+        to the challenge's config (under ``containers.<name>.image``) for use by
+        container backends. Otherwise, no image tags are resolved (and no build
+        contexts are read) until they are requested.
+
         :param rcds.Challenge challenge: The challenge that this ContainerManager
             belongs to
         """
@@ -235,8 +510,6 @@ class ContainerManager:
             Dict[str, Dict[str, Any]], self.challenge.config.get("containers", dict())
         )
 
-        self._auth_config = self._get_auth_config()
-
         for name in self.config.keys():
             container_config = self.config[name]
             container_constructor: Type[Container]
@@ -247,7 +520,8 @@ class ContainerManager:
             self.containers[name] = container_constructor(
                 container_manager=self, name=name
             )
-            container_config["image"] = self.containers[name].get_full_tag()
+            if self.challenge.config.get("deployed", True):
+                container_config["image"] = self.containers[name].get_full_tag()
 
     def get_docker_image(self, container: Container) -> str:
         image_template = self.project.jinja_env.from_string(
@@ -264,6 +538,12 @@ class ContainerManager:
             PurePosixPath(self.project.config["docker"]["image"]["prefix"]) / image
         )
 
+    @property
+    def _auth_config(self) -> Dict[str, str]:
+        if self._auth_config_cache is None:
+            self._auth_config_cache = self._get_auth_config()
+        return self._auth_config_cache
+
     def _get_auth_config(self) -> Dict[str, str]:
         registry, _ = docker.auth.resolve_repository_name(
             self.project.config["docker"]["image"]["prefix"]
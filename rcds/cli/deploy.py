@@ -1,14 +1,151 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from sys import exit
+from typing import Dict, List, Optional, Tuple, Union
 
 import click
+import docker  # type: ignore
 
 import rcds
 import rcds.challenge.docker
+from rcds.backend import BackendContainerRuntime, BackendScoreboard, SyncError
+from rcds.project.assets import AssetManagerTransaction
+from rcds.project.changes import (
+    ChangeDetectionError,
+    get_changed_challenges_since_ref,
+    get_changed_challenges_since_time,
+)
+from rcds.project.journal import get_digest
 from rcds.util import SUPPORTED_EXTENSIONS, find_files
 
 
+class BuildJob:
+    """
+    Check (and, if necessary, build and push) a single container
+
+    Output is buffered so that it can be printed in a deterministic order once the
+    job has finished.
+    """
+
+    challenge: rcds.Challenge
+    container_name: str
+    container: rcds.challenge.docker.Container
+    output: List[str]
+
+    def __init__(
+        self,
+        challenge: rcds.Challenge,
+        container_name: str,
+        container: rcds.challenge.docker.Container,
+    ) -> None:
+        self.challenge = challenge
+        self.container_name = container_name
+        self.container = container
+        self.output = []
+
+    def _log(self, message: str) -> None:
+        self.output.append(f"{self.challenge.config['id']}: {message}")
+
+    def __call__(self) -> None:
+        journal = self.challenge.project.deploy_journal
+        challenge_id = self.challenge.config["id"]
+        step = f"image:{self.container_name}"
+        digest = get_digest(self.container.get_full_tag())
+        if journal.is_done(challenge_id, step, digest):
+            self._log(f"container {self.container_name} already pushed")
+            return
+        self._log(f"checking container {self.container_name}")
+        if not self.container.is_built():
+            self._log(
+                f"building container {self.container_name}"
+                f" ({self.container.get_full_tag()})"
+            )
+            self.container.build()
+        journal.mark_done(challenge_id, step, digest)
+
+
+def run_build_jobs(build_jobs: List[BuildJob], jobs: int) -> None:
+    """
+    Run build jobs on a pool of ``jobs`` workers
+
+    Output from each job is printed in the order that the jobs were given in. If a
+    job fails, no further jobs are started; jobs which are already running are
+    allowed to finish before the exception is re-raised.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures: List["Future[None]"] = [executor.submit(job) for job in build_jobs]
+        flushed = 0
+
+        def flush() -> None:
+            nonlocal flushed
+            while flushed < len(futures) and futures[flushed].done():
+                if not futures[flushed].cancelled():
+                    for line in build_jobs[flushed].output:
+                        click.echo(line)
+                flushed += 1
+
+        pending = set(futures)
+        error = None
+        while pending and error is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            error = next(
+                (f.exception() for f in done if f.exception() is not None), None
+            )
+            flush()
+        for future in pending:
+            future.cancel()
+    flush()
+    if error is not None:
+        raise error
+
+
 @click.command()
-def deploy() -> None:
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default=True,
+    help=(
+        "Number of processes to load challenges with, and number of containers to"
+        " check, build, and push (and assets to generate) concurrently"
+    ),
+)
+@click.option(
+    "--recheck-registry",
+    is_flag=True,
+    help=(
+        "Query the registry for all images, ignoring previously seen tags and"
+        " images pushed by an interrupted deploy"
+    ),
+)
+@click.option(
+    "--fresh",
+    is_flag=True,
+    help="Redo every step, ignoring steps completed by an interrupted deploy",
+)
+@click.option(
+    "--changed",
+    is_flag=True,
+    help=(
+        "Only deploy challenges which have changed since the last deploy (or since"
+        " --since); other challenges are left as they are"
+    ),
+)
+@click.option(
+    "--since",
+    metavar="REF",
+    help="Only deploy challenges changed since a git ref (implies --changed)",
+)
+def deploy(
+    jobs: int,
+    recheck_registry: bool,
+    fresh: bool,
+    changed: bool,
+    since: Optional[str],
+) -> None:
+    deploy_start_time = time.time()
     try:
         project_config = find_files(["rcds"], SUPPORTED_EXTENSIONS, recurse=True)[
             "rcds"
@@ -17,29 +154,107 @@ def deploy() -> None:
         click.echo("Could not find project root!")
         exit(1)
     click.echo(f"Loading project at {project_config}")
-    project = rcds.Project(project_config)
+    project = rcds.Project(
+        project_config, docker_client=docker.from_env(max_pool_size=max(jobs, 10))
+    )
+    journal = project.deploy_journal
+    if recheck_registry:
+        project.registry_cache.clear()
+        # Images pushed by an interrupted deploy would otherwise not be checked
+        journal.clear_steps("image:")
+    if fresh:
+        journal.clear()
     click.echo("Initializing backends")
     project.load_backends()
     click.echo("Loading challenges")
-    project.load_all_challenges()
-    for challenge in project.challenges.values():
-        cm = rcds.challenge.docker.ContainerManager(challenge)
-        for container_name, container in cm.containers.items():
-            click.echo(f"{challenge.config['id']}: checking container {container_name}")
-            if not container.is_built():
-                click.echo(
-                    f"{challenge.config['id']}: building container {container_name}"
-                    f" ({container.get_full_tag()})"
+    project.load_all_challenges(jobs=jobs)
+    challenges: Optional[List[rcds.Challenge]] = None
+    try:
+        if since is not None:
+            challenges = get_changed_challenges_since_ref(project, since)
+        elif changed:
+            last_deploy_time = project.deploy_state.get("lastDeployTime")
+            if last_deploy_time is not None:
+                challenges = get_changed_challenges_since_time(
+                    project, last_deploy_time
                 )
-                container.build()
-        challenge.create_transaction().commit()
-    if project.container_backend is not None:
-        click.echo("Commiting container backend")
-        project.container_backend.commit()
-    else:
-        click.echo("WARN: no container backend, skipping...")
-    if project.scoreboard_backend is not None:
-        click.echo("Commiting scoreboard backend")
-        project.scoreboard_backend.commit()
-    else:
-        click.echo("WARN: no scoreboard backend, skipping...")
+            else:
+                click.echo("No previous deploy found, deploying all challenges")
+    except ChangeDetectionError as e:
+        click.echo(f"Could not find changed challenges: {e}")
+        exit(1)
+    if challenges is not None:
+        click.echo(
+            f"Deploying {len(challenges)} changed challenge(s): "
+            + ", ".join(c.config["id"] for c in challenges)
+        )
+    deploy_challenges = (
+        challenges if challenges is not None else list(project.challenges.values())
+    )
+    build_jobs: List[BuildJob] = []
+    for challenge in deploy_challenges:
+        cm = challenge.get_container_manager()
+        for container_name, container in cm.containers.items():
+            build_jobs.append(BuildJob(challenge, container_name, container))
+    run_build_jobs(build_jobs, jobs)
+    asset_digests: Dict[str, str] = dict()
+    transactions: Dict[str, AssetManagerTransaction] = dict()
+    for challenge in deploy_challenges:
+        challenge_id = challenge.config["id"]
+        transaction = challenge.create_transaction()
+        asset_digests[challenge_id] = transaction.get_digest()
+        if journal.is_done(challenge_id, "assets", asset_digests[challenge_id]):
+            transaction.abort()
+        else:
+            transactions[challenge_id] = transaction
+    project.asset_manager.commit_transactions(transactions.values(), jobs=jobs)
+    journal.mark_all_done(
+        "assets",
+        {challenge_id: asset_digests[challenge_id] for challenge_id in transactions},
+    )
+    # Backends may modify challenge configs while committing, so digests are
+    # computed beforehand
+    commit_digests: Dict[str, str] = {
+        c.config["id"]: get_digest(
+            project.config, c.config, asset_digests[c.config["id"]]
+        )
+        for c in deploy_challenges
+    }
+    backends: List[
+        Tuple[str, Optional[Union[BackendContainerRuntime, BackendScoreboard]]]
+    ] = [
+        ("container", project.container_backend),
+        ("scoreboard", project.scoreboard_backend),
+    ]
+    for backend_type, backend in backends:
+        if backend is None:
+            click.echo(f"WARN: no {backend_type} backend, skipping...")
+            continue
+        click.echo(f"Commiting {backend_type} backend")
+        step = f"{backend_type}-backend"
+        pending = [
+            c
+            for c in deploy_challenges
+            if not journal.is_done(c.config["id"], step, commit_digests[c.config["id"]])
+        ]
+        if len(pending) != len(deploy_challenges):
+            click.echo(
+                f"Skipping {len(deploy_challenges) - len(pending)} challenge(s)"
+                " already committed by a previous deploy"
+            )
+        try:
+            backend.commit(
+                challenges if len(pending) == len(deploy_challenges) else pending
+            )
+        except SyncError as e:
+            click.echo(f"ERROR: {e}", err=True)
+            for name, error in sorted(e.errors.items()):
+                click.echo(f"  {name}: {error}", err=True)
+            exit(1)
+        journal.mark_all_done(step, commit_digests)
+    # The deploy is complete; there is nothing left to resume
+    journal.clear()
+    if since is None:
+        # Challenges changed since the last deploy, but not since the git ref, were
+        # not deployed when --since is given
+        project.deploy_state.set("lastDeployTime", deploy_start_time)
@@ -16,3 +16,8 @@ class SchemaValidationError(ValidationError):
         super().__init__(message)
 
         self.cause = cause
+
+    def __reduce__(self):
+        # Exceptions are pickled with only their args; include the cause so that
+        # errors can be sent between processes
+        return (type(self), (str(self), self.cause))
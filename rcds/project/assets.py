@@ -1,9 +1,12 @@
+import dataclasses
 import io
 import json
 import os
 import pathlib
 import shutil
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
 from typing import (
     TYPE_CHECKING,
@@ -12,6 +15,8 @@ from typing import (
     Callable,
     Dict,
     Iterable,
+    List,
+    Optional,
     Set,
     Tuple,
     Union,
@@ -19,6 +24,10 @@ from typing import (
 )
 from warnings import warn
 
+from ..util import hash_file
+from .blobs import BlobStore
+from .journal import get_digest
+
 if TYPE_CHECKING:
     import rcds
 
@@ -40,6 +49,13 @@ Valid types:
 """
 
 
+def _unlink_if_exists(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+
+
 def _is_valid_name(name: str):
     return (
         len(pathlib.PurePosixPath(name).parts) == 1
@@ -64,6 +80,7 @@ class AssetManagerTransaction:
 
     _asset_manager_context: "AssetManagerContext"
     _is_active: bool
+    _files_to_delete: Set[str]
 
     @dataclass
     class _FileEntry:
@@ -98,7 +115,7 @@ class AssetManagerTransaction:
             (:attr:`os.stat_result.st_mtime`)
         :param contents: The contents of the file - this can either be the contents
             directly as a :const:`File`, or a thunk function that, when calls, returns
-            the contents
+            the contents. File objects are closed once they have been read.
         :type contents: :const:`File` or :obj:`Callable[[], File]`
         :raises RuntimeError: if the transaction has already been committed
         :raises ValueError: if the asset name is not valid
@@ -129,51 +146,158 @@ class AssetManagerTransaction:
             raise ValueError(f"Provided file does not exist: '{str(file)}'")
         self.add(name, file.stat().st_mtime, lambda: file)
 
-    def _create(self, fpath: Path, fentry: _FileEntry) -> None:
+    def _create(
+        self,
+        fpath: Path,
+        fentry: _FileEntry,
+        previous: Optional["AssetManagerContext._ManifestEntry"],
+    ) -> "AssetManagerContext._ManifestEntry":
         """
         Create / overwrite the asset in the cache
 
         :meta private:
+        :param previous: The manifest entry for the existing asset, if any
+        :returns: The manifest entry for the asset
         """
         contents = fentry.get_contents[0]()
         if isinstance(contents, Path):
             if not contents.is_file():
                 raise ValueError(f"Provided file does not exist: '{str(contents)}'")
+            _unlink_if_exists(fpath)
             fpath.symlink_to(contents)
-        else:
-            if isinstance(contents, ByteString):
-                contents = io.BytesIO(contents)
-            assert isinstance(contents, io.IOBase)
-            with fpath.open("wb") as ofd:
-                shutil.copyfileobj(contents, ofd)
-        os.utime(fpath, (fentry.mtime, fentry.mtime))
+            entry = AssetManagerContext._ManifestEntry(mtime=fentry.mtime)
+            entry._update_target(fpath)
+            return entry
+        if isinstance(contents, ByteString):
+            contents = io.BytesIO(contents)
+        assert isinstance(contents, io.IOBase)
+        blobs = self._asset_manager_context._asset_manager.blobs
+        with contents:
+            blob = blobs.add(cast(BinaryIO, contents))
+        if previous is None or previous.blob != blob or not fpath.exists():
+            _unlink_if_exists(fpath)
+            blobs.materialize(blob, fpath)
+        # Otherwise, the contents are unchanged, and the existing file is kept
+        return AssetManagerContext._ManifestEntry(
+            mtime=fentry.mtime,
+            size=blobs.get_path(blob).stat().st_size,
+            sha256=blob,
+            blob=blob,
+        )
+
+    def get_digest(self) -> str:
+        """
+        Get a digest identifying the names and modification times of the files
+        added to this transaction
+
+        Committing two transactions with the same digest produces the same context.
+        """
+        return get_digest(
+            sorted((name, entry.mtime) for name, entry in self._files.items())
+        )
+
+    def abort(self) -> None:
+        """
+        Abandon the transaction without changing the context.
+
+        This transaction can no longer be used after :meth:`abort` is called.
+        """
+        self._is_active = False
+        self._asset_manager_context._is_transaction_active = False
 
     def commit(self) -> None:
         """
         Commit the transaction.
 
-        This transaction can no longer be used after :meth:`commit` is called.
+        This transaction can no longer be used after :meth:`commit` is called. To
+        commit many transactions concurrently, use
+        :meth:`AssetManager.commit_transactions`.
+        """
+        self._finish(self._start(None))
+
+    def _start(
+        self, executor: Optional[Executor]
+    ) -> List[Tuple[str, Optional[str], "Future[AssetManagerContext._ManifestEntry]"]]:
+        """
+        Start creating the assets which are out of date in the cache
+
+        :meta private:
+        :param executor: The executor to create the assets on, or ``None`` to
+            create them immediately
+        :returns: The assets being created, as tuples of the asset's name, the blob
+            of the asset being replaced (if any), and the future manifest entry
         """
         self._is_active = False
-        self._asset_manager_context._is_transaction_active = False
-        files_to_delete = set(self._asset_manager_context.ls())
+        ctx = self._asset_manager_context
+        ctx._is_transaction_active = False
+        self._files_to_delete = set(ctx.ls())
+        pending = []
         for name, file_entry in self._files.items():
-            fpath = self._asset_manager_context._get(name)
-            try:
-                files_to_delete.remove(name)
-            except KeyError:
-                pass
-            if self._asset_manager_context.exists(name):
-                cache_mtime = self._asset_manager_context.get_mtime(name)
+            fpath = ctx._get(name)
+            self._files_to_delete.discard(name)
+            previous: Optional[AssetManagerContext._ManifestEntry] = None
+            if ctx.exists(name):
+                cache_mtime = ctx.get_mtime(name)
                 if not file_entry.mtime > cache_mtime:
                     continue
-            self._create(fpath, file_entry)
-            self._asset_manager_context._add(name, force=True)
-        for name in files_to_delete:
-            fpath = self._asset_manager_context.get(name)
-            fpath.unlink()
-            self._asset_manager_context._rm(name)
-        self._asset_manager_context.sync(check=True)
+                previous = ctx._files[name]
+            create = partial(self._create, fpath, file_entry, previous)
+            future: "Future[AssetManagerContext._ManifestEntry]"
+            if executor is not None:
+                future = executor.submit(create)
+            else:
+                future = Future()
+                try:
+                    future.set_result(create())
+                except Exception as e:
+                    future.set_exception(e)
+            pending.append(
+                (name, previous.blob if previous is not None else None, future)
+            )
+        return pending
+
+    def _finish(
+        self,
+        pending: List[
+            Tuple[str, Optional[str], "Future[AssetManagerContext._ManifestEntry]"]
+        ],
+    ) -> None:
+        """
+        Wait for the assets started by :meth:`_start` to be created, then update
+        the context's manifest
+
+        Assets which were created successfully are recorded in the manifest even if
+        others failed, so that it stays consistent with the files on disk.
+
+        :meta private:
+        :raises Exception: the first error raised while creating an asset
+        """
+        ctx = self._asset_manager_context
+        released_blobs: List[str] = []
+        error: Optional[BaseException] = None
+        for name, previous_blob, future in pending:
+            try:
+                entry = future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+                continue
+            if previous_blob is not None:
+                released_blobs.append(previous_blob)
+            ctx._add(name, force=True, entry=entry)
+        if error is None:
+            for name in self._files_to_delete:
+                fpath = ctx.get(name)
+                old_blob = ctx._files[name].blob
+                if old_blob is not None:
+                    released_blobs.append(old_blob)
+                fpath.unlink()
+                ctx._rm(name)
+        ctx.sync(check=error is None)
+        # Blobs are only released once the manifest no longer refers to them
+        ctx._asset_manager.blobs.release(released_blobs)
+        if error is not None:
+            raise error
 
 
 class AssetManagerContext:
@@ -187,10 +311,56 @@ class AssetManagerContext:
     :meth:`AssetManager.create_context`
     """
 
+    @dataclass
+    class _ManifestEntry:
+        """
+        :meta private:
+        """
+
+        # Fields are None if unknown (the asset was added by an older version of
+        # rCDS)
+        mtime: Optional[float] = None
+        size: Optional[int] = None
+        sha256: Optional[str] = None
+        # The digest of the blob backing the asset, or None if the asset is a
+        # symlink (or was added by an older version of rCDS)
+        blob: Optional[str] = None
+        # For symlinks, the stat signature of the file linked to when it was hashed;
+        # the file can be changed without changing the asset, so it is rehashed if
+        # these (or its size) change. The ctime is included because restoring a
+        # file's mtime (e.g. with `cp -p`) changes its ctime
+        target_mtime_ns: Optional[int] = None
+        target_ctime_ns: Optional[int] = None
+        target_ino: Optional[int] = None
+
+        def _is_stale(self, path: Path) -> bool:
+            if self.size is None or self.sha256 is None:
+                return True
+            if self.blob is not None:
+                # Blobs are never modified
+                return False
+            st = path.stat()
+            return (st.st_size, st.st_mtime_ns, st.st_ctime_ns, st.st_ino) != (
+                self.size,
+                self.target_mtime_ns,
+                self.target_ctime_ns,
+                self.target_ino,
+            )
+
+        def _update_target(self, path: Path) -> None:
+            # The file is stat'd before it is hashed, so that if it is modified
+            # while it is being hashed, it is hashed again next time
+            st = path.stat()
+            self.size = st.st_size
+            self.target_mtime_ns = st.st_mtime_ns
+            self.target_ctime_ns = st.st_ctime_ns
+            self.target_ino = st.st_ino
+            self.sha256 = hash_file(path)
+
     _asset_manager: "AssetManager"
     _name: str
     _root: Path
-    _files: Set[str]
+    _files: Dict[str, _ManifestEntry]
     _files_root: Path
     _manifest_file: Path
 
@@ -202,7 +372,7 @@ class AssetManagerContext:
         """
         self._asset_manager = asset_manager
         self._name = name
-        self._files = set()
+        self._files = dict()
         self._is_transaction_active = False
         self._root = self._asset_manager.root / name
         self._root.mkdir(parents=True, exist_ok=True)
@@ -213,12 +383,19 @@ class AssetManagerContext:
         try:
             with self._manifest_file.open("r") as fd:
                 manifest = json.load(fd)
-            self._files = set(manifest["files"])
+            if isinstance(manifest["files"], list):
+                # Older versions of rCDS only recorded the names of assets
+                self._files = {fn: self._ManifestEntry() for fn in manifest["files"]}
+            else:
+                self._files = {
+                    fn: self._ManifestEntry(**entry)
+                    for fn, entry in manifest["files"].items()
+                }
             for fn in list(self._files):
                 f = self._get(fn)
                 if f.is_symlink() and not f.exists():
                     # Broken symlink; remove it
-                    self._files.remove(fn)
+                    del self._files[fn]
                     f.unlink()
             self.sync()
         except FileNotFoundError:
@@ -251,7 +428,8 @@ class AssetManagerContext:
         Syncs the manifest for this context to disk
 
         :param bool check: If true (default), check to make sure all files in the
-            manifest exist, and that there are no extra files
+            manifest exist, and that there are no extra files, and update the
+            recorded size and digest of assets whose files have changed
         """
         if check:
             disk = set(self._files_root.iterdir())
@@ -268,21 +446,40 @@ class AssetManagerContext:
                     extra.unlink()
             for missing in files - disk:
                 raise RuntimeError(f"Cache item missing: '{str(missing)}'")
-        with self._manifest_file.open("w") as fd:
-            json.dump({"files": sorted(self._files)}, fd)
-
-    def _add(self, name: str, *, force: bool = False) -> None:
+            for fn, entry in self._files.items():
+                # Assets added by older versions of rCDS are hashed lazily
+                if entry.sha256 is not None and entry._is_stale(self._get(fn)):
+                    entry._update_target(self._get(fn))
+        manifest = {
+            "files": {
+                fn: dataclasses.asdict(entry)
+                for fn, entry in sorted(self._files.items())
+            }
+        }
+        tmp_file = self._manifest_file.with_name(f".{self._manifest_file.name}.tmp")
+        with tmp_file.open("w") as fd:
+            json.dump(manifest, fd)
+        os.replace(str(tmp_file), str(self._manifest_file))
+
+    def _add(
+        self,
+        name: str,
+        *,
+        force: bool = False,
+        entry: Optional["AssetManagerContext._ManifestEntry"] = None,
+    ) -> None:
         """
         Add an asset to the manifest
 
         :meta private:
         :param str name: The name of the asset
         :param bool force: If true, do not error if the asset already exists
+        :param entry: The manifest entry for the asset, if known
         """
         self._assert_valid_name(name)
         if not force and name in self._files:
             raise FileExistsError(f"Asset already exists: '{name}'")
-        self._files.add(name)
+        self._files[name] = entry if entry is not None else self._ManifestEntry()
 
     def _rm(self, name: str, *, force: bool = False) -> None:
         """
@@ -294,7 +491,7 @@ class AssetManagerContext:
         """
         self._assert_valid_name(name)
         try:
-            self._files.remove(name)
+            del self._files[name]
         except KeyError:
             if not force:
                 raise FileNotFoundError(f"Asset not found: '{name}'")
@@ -345,16 +542,60 @@ class AssetManagerContext:
         :param str name: The name of the asset
         :returns: The time the asset was modified (:attr`os.stat_result.st_mtime`)
         """
-        return self.get(name).stat().st_mtime
+        path = self.get(name)
+        mtime = self._files[name].mtime
+        if mtime is None:
+            return path.stat().st_mtime
+        return mtime
+
+    def _get_entry(self, name: str) -> "AssetManagerContext._ManifestEntry":
+        """
+        Get the manifest entry for an asset, filling in its size and digest if they
+        are unknown
+
+        :meta private:
+        """
+        path = self.get(name)
+        entry = self._files[name]
+        if entry._is_stale(path):
+            entry._update_target(path)
+            self.sync(check=False)
+        return entry
+
+    def get_size(self, name: str) -> int:
+        """
+        Retrieves the size of an asset
+
+        :param str name: The name of the asset
+        :returns: The size of the asset, in bytes
+        """
+        return cast(int, self._get_entry(name).size)
+
+    def get_sha256(self, name: str) -> str:
+        """
+        Retrieves the SHA-256 digest of an asset's contents
+
+        The digest is recorded when the asset is added, so the asset is only read
+        again if it is a link to a file whose size, modification time, or inode
+        has changed since.
+
+        :param str name: The name of the asset
+        :returns: The hex digest
+        """
+        return cast(str, self._get_entry(name).sha256)
 
     def clear(self) -> None:
         """
         Clear all files in this context
         """
-        for f in self.ls():
+        released_blobs: List[str] = []
+        for f, entry in self._files.items():
             self.get(f).unlink()
-        self._files = set()
+            if entry.blob is not None:
+                released_blobs.append(entry.blob)
+        self._files = dict()
         self.sync(check=True)
+        self._asset_manager.blobs.release(released_blobs)
 
 
 class AssetManager:
@@ -366,11 +607,13 @@ class AssetManager:
 
     project: "Project"
     root: Path
+    blobs: BlobStore
 
     def __init__(self, project: "rcds.Project"):
         self.project = project
         self.root = self.project.root / ".rcds-cache" / "assets"
         self.root.mkdir(parents=True, exist_ok=True)
+        self.blobs = BlobStore(self.project.root / ".rcds-cache" / "blobs")
 
     def create_context(self, name: str) -> AssetManagerContext:
         """
@@ -383,6 +626,36 @@ class AssetManager:
             raise ValueError(f"Invalid context name '{name}'")
         return AssetManagerContext(self, name)
 
+    def commit_transactions(
+        self, transactions: Iterable[AssetManagerTransaction], *, jobs: int = 1
+    ) -> None:
+        """
+        Commit many transactions at once, creating their assets on a pool of
+        ``jobs`` threads
+
+        Assets from all of the transactions share the same pool, so thunks from
+        different transactions, and from within the same transaction, run
+        concurrently. Each context's manifest is still written once, atomically,
+        after all of its assets have been created. If an asset fails to be created,
+        the other transactions are still committed.
+
+        :param transactions: The transactions to commit; each must be in a
+            different context
+        :param int jobs: The number of assets to create at once
+        :raises Exception: the first error raised while committing a transaction
+        """
+        error: Optional[BaseException] = None
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            started = [(t, t._start(executor)) for t in transactions]
+            for transaction, pending in started:
+                try:
+                    transaction._finish(pending)
+                except Exception as e:
+                    if error is None:
+                        error = e
+        if error is not None:
+            raise error
+
     def list_context_names(self) -> Iterable[str]:
         """
         List the names of all subcontexts within this :class:`AssetManager`
@@ -0,0 +1,218 @@
+"""
+Content-addressed storage for asset contents
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from functools import partial
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, cast
+
+from rcds.util import JSONCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+
+# From linux/fs.h
+_FICLONE = 0x40049409
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def _reflink(src: Path, dest: Path) -> None:
+    """
+    Create ``dest`` as a copy-on-write clone of ``src``
+
+    :raises OSError: if the platform or filesystem does not support reflinks
+    """
+    if fcntl is None:
+        raise OSError("Reflinks are not supported on this platform")
+    with src.open("rb") as src_fd, dest.open("wb") as dest_fd:
+        fcntl.ioctl(dest_fd.fileno(), _FICLONE, src_fd.fileno())
+
+
+class BlobStore:
+    """
+    A store of file contents (blobs), addressed by their SHA-256 digest
+
+    Each unique blob is stored once, no matter how many assets it backs. The
+    number of references to each blob is kept in an index; a blob is deleted once
+    it is no longer referenced. Blobs are copied out of the store with
+    :meth:`materialize`, which uses hardlinks where possible, so materialized
+    files must never be modified in place.
+
+    References are added before the files that use them are written, and removed
+    after, so if rCDS is interrupted, blobs may be leaked, but a blob which is
+    still in use is never deleted. This class is safe to use from multiple
+    threads.
+    """
+
+    root: Path
+    _index: JSONCache
+    _lock: threading.Lock
+
+    def __init__(self, root: Path):
+        """
+        :param pathlib.Path root: The directory to store blobs in
+        """
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._index = JSONCache(self.root / "index.json")
+        self._lock = threading.Lock()
+
+    def get_path(self, digest: str) -> Path:
+        """
+        Get the path to a blob in the store
+
+        :param str digest: The SHA-256 digest of the blob
+        """
+        return self.root / digest[:2] / digest
+
+    def get_refcount(self, digest: str) -> int:
+        """
+        Get the number of references to a blob
+
+        :param str digest: The SHA-256 digest of the blob
+        """
+        return self._index.get(digest, 0)
+
+    def add(self, contents: BinaryIO) -> str:
+        """
+        Add a blob to the store, and add a reference to it
+
+        :param contents: The contents of the blob, which are read until EOF
+        :returns: The SHA-256 digest of the blob
+        """
+        if contents.seekable():
+            # Hash the contents first, so that nothing is written if the blob is
+            # already in the store
+            start = contents.tell()
+            h = hashlib.sha256()
+            for chunk in iter(partial(contents.read, _CHUNK_SIZE), b""):
+                h.update(chunk)
+            digest = h.hexdigest()
+            with self._lock:
+                if self.get_path(digest).exists():
+                    self._index.set(digest, self._index.get(digest, 0) + 1)
+                    return digest
+            contents.seek(start)
+        tmp_path = self.root / f".{uuid.uuid4().hex}.tmp"
+        try:
+            h = hashlib.sha256()
+            with tmp_path.open("xb") as ofd:
+                for chunk in iter(partial(contents.read, _CHUNK_SIZE), b""):
+                    h.update(chunk)
+                    ofd.write(chunk)
+            digest = h.hexdigest()
+            path = self.get_path(digest)
+            with self._lock:
+                if path.exists():
+                    tmp_path.unlink()
+                else:
+                    path.parent.mkdir(exist_ok=True)
+                    os.replace(str(tmp_path), str(path))
+                self._index.set(digest, self._index.get(digest, 0) + 1)
+        except BaseException:
+            if tmp_path.exists():
+                tmp_path.unlink()
+            raise
+        return digest
+
+    def open_generated(
+        self, index: JSONCache, key: str, generate: Callable[[BinaryIO], None]
+    ) -> BinaryIO:
+        """
+        Open the contents generated for a key, generating them unless they are
+        already in the store
+
+        ``index`` maps each key to the digest of the blob generated for it. If that
+        blob is still in the store, it is opened. Otherwise, ``generate`` writes the
+        contents to a temporary file, which is recorded in the index and returned.
+        Either way, the caller should :meth:`add` the returned file, adding the
+        reference that keeps the blob in the store; once no references remain, the
+        blob is deleted, and it is generated again the next time it is needed.
+        Entries of the index whose blobs have been deleted are dropped.
+
+        :param JSONCache index: The index of generated blobs
+        :param str key: A key identifying the contents
+        :param generate: Function to write the contents to a file
+        :returns: The contents, open for reading
+        """
+        blob = index.get(key)
+        if blob is not None:
+            try:
+                return self.get_path(blob).open("rb")
+            except FileNotFoundError:
+                pass
+        fd = cast(BinaryIO, tempfile.TemporaryFile())
+        try:
+            generate(fd)
+            fd.seek(0)
+            h = hashlib.sha256()
+            for chunk in iter(partial(fd.read, _CHUNK_SIZE), b""):
+                h.update(chunk)
+            fd.seek(0)
+        except BaseException:
+            fd.close()
+            raise
+        index.remove(
+            k for k, b in index.items() if k != key and not self.get_path(b).exists()
+        )
+        index.set(key, h.hexdigest())
+        return fd
+
+    def release(self, digests: Iterable[str]) -> None:
+        """
+        Remove references to blobs, deleting the blobs which are no longer
+        referenced
+
+        :param digests: The SHA-256 digests of the blobs, once per reference to
+            remove
+        """
+        with self._lock:
+            refcounts: Dict[str, int] = dict()
+            for digest in digests:
+                refcounts[digest] = (
+                    refcounts.get(digest, self._index.get(digest, 0)) - 1
+                )
+            if len(refcounts) == 0:
+                return
+            for digest, refcount in refcounts.items():
+                if refcount <= 0:
+                    try:
+                        self.get_path(digest).unlink()
+                    except FileNotFoundError:
+                        pass
+            referenced = {d: r for d, r in refcounts.items() if r > 0}
+            if len(referenced) != 0:
+                self._index.update(referenced)
+            if len(referenced) != len(refcounts):
+                self._index.remove(d for d in refcounts if d not in referenced)
+
+    def materialize(self, digest: str, dest: Path) -> None:
+        """
+        Create a file at ``dest`` with the contents of a blob, as a hardlink to the
+        blob if possible, or else as a reflink (copy-on-write clone) or a copy
+
+        :param str digest: The SHA-256 digest of the blob
+        :param pathlib.Path dest: The file to create, which must not exist
+        """
+        path = self.get_path(digest)
+        try:
+            os.link(str(path), str(dest))
+            return
+        except OSError:
+            pass
+        try:
+            _reflink(path, dest)
+            return
+        except OSError:
+            if dest.exists():
+                dest.unlink()
+        shutil.copyfile(str(path), str(dest))
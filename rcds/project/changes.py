@@ -0,0 +1,114 @@
+"""
+Detection of challenges which have changed since a previous deploy
+"""
+
+import os
+import subprocess
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Iterable, List, Set
+
+if TYPE_CHECKING:
+    from ..challenge import Challenge
+    from .project import Project
+
+
+class ChangeDetectionError(RuntimeError):
+    pass
+
+
+def _run_git(root: Path, *args: str) -> List[str]:
+    try:
+        result = subprocess.run(
+            ["git", *args],
+            cwd=str(root),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+    except FileNotFoundError:
+        raise ChangeDetectionError("git is not installed")
+    except subprocess.CalledProcessError as e:
+        raise ChangeDetectionError(
+            f"git {' '.join(args)} failed: {e.stderr.strip()}"
+        ) from e
+    return [line for line in result.stdout.splitlines() if line != ""]
+
+
+def get_git_changed_paths(root: Path, ref: str) -> Set[PurePosixPath]:
+    """
+    Get the paths (relative to ``root``) of all files within ``root`` which differ
+    between the git ref ``ref`` and the working tree, including untracked files
+
+    :param pathlib.Path root: The directory to find changes within
+    :param str ref: The git ref to compare against
+    :raises ChangeDetectionError: if git fails (e.g. ``root`` is not in a git
+        repository or ``ref`` does not exist)
+    """
+    changed = _run_git(root, "diff", "--name-only", "--no-renames", "--relative", ref)
+    changed += _run_git(root, "ls-files", "--others", "--exclude-standard")
+    return {PurePosixPath(p) for p in changed}
+
+
+def _is_modified_since(path: Path, since: float) -> bool:
+    # Deleting or renaming a file changes the mtime of its directory, so directories
+    # are checked as well as files
+    if path.stat().st_mtime > since:
+        return True
+    for dirpath, dirnames, filenames in os.walk(str(path)):
+        for name in dirnames + filenames:
+            try:
+                if os.stat(os.path.join(dirpath, name)).st_mtime > since:
+                    return True
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _filter_challenges(
+    challenges: Iterable["Challenge"], changed_paths: Set[PurePosixPath]
+) -> List["Challenge"]:
+    changed: List["Challenge"] = []
+    for challenge in challenges:
+        relative_path = PurePosixPath(challenge.get_relative_path().as_posix())
+        if any(p == relative_path or relative_path in p.parents for p in changed_paths):
+            changed.append(challenge)
+    return changed
+
+
+def get_changed_challenges_since_ref(project: "Project", ref: str) -> List["Challenge"]:
+    """
+    Get the challenges in a project whose directories have changed since the git
+    ref ``ref``
+
+    If the project config has changed, all challenges are considered to have changed.
+
+    :param rcds.Project project: The project, with its challenges loaded
+    :param str ref: The git ref to compare against
+    :raises ChangeDetectionError: if git fails
+    """
+    changed_paths = get_git_changed_paths(project.root, ref)
+    if PurePosixPath(project.config_file.name) in changed_paths:
+        return list(project.challenges.values())
+    return _filter_challenges(project.challenges.values(), changed_paths)
+
+
+def get_changed_challenges_since_time(
+    project: "Project", since: float
+) -> List["Challenge"]:
+    """
+    Get the challenges in a project which have any files or directories modified
+    after the timestamp ``since``
+
+    If the project config has changed, all challenges are considered to have changed.
+
+    :param rcds.Project project: The project, with its challenges loaded
+    :param float since: The timestamp to compare modification times against
+    """
+    if project.config_file.stat().st_mtime > since:
+        return list(project.challenges.values())
+    return [
+        challenge
+        for challenge in project.challenges.values()
+        if _is_modified_since(challenge.root, since)
+    ]
@@ -6,16 +6,13 @@ from itertools import tee
 from pathlib import Path
 from typing import Any, Dict, Iterable, Optional, Tuple, Union, cast
 
-import jsonschema  # type: ignore
-
 from rcds import errors
 
 from ..util import load_any
-from ..util.jsonschema import DefaultValidatingDraft7Validator
+from ..util.jsonschema import get_validator
 
-config_schema_validator = DefaultValidatingDraft7Validator(
-    schema=load_any(Path(__file__).parent / "rcds.schema.yaml"),
-    format_checker=jsonschema.draft7_format_checker,
+config_schema_validator = get_validator(
+    load_any(Path(__file__).parent / "rcds.schema.yaml")
 )
 
 
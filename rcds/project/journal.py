@@ -0,0 +1,102 @@
+"""
+Journal of the deploy steps which have been completed for each challenge
+"""
+
+import hashlib
+import json
+from typing import Any, Dict
+
+from rcds.util import JSONCache
+
+
+def get_digest(*inputs: Any) -> str:
+    """
+    Get a digest identifying the inputs to a deploy step
+
+    :param inputs: JSON-serializable values; any other values are converted to
+        strings
+    """
+    return hashlib.sha256(
+        json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()
+
+
+class DeployJournal:
+    """
+    Records the steps of a deploy (e.g. pushing an image, or committing a challenge
+    to a backend) which have been completed for each challenge, along with a digest
+    of the inputs to each step
+
+    A step is only considered to be complete if it was completed with the same
+    inputs, so a deploy which is interrupted can be rerun, skipping the steps which
+    were completed by the previous run. The journal should be cleared once a deploy
+    has completed successfully.
+    """
+
+    _cache: JSONCache
+
+    def __init__(self, cache: JSONCache):
+        """
+        :param JSONCache cache: The cache to persist the journal to
+        """
+        self._cache = cache
+
+    @staticmethod
+    def _get_key(challenge_id: str, step: str) -> str:
+        return f"{challenge_id}/{step}"
+
+    def is_done(self, challenge_id: str, step: str, digest: str) -> bool:
+        """
+        Check whether a step has been completed with the given inputs
+
+        :param str challenge_id: The id of the challenge
+        :param str step: The name of the step
+        :param str digest: The digest of the step's inputs (see :func:`get_digest`)
+        """
+        return self._cache.get(self._get_key(challenge_id, step)) == digest
+
+    def mark_done(self, challenge_id: str, step: str, digest: str) -> None:
+        """
+        Record that a step has been completed
+
+        :param str challenge_id: The id of the challenge
+        :param str step: The name of the step
+        :param str digest: The digest of the step's inputs (see :func:`get_digest`)
+        """
+        self.mark_all_done(step, {challenge_id: digest})
+
+    def mark_all_done(self, step: str, digests: Dict[str, str]) -> None:
+        """
+        Record that a step has been completed for multiple challenges at once
+
+        :param str step: The name of the step
+        :param digests: The digest of the step's inputs, by challenge id
+        """
+        self._cache.update(
+            {
+                self._get_key(challenge_id, step): digest
+                for challenge_id, digest in digests.items()
+            }
+        )
+
+    def clear_steps(self, prefix: str) -> None:
+        """
+        Forget the completed steps whose names start with ``prefix``, for all
+        challenges
+
+        :param str prefix: The prefix of the names of the steps to forget (e.g.
+            ``image:`` for every container's image)
+        """
+        self._cache.remove(
+            [
+                key
+                for key, _ in self._cache.items()
+                if key.split("/", 1)[1].startswith(prefix)
+            ]
+        )
+
+    def clear(self) -> None:
+        """
+        Forget all completed steps
+        """
+        self._cache.clear()
@@ -1,15 +1,82 @@
+import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
 
 import docker  # type: ignore
+import pathspec  # type: ignore
 from jinja2 import Environment
 
-from rcds.util import SUPPORTED_EXTENSIONS, find_files
+from rcds.util import SUPPORTED_EXTENSIONS, JSONCache, find_files
 
 from ..backend import BackendContainerRuntime, BackendScoreboard, load_backend_module
 from ..challenge import Challenge, ChallengeLoader
+from ..challenge.docker import load_dockerignore
 from . import config
 from .assets import AssetManager
+from .journal import DeployJournal
+
+IGNORED_DIRS = {".git", ".rcds-cache"}
+
+
+def _is_dockerignored(base: Path, spec: pathspec.PathSpec, path: Path) -> bool:
+    relative_path = path.relative_to(base).as_posix()
+    return spec.match_file(relative_path) or spec.match_file(relative_path + "/")
+
+
+def _get_dir_key(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return (stat.st_dev, stat.st_ino)
+
+
+def find_challenge_roots(root: Path) -> List[Path]:
+    """
+    Find the directories of all challenges within a project, in a deterministic order
+
+    The project is walked once. Directories in :const:`IGNORED_DIRS` and directories
+    excluded from a Docker build context by a ``.dockerignore`` are not descended
+    into. Symlinks to directories are followed, unless they point to a directory
+    which contains them.
+
+    :param pathlib.Path root: The project root
+    """
+    config_names = {f"challenge.{ext}" for ext in SUPPORTED_EXTENSIONS}
+    roots: List[Path] = []
+    # Ignore specs that apply to each directory yet to be walked
+    dir_specs: Dict[str, List[Tuple[Path, pathspec.PathSpec]]] = {str(root): []}
+    # The directories containing each directory yet to be walked (including itself),
+    # to avoid walking symlink cycles
+    dir_ancestors: Dict[str, FrozenSet[Tuple[int, int]]] = {
+        str(root): frozenset({_get_dir_key(str(root))})
+    }
+    for dirpath, dirnames, filenames in os.walk(str(root), followlinks=True):
+        path = Path(dirpath)
+        specs = dir_specs.pop(dirpath)
+        ancestors = dir_ancestors.pop(dirpath)
+        if not config_names.isdisjoint(filenames):
+            roots.append(path)
+        if ".dockerignore" in filenames:
+            spec = load_dockerignore(path)
+            # A negated pattern can re-include files within an ignored directory;
+            # only prune by specs without them
+            if spec is not None and all(
+                pattern.include is not False for pattern in spec.patterns
+            ):
+                specs = specs + [(path, spec)]
+        subdirs: List[str] = []
+        for name in sorted(dirnames):
+            if name in IGNORED_DIRS or any(
+                _is_dockerignored(base, spec, path / name) for base, spec in specs
+            ):
+                continue
+            subdir = os.path.join(dirpath, name)
+            key = _get_dir_key(subdir)
+            if key in ancestors:
+                continue
+            subdirs.append(name)
+            dir_specs[subdir] = specs
+            dir_ancestors[subdir] = ancestors | {key}
+        dirnames[:] = subdirs
+    return roots
 
 
 class Project:
@@ -18,11 +85,19 @@ class Project:
     """
 
     root: Path
+    config_file: Path
     config: dict
     challenges: Dict[Path, Challenge]
     challenge_loader: ChallengeLoader
 
     asset_manager: AssetManager
+    config_cache: JSONCache
+    context_sum_cache: JSONCache
+    registry_cache: JSONCache
+    deploy_state: JSONCache
+    archive_cache: JSONCache
+    image_file_cache: JSONCache
+    deploy_journal: DeployJournal
 
     container_backend: Optional[BackendContainerRuntime] = None
     scoreboard_backend: Optional[BackendScoreboard] = None
@@ -44,23 +119,41 @@ class Project:
         except KeyError:
             raise ValueError(f"No config file found at '{root}'")
         self.root = root
+        self.config_file = cfg_file
         self.config = config.load_config(cfg_file)
+        self.config_cache = JSONCache(self.root / ".rcds-cache" / "configs.json")
         self.challenge_loader = ChallengeLoader(self)
         self.challenges = dict()
         self.asset_manager = AssetManager(self)
+        self.context_sum_cache = JSONCache(
+            self.root / ".rcds-cache" / "context-sums.json"
+        )
+        self.registry_cache = JSONCache(self.root / ".rcds-cache" / "registry.json")
+        self.deploy_state = JSONCache(self.root / ".rcds-cache" / "deploy.json")
+        self.archive_cache = JSONCache(self.root / ".rcds-cache" / "archives.json")
+        self.image_file_cache = JSONCache(
+            self.root / ".rcds-cache" / "image-files.json"
+        )
+        self.deploy_journal = DeployJournal(
+            JSONCache(self.root / ".rcds-cache" / "journal.json")
+        )
         self.jinja_env = Environment(autoescape=False)
         if docker_client is not None:
             self.docker_client = docker_client
         else:
             self.docker_client = docker.from_env()
 
-    def load_all_challenges(self) -> None:
-        for ext in SUPPORTED_EXTENSIONS:
-            for chall_file in self.root.rglob(f"challenge.{ext}"):
-                path = chall_file.parent
-                self.challenges[
-                    path.relative_to(self.root)
-                ] = self.challenge_loader.load(path)
+    def load_all_challenges(self, jobs: int = 1) -> None:
+        """
+        Find and load all challenges in the project
+
+        :param int jobs: The number of processes to parse and validate challenge
+            configs with
+        """
+        roots = find_challenge_roots(self.root)
+        challenges = self.challenge_loader.load_all(roots, jobs=jobs)
+        for root, challenge in zip(roots, challenges):
+            self.challenges[root.relative_to(self.root)] = challenge
 
     def get_challenge(self, relPath: Path) -> Challenge:
         return self.challenges[relPath]
@@ -1,3 +1,5 @@
+from .cache import JSONCache  # noqa: F401
 from .deep_merge import deep_merge  # noqa: F401
 from .find import find_files  # noqa: F401
+from .hash import hash_file  # noqa: F401
 from .load import SUPPORTED_EXTENSIONS, load_any  # noqa: F401
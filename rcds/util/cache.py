@@ -0,0 +1,82 @@
+"""
+Utility for simple persistent caches
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+
+class JSONCache:
+    """
+    A string-keyed mapping persisted to a JSON file
+
+    Writes are flushed to disk immediately (atomically, by writing to a temporary file
+    and renaming it over the cache file), so the cache survives the process being
+    interrupted. A missing or corrupt cache file is treated as an empty cache. This
+    class is safe to use from multiple threads.
+    """
+
+    path: Path
+    _data: Dict[str, Any]
+    _lock: threading.Lock
+
+    def __init__(self, path: Path):
+        """
+        :param pathlib.Path path: The file to persist the cache to
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = dict()
+        try:
+            with self.path.open("r") as fd:
+                data = json.load(fd)
+            if isinstance(data, dict):
+                self._data = data
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def items(self) -> List[Tuple[str, Any]]:
+        """
+        Get a snapshot of all of the keys and values in the cache
+        """
+        with self._lock:
+            return list(self._data.items())
+
+    def set(self, key: str, value: Any) -> None:
+        self.update({key: value})
+
+    def update(self, values: Dict[str, Any]) -> None:
+        """
+        Set multiple keys at once, writing the cache to disk only once
+        """
+        with self._lock:
+            self._data.update(values)
+            self._save()
+
+    def remove(self, keys: Iterable[str]) -> None:
+        """
+        Remove multiple keys at once, writing the cache to disk only once
+        """
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+            self._save()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data = dict()
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{os.getpid()}.tmp")
+        with tmp_path.open("w") as fd:
+            json.dump(self._data, fd)
+        os.replace(str(tmp_path), str(self.path))
@@ -0,0 +1,21 @@
+import hashlib
+from functools import partial
+from pathlib import Path
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path) -> str:
+    """
+    Get the SHA-256 digest of a file's contents
+
+    The file is read in chunks, so it does not need to fit in memory.
+
+    :param pathlib.Path path: The file to hash
+    :returns: The hex digest
+    """
+    h = hashlib.sha256()
+    with path.open("rb") as fd:
+        for chunk in iter(partial(fd.read, _CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
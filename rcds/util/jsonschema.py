@@ -1,5 +1,17 @@
+import hashlib
+import json
+import threading
+from copy import deepcopy
+from typing import Any, Callable, Dict, Iterator, Optional
+
+import jsonschema  # type: ignore
 from jsonschema import Draft7Validator, validators  # type: ignore
 
+try:
+    import fastjsonschema  # type: ignore
+except ImportError:
+    fastjsonschema = None
+
 # From
 # https://python-jsonschema.readthedocs.io/en/stable/faq/#why-doesn-t-my-schema-s-default-property-set-the-default-on-my-instance # noqa: B950
 
@@ -18,3 +30,123 @@ def extend_with_default(validator_class):
 
 
 DefaultValidatingDraft7Validator = extend_with_default(Draft7Validator)
+
+
+def get_schema_digest(schema: Dict[str, Any]) -> str:
+    """
+    Get a digest identifying the contents of a schema
+    """
+    return hashlib.sha256(
+        json.dumps(schema, sort_keys=True, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def _replace_contents(target: Any, source: Any) -> None:
+    """
+    Replace the contents of a dict or list in place
+    """
+    if isinstance(target, dict):
+        target.clear()
+        target.update(source)
+    elif isinstance(target, list):
+        target[:] = source
+
+
+class CompiledValidator:
+    """
+    A validator which, like :class:`DefaultValidatingDraft7Validator`, sets the
+    defaults specified in the schema on the instance being validated
+
+    If `fastjsonschema <https://github.com/horejsek/python-fastjsonschema>`_ is
+    installed (``pip install rcds[fast]``), the schema is compiled to Python code,
+    which is used to validate instances. The errors for instances that the compiled
+    code rejects are always generated by :class:`DefaultValidatingDraft7Validator`,
+    so the errors reported do not depend on whether fastjsonschema is installed.
+    The compiled code runs on a copy of the instance, so the instance is only
+    modified (by setting defaults) once it is accepted; instances that it rejects are
+    validated as if fastjsonschema was not installed. Instances that the compiled
+    code accepts are not checked again, so whether an instance is valid at all is
+    only the same where the two libraries agree; the tests check that they do for
+    every config in the repository. Schemas which fastjsonschema cannot compile are
+    always validated with :class:`DefaultValidatingDraft7Validator`.
+
+    Only the subset of the :class:`jsonschema.IValidator` interface used by rCDS is
+    implemented. Use :func:`get_validator` to get a (shared) instance.
+    """
+
+    schema: Dict[str, Any]
+    _validator: Any
+    _compiled: Optional[Callable[[Any], Any]] = None
+    _compile_attempted: bool = False
+
+    def __init__(self, schema: Dict[str, Any]) -> None:
+        """
+        :param schema: The schema to validate against. It must not be modified once
+            the validator has been created.
+        """
+        self.schema = schema
+        self._validator = DefaultValidatingDraft7Validator(
+            schema=schema, format_checker=jsonschema.draft7_format_checker
+        )
+
+    def _get_compiled(self) -> Optional[Callable[[Any], Any]]:
+        # Schemas are compiled when first used, so that importing modules which
+        # define validators stays cheap
+        if not self._compile_attempted and fastjsonschema is not None:
+            try:
+                try:
+                    # Error details are never used; building them is slow
+                    self._compiled = fastjsonschema.compile(
+                        self.schema, use_default=True, detailed_exceptions=False
+                    )
+                except TypeError:
+                    # fastjsonschema < 2.19 always builds error details
+                    self._compiled = fastjsonschema.compile(
+                        self.schema, use_default=True
+                    )
+            except fastjsonschema.JsonSchemaDefinitionException:
+                pass
+        self._compile_attempted = True
+        return self._compiled
+
+    def iter_errors(self, instance: Any) -> Iterator[Any]:
+        compiled = self._get_compiled()
+        if compiled is not None:
+            # The compiled code sets defaults as it goes, even on instances that it
+            # goes on to reject, so it is run on a copy; the defaults are only
+            # applied to the instance once the copy is accepted
+            candidate = deepcopy(instance)
+            try:
+                compiled(candidate)
+            except fastjsonschema.JsonSchemaException:
+                pass
+            else:
+                _replace_contents(instance, candidate)
+                return
+        yield from self._validator.iter_errors(instance)
+
+    def is_valid(self, instance: Any) -> bool:
+        return next(self.iter_errors(instance), None) is None
+
+    def validate(self, instance: Any) -> None:
+        for error in self.iter_errors(instance):
+            raise error
+
+
+_validators: Dict[str, CompiledValidator] = dict()
+_validators_lock = threading.Lock()
+
+
+def get_validator(schema: Dict[str, Any]) -> CompiledValidator:
+    """
+    Get a :class:`CompiledValidator` for a schema
+
+    Validators are memoized by the schema's contents, so a schema is only compiled
+    once per process. The schema must not be modified afterwards.
+    """
+    digest = get_schema_digest(schema)
+    with _validators_lock:
+        validator = _validators.get(digest)
+        if validator is None:
+            validator = _validators[digest] = CompiledValidator(schema)
+        return validator
@@ -8,7 +8,7 @@ import json
 from pathlib import Path
 from typing import Any, Dict
 
-import yaml
+from .yaml import safe_load
 
 
 def _normalize_jsonlike(data: Any) -> Dict[str, Any]:
@@ -19,7 +19,7 @@ def _normalize_jsonlike(data: Any) -> Dict[str, Any]:
 
 def load_yaml(f: Path) -> Dict[str, Any]:
     with f.open("r") as fd:
-        return _normalize_jsonlike(yaml.safe_load(fd))
+        return _normalize_jsonlike(safe_load(fd))
 
 
 def load_json(f: Path) -> Dict[str, Any]:
@@ -0,0 +1,44 @@
+"""
+YAML loading and dumping, using libyaml when available
+
+PyYAML only uses libyaml, which is much faster than its pure-Python
+implementation, when its C loader and dumper classes are requested explicitly.
+The functions in this module use them if PyYAML was built with libyaml, and fall
+back to the pure-Python classes (with the same behavior) otherwise.
+"""
+
+from typing import IO, Any, Iterator, Optional, Union
+
+import yaml
+
+HAS_LIBYAML: bool = yaml.__with_libyaml__
+
+SafeLoader: Any
+SafeDumper: Any
+if HAS_LIBYAML:
+    SafeLoader = yaml.CSafeLoader
+    SafeDumper = yaml.CSafeDumper
+else:
+    SafeLoader = yaml.SafeLoader
+    SafeDumper = yaml.SafeDumper
+
+
+def safe_load(stream: Union[str, bytes, IO]) -> Any:
+    """
+    Equivalent to :func:`yaml.safe_load`
+    """
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def safe_load_all(stream: Union[str, bytes, IO]) -> Iterator[Any]:
+    """
+    Equivalent to :func:`yaml.safe_load_all`
+    """
+    return yaml.load_all(stream, Loader=SafeLoader)
+
+
+def safe_dump(data: Any, stream: Optional[IO] = None, **kwargs) -> Any:
+    """
+    Equivalent to :func:`yaml.safe_dump`
+    """
+    return yaml.dump(data, stream, Dumper=SafeDumper, **kwargs)
@@ -0,0 +1,75 @@
+from copy import deepcopy
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, cast
+from unittest import mock
+
+import pytest  # type: ignore
+
+from rcds.backends.k8s import backend
+
+OPTIONS: Dict[str, Any] = {
+    "domain": "example.com",
+    "annotations": {"ingress": {"a": "b"}, "service": {"c": "d"}},
+    "tolerations": [{"key": "k", "operator": "Exists"}],
+    "affinity": {"nodeAffinity": {}},
+}
+
+CHALLENGES: List[Dict[str, Any]] = [
+    {"id": "nocontainers"},
+    {
+        "id": "multi",
+        "containers": {
+            "main": {
+                "image": "registry.example.com/multi-main:abc",
+                "replicas": 1,
+                "ports": [1337, 8080],
+                "environment": {"FLAG": "flag{x}", "N": 1},
+                "resources": {"limits": {"cpu": "100m", "memory": "150Mi"}},
+            },
+            "db": {"image": "postgres", "replicas": 1, "ports": [5432]},
+            "worker": {"image": "busybox", "replicas": 2},
+        },
+        "expose": {
+            "main": [
+                {"target": 1337, "tcp": 31337},
+                {"target": 8080, "http": "multi"},
+            ],
+        },
+    },
+    {
+        "id": "raw-http",
+        "containers": {"app": {"image": "nginx", "replicas": 1, "ports": [80]}},
+        "expose": {"app": [{"target": 80, "http": {"raw": "raw.example.org"}}]},
+    },
+]
+
+
+def make_backend(root: Path, **options: Any) -> backend.ContainerBackend:
+    options = {**deepcopy(OPTIONS), **options}
+    backend.options_schema_validator.validate(options)
+    with mock.patch.object(backend.config, "load_kube_config"):
+        return backend.ContainerBackend(cast(Any, SimpleNamespace(root=root)), options)
+
+
+def gen_manifests(backend_: backend.ContainerBackend, config: Dict[str, Any]):
+    return backend_.gen_manifests_for_challenge(
+        cast(Any, SimpleNamespace(config=deepcopy(config)))
+    )
+
+
+@pytest.mark.parametrize("config", CHALLENGES, ids=lambda c: c["id"])
+def test_builders_match_templates(tmp_path: Path, config: Dict[str, Any]) -> None:
+    native = make_backend(tmp_path)
+    templated = make_backend(tmp_path, templates=".")
+    assert gen_manifests(native, config) == gen_manifests(templated, config)
+
+
+def test_template_override(tmp_path: Path) -> None:
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "network-policy.yaml").write_text("")
+    templated = make_backend(tmp_path, templates="templates")
+    manifests = gen_manifests(templated, CHALLENGES[1])
+    kinds = [manifest["kind"] for manifest in manifests]
+    assert "NetworkPolicy" not in kinds
+    assert "Namespace" in kinds
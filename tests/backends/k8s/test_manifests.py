@@ -0,0 +1,288 @@
+import json
+import re
+from copy import deepcopy
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest  # type: ignore
+from kubernetes.client.rest import ApiException  # type: ignore
+
+from rcds.backend import SyncError
+from rcds.backends.k8s import manifests
+
+method_re = re.compile(
+    r"^(list|create|patch|delete)_(namespaced_)?([a-z_]+?)(_for_all_namespaces)?$"
+)
+
+
+class FakeCluster:
+    """
+    Stand-in for the Kubernetes API clients, storing objects in memory
+    """
+
+    objects: Dict[Tuple[str, Optional[str], str], Dict[str, Any]]
+    calls: List[Tuple[str, str, Optional[str], Optional[str]]]
+    fail_namespaces: List[str]
+    immutable: List[Tuple[str, Optional[str], str]]
+
+    def __init__(self) -> None:
+        self.objects = dict()
+        self.calls = []
+        self.fail_namespaces = []
+        self.immutable = []
+
+    def add(self, manifest: Dict[str, Any]) -> None:
+        kind = manifests.camel_case_to_snake_case_re.sub("_", manifest["kind"])
+        kind = kind.lower().lstrip("_")
+        metadata = manifest["metadata"]
+        self.objects[(kind, metadata.get("namespace"), metadata["name"])] = deepcopy(
+            manifest
+        )
+
+    def names(self, kind: str, namespace: Optional[str] = None) -> List[str]:
+        return sorted(n for k, ns, n in self.objects if k == kind and ns == namespace)
+
+    def __getattr__(self, method: str):
+        match = method_re.match(method)
+        if match is None:
+            raise AttributeError(method)
+        method_verb, namespaced, kind, _ = match.groups()
+
+        def call(*args, **kwargs):
+            verb = method_verb
+            args = list(args)
+            namespace = None
+            if verb == "list":
+                if namespaced:
+                    namespace = args.pop(0)
+                self.calls.append((verb, kind, namespace, None))
+                return self._list(kind, namespace, kwargs["label_selector"])
+            if verb == "create":
+                if namespaced:
+                    namespace = args.pop(0)
+                body = args[0]
+                name = body["metadata"]["name"]
+            else:
+                name = args.pop(0)
+                if namespaced:
+                    namespace = args.pop(0)
+                body = args[0] if len(args) > 0 else None
+            if verb == "patch" and "field_manager" in kwargs:
+                # server-side apply
+                verb = "apply"
+                assert kwargs["field_manager"] == "rcds"
+                body = json.loads(body)
+            self.calls.append((verb, kind, namespace, name))
+            if namespace in self.fail_namespaces:
+                raise RuntimeError(f"{verb} failed")
+            key = (kind, namespace, name)
+            if verb == "delete":
+                del self.objects[key]
+            elif verb == "create":
+                assert key not in self.objects
+                self.objects[key] = deepcopy(body)
+            elif verb == "apply":
+                if key in self.objects and key in self.immutable:
+                    e = ApiException(status=422, reason="Unprocessable Entity")
+                    e.body = "spec.selector: Invalid value: field is immutable"
+                    raise e
+                self.objects[key] = deepcopy(body)
+            else:
+                assert key in self.objects
+                self.objects[key] = deepcopy(body)
+
+        return call
+
+    def _list(self, kind: str, namespace: Optional[str], label_selector: str):
+        selector = dict(s.split("=") for s in label_selector.split(","))
+        items = []
+        for (k, ns, name), obj in sorted(self.objects.items(), key=str):
+            if k != kind or (namespace is not None and ns != namespace):
+                continue
+            labels = obj["metadata"].get("labels", dict())
+            if any(labels.get(key) != value for key, value in selector.items()):
+                continue
+            items.append(
+                SimpleNamespace(
+                    metadata=SimpleNamespace(
+                        name=name,
+                        namespace=ns,
+                        labels=labels,
+                        annotations=obj["metadata"].get("annotations", None),
+                    )
+                )
+            )
+        return SimpleNamespace(items=items)
+
+
+def _labels(chall_id: str) -> Dict[str, str]:
+    return {
+        "app.kubernetes.io/managed-by": "rcds",
+        "rcds.redpwn.net/challenge-id": chall_id,
+    }
+
+
+def _challenge_manifests(chall_id: str) -> List[Dict[str, Any]]:
+    namespace = f"rcds-{chall_id}"
+    return [
+        {
+            "apiVersion": "v1",
+            "kind": "Namespace",
+            "metadata": {
+                "name": namespace,
+                "labels": {"name": namespace, **_labels(chall_id)},
+            },
+        },
+        {
+            "apiVersion": "apps/v1",
+            "kind": "Deployment",
+            "metadata": {
+                "namespace": namespace,
+                "name": "main",
+                "labels": _labels(chall_id),
+            },
+            "spec": {"replicas": 1},
+        },
+        {
+            "apiVersion": "v1",
+            "kind": "Service",
+            "metadata": {
+                "namespace": namespace,
+                "name": "main",
+                "labels": _labels(chall_id),
+            },
+            "spec": {"type": "ClusterIP"},
+        },
+    ]
+
+
+@pytest.fixture
+def cluster() -> FakeCluster:
+    return FakeCluster()
+
+
+def _sync(cluster: FakeCluster, all_manifests: List[Dict[str, Any]], **kwargs):
+    api_version_to_client = {
+        api_version: cluster
+        for api_version in ["v1", "apps/v1", "networking.k8s.io/v1"]
+    }
+    return manifests.sync_manifests(
+        deepcopy(all_manifests),
+        api_version_to_client=api_version_to_client,
+        api_version_to_apply_client=api_version_to_client,
+        **kwargs,
+    )
+
+
+def test_create(cluster: FakeCluster) -> None:
+    _sync(cluster, _challenge_manifests("a") + _challenge_manifests("b"))
+    assert cluster.names("namespace") == ["rcds-a", "rcds-b"]
+    assert cluster.names("deployment", "rcds-a") == ["main"]
+    assert cluster.names("service", "rcds-b") == ["main"]
+
+
+def test_patch_and_delete(cluster: FakeCluster) -> None:
+    _sync(cluster, _challenge_manifests("a") + _challenge_manifests("b"))
+    updated = _challenge_manifests("a")
+    updated[1]["spec"]["replicas"] = 2
+    del updated[2]  # service
+    _sync(cluster, updated)
+    assert cluster.names("namespace") == ["rcds-a"]
+    assert cluster.names("deployment", "rcds-a") == ["main"]
+    assert cluster.objects[("deployment", "rcds-a", "main")]["spec"]["replicas"] == 2
+    assert cluster.names("service", "rcds-a") == []
+
+
+def test_keep_namespaces(cluster: FakeCluster) -> None:
+    _sync(
+        cluster,
+        _challenge_manifests("a")
+        + _challenge_manifests("b")
+        + _challenge_manifests("c"),
+    )
+    _sync(cluster, _challenge_manifests("a"), keep_namespaces=["rcds-b"])
+    assert cluster.names("namespace") == ["rcds-a", "rcds-b"]
+    assert cluster.names("deployment", "rcds-b") == ["main"]
+
+
+def test_ordered_output(cluster: FakeCluster, capsys) -> None:
+    ids = [f"chall{i}" for i in range(8)]
+    _sync(
+        cluster,
+        [m for chall_id in ids for m in _challenge_manifests(chall_id)],
+        concurrency=4,
+    )
+    lines = capsys.readouterr().out.splitlines()
+    namespace_lines = [line for line in lines if line.startswith("CREATE Namespace")]
+    assert namespace_lines == [f"CREATE Namespace rcds-{i}" for i in ids]
+
+
+def test_errors_collected(cluster: FakeCluster) -> None:
+    cluster.fail_namespaces = ["rcds-a"]
+    with pytest.raises(SyncError) as errinfo:
+        _sync(
+            cluster,
+            _challenge_manifests("a") + _challenge_manifests("b"),
+            concurrency=2,
+        )
+    assert set(errinfo.value.errors.keys()) == {"rcds-a"}
+    assert cluster.names("deployment", "rcds-b") == ["main"]
+
+
+def test_list_once_per_kind(cluster: FakeCluster) -> None:
+    all_manifests = [m for i in range(10) for m in _challenge_manifests(f"chall{i}")]
+    _sync(cluster, all_manifests)
+    cluster.calls = []
+    _sync(cluster, all_manifests)
+    list_calls = [call for call in cluster.calls if call[0] == "list"]
+    assert len(list_calls) == len(manifests.MANIFEST_KINDS) + 1
+    assert all(call[2] is None for call in list_calls)
+    assert [call for call in cluster.calls if call[0] in ("create", "delete")] == []
+
+
+def test_skip_unchanged(cluster: FakeCluster) -> None:
+    all_manifests = _challenge_manifests("a") + _challenge_manifests("b")
+    _sync(cluster, all_manifests)
+    cluster.calls = []
+    updated = deepcopy(all_manifests)
+    updated[1]["spec"]["replicas"] = 2
+    counts = _sync(cluster, updated)
+    assert [call for call in cluster.calls if call[0] != "list"] == [
+        ("patch", "deployment", "rcds-a", "main")
+    ]
+    assert counts == {"created": 0, "patched": 1, "unchanged": 5, "deleted": 0}
+
+
+class TestServerSideApply:
+    def test_apply(self, cluster: FakeCluster) -> None:
+        all_manifests = _challenge_manifests("a")
+        counts = _sync(cluster, all_manifests, use_server_side_apply=True)
+        assert {call[0] for call in cluster.calls} == {"list", "apply"}
+        assert counts["created"] == 3
+        assert cluster.names("deployment", "rcds-a") == ["main"]
+
+        cluster.calls = []
+        updated = deepcopy(all_manifests)
+        updated[1]["spec"]["replicas"] = 2
+        counts = _sync(cluster, updated, use_server_side_apply=True)
+        assert [call for call in cluster.calls if call[0] != "list"] == [
+            ("apply", "deployment", "rcds-a", "main")
+        ]
+        assert counts["patched"] == 1
+        assert counts["unchanged"] == 2
+
+    def test_recreate_immutable(self, cluster: FakeCluster) -> None:
+        all_manifests = _challenge_manifests("a")
+        _sync(cluster, all_manifests, use_server_side_apply=True)
+        cluster.calls = []
+        cluster.immutable = [("service", "rcds-a", "main")]
+        updated = deepcopy(all_manifests)
+        updated[2]["spec"]["type"] = "NodePort"
+        _sync(cluster, updated, use_server_side_apply=True)
+        assert [call for call in cluster.calls if call[0] != "list"] == [
+            ("apply", "service", "rcds-a", "main"),
+            ("delete", "service", "rcds-a", "main"),
+            ("apply", "service", "rcds-a", "main"),
+        ]
+        service = cluster.objects[("service", "rcds-a", "main")]
+        assert service["spec"]["type"] == "NodePort"
@@ -0,0 +1,142 @@
+import json
+import threading
+from base64 import b64decode
+from hashlib import sha256
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import Any, Dict, Iterator, List, Set, Tuple
+from urllib.parse import unquote
+
+import pytest  # type: ignore
+
+LOGIN_TOKEN = "login-token"
+AUTH_TOKEN = "auth-token"
+
+
+class MockRCTF:
+    """
+    The parts of the rCTF admin API used by the rctf backend, in memory
+    """
+
+    login_token: str = LOGIN_TOKEN
+    url: str
+    challenges: Dict[str, Dict[str, Any]]
+    uploads: Dict[str, bytes]
+    requests: List[Tuple[str, str, int]]
+    lock: threading.Lock
+
+    # Challenges which fail to be updated
+    fail_challenges: Set[str]
+    # The number of upcoming requests to respond to with 503 Service Unavailable
+    unavailable: int = 0
+
+    def __init__(self) -> None:
+        self.challenges = dict()
+        self.uploads = dict()
+        self.requests = []
+        self.lock = threading.Lock()
+        self.fail_challenges = set()
+
+    def get_upload_url(self, name: str, digest: str) -> str:
+        return f"{self.url}uploads/{digest}/{name}"
+
+    def handle(self, method: str, path: str, body: Any) -> Tuple[int, Dict[str, Any]]:
+        if method == "POST" and path == "auth/login":
+            if body["teamToken"] != LOGIN_TOKEN:
+                return 401, {"kind": "badTokenVerification"}
+            return 200, {"kind": "goodLogin", "data": {"authToken": AUTH_TOKEN}}
+        if method == "GET" and path == "admin/challs":
+            return 200, {
+                "kind": "goodChallenges",
+                "data": list(self.challenges.values()),
+            }
+        if method == "PUT" and path.startswith("admin/challs/"):
+            chall_id = unquote(path[len("admin/challs/") :])
+            if chall_id in self.fail_challenges:
+                return 500, {"kind": "errorInternal"}
+            self.challenges[chall_id] = {**body["data"], "id": chall_id}
+            return 200, {"kind": "goodChallengeUpdate", "data": body["data"]}
+        if method == "DELETE" and path.startswith("admin/challs/"):
+            chall_id = unquote(path[len("admin/challs/") :])
+            del self.challenges[chall_id]
+            return 200, {"kind": "goodChallengeDelete"}
+        if method == "POST" and path == "admin/upload":
+            urls = []
+            for f in body["files"]:
+                data = b64decode(f["data"][len("data:;base64,") :])
+                digest = sha256(data).hexdigest()
+                self.uploads[digest] = data
+                urls.append(
+                    {"name": f["name"], "url": self.get_upload_url(f["name"], digest)}
+                )
+            return 200, {"kind": "goodFilesUpload", "data": urls}
+        if method == "POST" and path == "admin/upload/query":
+            return 200, {
+                "kind": "goodUploadsQuery",
+                "data": [
+                    {
+                        "name": u["name"],
+                        "sha256": u["sha256"],
+                        "url": (
+                            self.get_upload_url(u["name"], u["sha256"])
+                            if u["sha256"] in self.uploads
+                            else None
+                        ),
+                    }
+                    for u in body["uploads"]
+                ],
+            }
+        return 404, {"kind": "notFound"}
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    mock: MockRCTF
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: _ThreadingHTTPServer
+
+    def _handle(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        raw_body = self.rfile.read(length)
+        body = json.loads(raw_body) if length > 0 else None
+        path = self.path[len("/api/v1/") :]
+        mock = self.server.mock
+        with mock.lock:
+            mock.requests.append((self.command, path, length))
+            if mock.unavailable > 0:
+                mock.unavailable -= 1
+                status, response = 503, {"kind": "errorUnavailable"}
+            elif path.startswith("admin/") and (
+                self.headers.get("Authorization") != f"Bearer {AUTH_TOKEN}"
+            ):
+                status, response = 401, {"kind": "badToken"}
+            else:
+                status, response = mock.handle(self.command, path, body)
+        response_body = json.dumps(response).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response_body)))
+        self.end_headers()
+        self.wfile.write(response_body)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def rctf_server() -> Iterator[MockRCTF]:
+    mock = MockRCTF()
+    server = _ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    server.mock = mock
+    mock.url = f"http://127.0.0.1:{server.server_address[1]}/"
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"poll_interval": 0.01}, daemon=True
+    )
+    thread.start()
+    yield mock
+    server.shutdown()
+    server.server_close()
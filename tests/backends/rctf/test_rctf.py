@@ -0,0 +1,147 @@
+import json
+from hashlib import sha256
+from pathlib import Path
+from typing import Any
+
+import pytest  # type: ignore
+
+import rcds
+from rcds.backend import SyncError
+from rcds.backends.rctf import rctf
+
+
+def test_login(rctf_server: Any) -> None:
+    adminv1 = rctf.RCTFAdminV1(rctf_server.url, rctf_server.login_token)
+    assert adminv1.list_challenges() == []
+    with pytest.raises(ValueError):
+        rctf.RCTFAdminV1(rctf_server.url, "bad-token")
+
+
+def test_upload_body() -> None:
+    uploads = [("a", b""), ("b", b"x"), ('cé"', bytes(range(256)) * 100)]
+    body = rctf._UploadBody(uploads)
+    raw = b"".join(body)
+    assert len(raw) == len(body)
+    files = json.loads(raw)["files"]
+    assert [f["name"] for f in files] == [name for name, _ in uploads]
+
+
+def test_upload(rctf_server: Any, tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_bytes(b"from disk" * 1000)
+    adminv1 = rctf.RCTFAdminV1(rctf_server.url, rctf_server.login_token)
+    urls = adminv1.upload_files([("disk", path), ("memory", b"from memory")])
+    files = [("disk", path.read_bytes()), ("memory", b"from memory")]
+    for url, (name, data) in zip(urls, files):
+        digest = sha256(data).hexdigest()
+        assert rctf_server.uploads[digest] == data
+        assert url == rctf_server.get_upload_url(name, digest)
+    assert adminv1.query_uploads(
+        [(name, sha256(data).hexdigest()) for name, data in files]
+        + [("missing", sha256(b"missing").hexdigest())]
+    ) == urls + [None]
+
+
+def test_upload_batches(rctf_server: Any) -> None:
+    adminv1 = rctf.RCTFAdminV1(rctf_server.url, rctf_server.login_token)
+    uploads = [("a", b"a" * 300), ("b", b"b" * 300), ("c", b"c" * 3000), ("d", b"d")]
+    urls = adminv1.upload_files(uploads, batch_size=1000)
+    assert len(urls) == len(uploads)
+    upload_requests = [r for r in rctf_server.requests if r[1] == "admin/upload"]
+    # a and b together, c alone (it is larger than the batch size), then d
+    assert len(upload_requests) == 3
+    assert adminv1.upload_files([]) == []
+
+
+@pytest.fixture
+def project(rctf_server: Any, datadir: Path, monkeypatch) -> rcds.Project:
+    monkeypatch.setenv("RCDS_RCTF_URL", rctf_server.url)
+    monkeypatch.setenv("RCDS_RCTF_TOKEN", rctf_server.login_token)
+    project = rcds.Project(datadir / "project")
+    project.load_backends()
+    project.load_all_challenges()
+    for challenge in project.challenges.values():
+        challenge.create_transaction().commit()
+    return project
+
+
+def test_commit(rctf_server: Any, project: rcds.Project) -> None:
+    rctf_server.challenges["removed"] = {"id": "removed", "managedBy": "rcds"}
+    rctf_server.challenges["manual"] = {"id": "manual"}
+    assert project.scoreboard_backend is not None
+    project.scoreboard_backend.commit()
+    assert set(rctf_server.challenges) == {f"chall{i}" for i in range(5)} | {"manual"}
+    for i in range(5):
+        remote = rctf_server.challenges[f"chall{i}"]
+        assert remote["flag"] == f"flag{{{i}}}"
+        data = f"file {i}".encode()
+        assert remote["files"] == [
+            {
+                "name": "file.txt",
+                "url": rctf_server.get_upload_url("file.txt", sha256(data).hexdigest()),
+            }
+        ]
+
+
+def test_commit_errors(rctf_server: Any, project: rcds.Project) -> None:
+    rctf_server.fail_challenges.add("chall1")
+    assert project.scoreboard_backend is not None
+    with pytest.raises(SyncError) as errinfo:
+        project.scoreboard_backend.commit()
+    assert set(errinfo.value.errors) == {"chall1"}
+    assert set(rctf_server.challenges) == {"chall0", "chall2", "chall3", "chall4"}
+
+
+def test_retry(rctf_server: Any) -> None:
+    adminv1 = rctf.RCTFAdminV1(rctf_server.url, rctf_server.login_token)
+    rctf_server.unavailable = 2
+    urls = adminv1.upload_files([("file", b"data")])
+    assert len(urls) == 1
+    assert rctf_server.unavailable == 0
+
+
+def test_commit_batches_uploads(rctf_server: Any, project: rcds.Project) -> None:
+    for challenge in project.challenges.values():
+        (challenge.root / "file.txt").write_text("same")
+        challenge.create_transaction().commit()
+    assert project.scoreboard_backend is not None
+    project.scoreboard_backend.commit()
+    paths = [path for _, path, _ in rctf_server.requests]
+    assert paths.count("admin/upload/query") == 1
+    assert paths.count("admin/upload") == 1
+    assert list(rctf_server.uploads.values()) == [b"same"]
+    urls = {c["files"][0]["url"] for c in rctf_server.challenges.values()}
+    assert len(urls) == 1
+
+
+def test_query_batches(rctf_server: Any) -> None:
+    adminv1 = rctf.RCTFAdminV1(rctf_server.url, rctf_server.login_token)
+    [url] = adminv1.upload_files([("b", b"data")])
+    digest = sha256(b"data").hexdigest()
+    files = [("a", digest), ("b", digest), ("b", "0" * 64), ("b", digest), ("c", "")]
+    assert adminv1.query_uploads(files, batch_size=2) == [
+        rctf_server.get_upload_url("a", digest),
+        url,
+        None,
+        url,
+        None,
+    ]
+    paths = [path for _, path, _ in rctf_server.requests]
+    assert paths.count("admin/upload/query") == 3
+
+
+def test_commit_skips_unchanged(
+    rctf_server: Any, project: rcds.Project, capsys
+) -> None:
+    rctf_server.challenges["removed"] = {"id": "removed", "managedBy": "rcds"}
+    assert project.scoreboard_backend is not None
+    project.scoreboard_backend.commit()
+    assert "5 created, 0 updated, 0 unchanged, 1 deleted" in capsys.readouterr().out
+
+    rctf_server.requests.clear()
+    rctf_server.challenges["chall1"]["description"] = "edited on rCTF"
+    project.scoreboard_backend.commit()
+    assert "0 created, 1 updated, 4 unchanged, 0 deleted" in capsys.readouterr().out
+    puts = [path for method, path, _ in rctf_server.requests if method == "PUT"]
+    assert puts == ["admin/challs/chall1"]
+    assert rctf_server.challenges["chall1"]["description"] == "description"
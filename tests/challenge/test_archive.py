@@ -0,0 +1,109 @@
+import io
+import os
+import tarfile
+import time
+import zipfile
+from pathlib import Path
+
+import pytest  # type: ignore
+
+from rcds.challenge.archive import Archive
+from rcds.project.blobs import BlobStore
+from rcds.util import JSONCache
+
+
+@pytest.fixture
+def handout(tmp_path: Path) -> Path:
+    root = tmp_path / "handout"
+    (root / "src").mkdir(parents=True)
+    (root / "src" / "main.c").write_text("int main() {}\n")
+    (root / "run.sh").write_text("#!/bin/sh\n")
+    (root / "run.sh").chmod(0o700)
+    (root / "src" / "main.o").write_bytes(b"\x7fELF")
+    (root / "flag.txt").write_text("flag{real}")
+    (root / ".rcdsignore").write_text("*.o\n/flag.txt\n")
+    return root
+
+
+def _write(archive: Archive) -> bytes:
+    fd = io.BytesIO()
+    archive.write(fd)
+    return fd.getvalue()
+
+
+def test_tar_gz(handout: Path) -> None:
+    archive = Archive(handout, "tar.gz")
+    with tarfile.open(fileobj=io.BytesIO(_write(archive)), mode="r:gz") as tar:
+        assert tar.getnames() == [
+            "handout",
+            "handout/run.sh",
+            "handout/src",
+            "handout/src/main.c",
+        ]
+        assert tar.getmember("handout/run.sh").mode == 0o755
+        assert tar.getmember("handout/src/main.c").mode == 0o644
+        member_fd = tar.extractfile("handout/src/main.c")
+        assert member_fd is not None
+        assert member_fd.read() == b"int main() {}\n"
+
+
+def test_zip(handout: Path) -> None:
+    archive = Archive(handout, "zip")
+    with zipfile.ZipFile(io.BytesIO(_write(archive))) as zf:
+        assert zf.namelist() == [
+            "handout/",
+            "handout/run.sh",
+            "handout/src/",
+            "handout/src/main.c",
+        ]
+        assert zf.read("handout/src/main.c") == b"int main() {}\n"
+        assert zf.getinfo("handout/run.sh").external_attr >> 16 & 0o777 == 0o755
+
+
+@pytest.mark.parametrize("archive_format", ["tar.gz", "zip"])
+def test_reproducible(handout: Path, archive_format: str) -> None:
+    first = _write(Archive(handout, archive_format))
+    digest = Archive(handout, archive_format).get_digest()
+    now = time.time()
+    os.utime(str(handout / "src" / "main.c"), (now + 10, now + 10))
+    assert _write(Archive(handout, archive_format)) == first
+    assert Archive(handout, archive_format).get_digest() == digest
+    (handout / "src" / "main.c").write_text("int main() { return 1; }\n")
+    assert Archive(handout, archive_format).get_digest() != digest
+
+
+def test_cached(handout: Path, tmp_path: Path) -> None:
+    cache = JSONCache(tmp_path / "archives.json")
+    blobs = BlobStore(tmp_path / "blobs")
+    with Archive(handout, "zip").open_cached(cache, blobs) as fd:
+        assert fd.read() == _write(Archive(handout, "zip"))
+        fd.seek(0)
+        digest = blobs.add(fd)
+    path = blobs.get_path(digest)
+    with Archive(handout, "zip").open_cached(cache, blobs) as fd:
+        # The archive in the store is used, instead of writing it again
+        assert fd.name == str(path)
+    (handout / "new.txt").write_text("new")
+    with Archive(handout, "zip").open_cached(cache, blobs) as fd:
+        assert fd.name != str(path)
+    # Archives deleted from the store are forgotten
+    blobs.release([digest])
+    assert not path.exists()
+    (handout / "new.txt").unlink()
+    with Archive(handout, "zip").open_cached(cache, blobs) as fd:
+        assert fd.read() == _write(Archive(handout, "zip"))
+    assert len(cache.items()) == 1
+
+
+def test_mtime(handout: Path) -> None:
+    mtime = Archive(handout, "tar.gz").get_mtime()
+    time.sleep(0.01)
+    (handout / "src" / "main.c").unlink()
+    assert Archive(handout, "tar.gz").get_mtime() > mtime
+
+
+def test_invalid(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        Archive(tmp_path / "nonexistent", "zip")
+    with pytest.raises(ValueError):
+        Archive(tmp_path, "rar")
@@ -1,11 +1,15 @@
+import tarfile
+import zipfile
 from copy import deepcopy
 from pathlib import Path
 from textwrap import dedent
+from typing import Any, BinaryIO, List
 
 import pytest  # type: ignore
 
 from rcds import Project, errors
 from rcds.challenge import ChallengeLoader
+from rcds.challenge.archive import Archive
 
 
 @pytest.fixture
@@ -80,6 +84,48 @@ def test_static_assets(project: Project, loader: ChallengeLoader) -> None:
     )
 
 
+def test_archive_assets(project: Project, loader: ChallengeLoader, monkeypatch) -> None:
+    opened: List[BinaryIO] = []
+    open_cached = Archive.open_cached
+
+    def spy_open_cached(self: Archive, *args: Any) -> BinaryIO:
+        fd = open_cached(self, *args)
+        opened.append(fd)
+        return fd
+
+    monkeypatch.setattr(Archive, "open_cached", spy_open_cached)
+    chall = loader.load(project.root / "archive-assets")
+    chall.create_transaction().commit()
+    assert len(opened) == 2
+    assert all(fd.closed for fd in opened)
+    ctx = project.asset_manager.create_context("archive-assets")
+    assert set(ctx.ls()) == {"handout.tar.gz", "handout.zip"}
+    with tarfile.open(str(ctx.get("handout.tar.gz"))) as tar:
+        assert tar.getnames() == [
+            "handout",
+            "handout/a.txt",
+            "handout/sub",
+            "handout/sub/b.txt",
+        ]
+    with zipfile.ZipFile(str(ctx.get("handout.zip"))) as zf:
+        assert zf.read("handout/sub/b.txt") == b"file b\n"
+    # Loading the challenge again uses the cached config
+    chall = loader.load(project.root / "archive-assets")
+    assert chall.config["provide"][0] == {"archive": "./handout"}
+    # Archives which are no longer provided are deleted
+    blobs = project.asset_manager.blobs
+    old_blobs = [blob for _, blob in project.archive_cache.items()]
+    assert len(old_blobs) == 2
+    (project.root / "archive-assets" / "handout" / "c.txt").write_text("file c\n")
+    chall.create_transaction().commit()
+    assert all(not blobs.get_path(blob).exists() for blob in old_blobs)
+    new_blobs = [
+        blob for _, blob in project.archive_cache.items() if blob not in old_blobs
+    ]
+    assert len(new_blobs) == 2
+    assert all(blobs.get_refcount(blob) == 1 for blob in new_blobs)
+
+
 class TestContextShortcuts:
     @staticmethod
     def test_tcp(project: Project, loader: ChallengeLoader) -> None:
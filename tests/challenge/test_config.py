@@ -93,6 +93,28 @@ def test_nonexistent_provide_file(configloader, test_datadir) -> None:
     )
 
 
+def test_nonexistent_provide_archive(configloader, test_datadir) -> None:
+    cfg, errors = configloader.check_config(test_datadir / "challenge.yml")
+    assert errors is not None
+    assert cfg is None
+    error_messages = [str(e) for e in errors]
+    assert (
+        '`provide` references directory "nonexistent" which does not exist'
+        in error_messages
+    )
+
+
+def test_nonexistent_provide_container(configloader, test_datadir) -> None:
+    cfg, errors = configloader.check_config(test_datadir / "challenge.yml")
+    assert errors is not None
+    assert cfg is None
+    error_messages = [str(e) for e in errors]
+    assert (
+        '`provide` references container "nonexistent" but it is not defined in '
+        "`containers`" in error_messages
+    )
+
+
 def test_nonexistent_flag_file(configloader, test_datadir) -> None:
     cfg, errors = configloader.check_config(test_datadir / "challenge.yml")
     assert errors is not None
@@ -1,10 +1,15 @@
+import io
+import os
+import tarfile
 from pathlib import Path
-from typing import cast
+from typing import Dict, Iterator, List, Tuple, cast
+from unittest import mock
 
 import pytest  # type: ignore
 
 from rcds import ChallengeLoader, Project
-from rcds.challenge import docker
+from rcds.challenge import challenge, docker
+from rcds.util import JSONCache
 
 
 class TestGetContextFiles:
@@ -45,6 +50,25 @@ class TestGenerateSum:
             == "683c5631d14165f0326ef55dfaf5463cc0aa550743398a4d8e31d37c4f5d6981"
         )
 
+    def test_cached(self, datadir: Path, tmp_path: Path) -> None:
+        df_root = datadir / "contexts" / "basic"
+        cache = JSONCache(tmp_path / "cache.json")
+        expected = "683c5631d14165f0326ef55dfaf5463cc0aa550743398a4d8e31d37c4f5d6981"
+        assert docker.generate_sum(df_root, cache) == expected
+        # Same size, mtime, and inode; the cached checksum should be used
+        f = df_root / "file"
+        st = f.stat()
+        with f.open("r+") as fd:
+            fd.write("X" * st.st_size)
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert docker.generate_sum(df_root, JSONCache(tmp_path / "cache.json")) == (
+            expected
+        )
+        # Changed mtime; the build context should be reread
+        os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        assert docker.generate_sum(df_root, cache) == docker.generate_sum(df_root)
+        assert docker.generate_sum(df_root, cache) != expected
+
 
 class TestContainerManager:
     @pytest.fixture()
@@ -99,3 +123,194 @@ class TestContainerManager:
 
         assert "chall2ctr" not in chall1_mgr.containers
         assert "postgres" not in chall2_mgr.containers
+
+    def test_lazy_undeployed(self, project) -> None:
+        challenge_loader = ChallengeLoader(project)
+        chall = challenge_loader.load(project.root / "undeployed")
+        with mock.patch.object(docker, "generate_sum", return_value="abcd") as gen_sum:
+            container_mgr = docker.ContainerManager(chall)
+            gen_sum.assert_not_called()
+            assert "image" not in chall.config["containers"]["main"]
+            container = container_mgr.containers["main"]
+            assert container.get_full_tag().endswith(":abcd")
+            container.get_full_tag()
+            gen_sum.assert_called_once()
+
+    def test_registry_cache(self, datadir: Path) -> None:
+        docker_client = mock.Mock()
+        project = Project(datadir / "project", docker_client=docker_client)
+        chall = ChallengeLoader(project).load(project.root / "chall2")
+        container = docker.ContainerManager(chall).containers["chall2ctr"]
+        get_registry_data = docker_client.images.get_registry_data
+
+        get_registry_data.side_effect = docker.docker.errors.NotFound("")
+        assert not container.is_built()
+        assert not container.is_built()
+        assert get_registry_data.call_count == 2
+
+        get_registry_data.side_effect = None
+        assert container.is_built()
+        assert container.is_built()
+        assert get_registry_data.call_count == 3
+
+        project.config["docker"]["registryCacheTtl"] = 0
+        assert container.is_built()
+        assert get_registry_data.call_count == 4
+
+
+def _make_image(files: Dict[str, str], links: Dict[str, str]) -> mock.Mock:
+    """
+    Mock a container created from an image containing the given files and
+    symbolic links
+    """
+
+    def get_archive(path: str) -> Tuple[Iterator[bytes], Dict]:
+        fd = io.BytesIO()
+        with tarfile.open(fileobj=fd, mode="w") as tar:
+            info = tarfile.TarInfo(os.path.basename(path))
+            if path in links:
+                info.type = tarfile.SYMTYPE
+                info.linkname = links[path]
+                tar.addfile(info)
+            else:
+                data = files[path].encode()
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+        raw = fd.getvalue()
+        chunks: List[bytes] = [raw[i : i + 100] for i in range(0, len(raw), 100)]
+        return iter(chunks), dict()
+
+    container = mock.Mock()
+    container.get_archive.side_effect = get_archive
+    return container
+
+
+class TestGetFile:
+    @pytest.fixture()
+    def project(self, datadir: Path) -> Project:
+        docker_client = mock.Mock()
+        docker_client.containers.create.return_value = _make_image(
+            {"/lib/libc-2.31.so": "libc", "/app/chall": "binary"},
+            {"/lib/libc.so.6": "libc-2.31.so", "/lib64/libc.so.6": "/lib/libc.so.6"},
+        )
+        return Project(datadir / "project", docker_client=docker_client)
+
+    def test_get_file(self, project: Project) -> None:
+        chall = ChallengeLoader(project).load(project.root / "chall2")
+        container = docker.ContainerManager(chall).containers["chall2ctr"]
+        cache = project.image_file_cache
+        blobs = project.asset_manager.blobs
+        with container.open_file("/lib64/libc.so.6", cache, blobs) as fd:
+            assert fd.read() == b"libc"
+            fd.seek(0)
+            blob = blobs.add(fd)
+        create = project.docker_client.containers.create
+        create.assert_called_once_with(container.get_full_tag(), command=["true"])
+        create.return_value.remove.assert_called_once_with(force=True)
+        # The file is kept in the blob store
+        with container.open_file("/lib64/libc.so.6", cache, blobs) as fd:
+            assert fd.name == str(blobs.get_path(blob))
+        assert create.call_count == 1
+
+    def test_pull(self, project: Project) -> None:
+        chall = ChallengeLoader(project).load(project.root / "chall2")
+        container = docker.ContainerManager(chall).containers["chall2ctr"]
+        create = project.docker_client.containers.create
+        image = create.return_value
+        create.side_effect = [docker.docker.errors.ImageNotFound(""), image]
+        with container.open_file(
+            "/app/chall", project.image_file_cache, project.asset_manager.blobs
+        ) as fd:
+            assert fd.read() == b"binary"
+        pull = project.docker_client.images.pull
+        assert pull.call_args[0] == (container.get_full_tag(),)
+
+    def test_not_built(self, project: Project) -> None:
+        chall = ChallengeLoader(project).load(project.root / "chall")
+        container = chall.get_container_manager().containers["postgres"]
+        cache = project.image_file_cache
+        blobs = project.asset_manager.blobs
+        pull = project.docker_client.images.pull
+        create = project.docker_client.containers.create
+        pull.return_value.id = "sha256:1"
+        # The image must be pulled to find the key
+        assert container.get_file_key("/app/chall", pull=False) is None
+        pull.assert_not_called()
+        with container.open_file("/app/chall", cache, blobs) as fd:
+            assert fd.read() == b"binary"
+            fd.seek(0)
+            blob = blobs.add(fd)
+        pull.assert_called_once_with("postgres")
+        create.assert_called_once_with("sha256:1", command=["true"])
+        with container.open_file("/app/chall", cache, blobs) as fd:
+            assert fd.name == str(blobs.get_path(blob))
+        assert create.call_count == 1
+        # The image is pulled again by a new deploy; files are extracted again once
+        # the tag has moved to a different image
+        chall = ChallengeLoader(project).load(project.root / "chall")
+        container = chall.get_container_manager().containers["postgres"]
+        pull.return_value.id = "sha256:2"
+        with container.open_file("/app/chall", cache, blobs) as fd:
+            assert fd.name != str(blobs.get_path(blob))
+        assert pull.call_count == 2
+        create.assert_called_with("sha256:2", command=["true"])
+
+    def test_pinned_image(self, project: Project) -> None:
+        chall = ChallengeLoader(project).load(project.root / "chall")
+        container = chall.get_container_manager().containers["postgres"]
+        container.config["image"] = "postgres@sha256:" + "0" * 64
+        assert container.get_file_key("/app/chall", pull=False) is not None
+        project.docker_client.images.pull.assert_not_called()
+
+    def test_provide(self, project: Project) -> None:
+        chall = ChallengeLoader(project).load(project.root / "provide")
+        with mock.patch.object(
+            challenge, "ContainerManager", wraps=docker.ContainerManager
+        ) as container_manager:
+            chall.create_transaction().commit()
+            chall.create_transaction().abort()
+            # One manager is shared by all of the challenge's container provides
+            container_manager.assert_called_once_with(chall)
+        ctx = chall.get_asset_manager_context()
+        assert set(ctx.ls()) == {"libc.so.6", "binary"}
+        assert ctx.get("libc.so.6").read_text() == "libc"
+        assert ctx.get("binary").read_text() == "binary"
+        mtime = ctx.get_mtime("binary")
+        # Nothing is extracted again until the image changes
+        chall.create_transaction().commit()
+        assert ctx.get_mtime("binary") == mtime
+        assert project.docker_client.containers.create.call_count == 2
+        blobs = project.asset_manager.blobs
+        old_blobs = [blob for _, blob in project.image_file_cache.items()]
+        project.docker_client.containers.create.return_value = _make_image(
+            {"/lib/libc-2.31.so": "new libc", "/app/chall": "new binary"},
+            {"/lib/libc.so.6": "libc-2.31.so"},
+        )
+        with mock.patch.object(docker, "generate_sum", return_value="changed"):
+            chall = ChallengeLoader(project).load(project.root / "provide")
+            chall.create_transaction().commit()
+        ctx = chall.get_asset_manager_context()
+        assert ctx.get_mtime("binary") > mtime
+        assert ctx.get("binary").read_text() == "new binary"
+        assert project.docker_client.containers.create.call_count == 4
+        # Files which are no longer provided are deleted from the store
+        assert all(not blobs.get_path(blob).exists() for blob in old_blobs)
+
+    def test_provide_pulled(self, project: Project) -> None:
+        pull = project.docker_client.images.pull
+        pull.return_value.id = "sha256:1"
+        chall = ChallengeLoader(project).load(project.root / "provide-image")
+        # The image is only pulled once the asset is created
+        chall.create_transaction().abort()
+        pull.assert_not_called()
+        chall.create_transaction().commit()
+        pull.assert_called_once_with("postgres")
+        ctx = chall.get_asset_manager_context()
+        assert ctx.get("binary").read_text() == "binary"
+        # The asset is checked against the image every time, but the file is only
+        # extracted once per image
+        chall = ChallengeLoader(project).load(project.root / "provide-image")
+        chall.create_transaction().commit()
+        assert pull.call_count == 2
+        assert project.docker_client.containers.create.call_count == 1
+        assert ctx.get("binary").read_text() == "binary"
@@ -0,0 +1,158 @@
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, List, Optional, cast
+from unittest import mock
+
+import pytest  # type: ignore
+from click.testing import CliRunner
+
+import rcds.challenge.docker
+from rcds.backend import SyncError
+from rcds.cli import cli
+from rcds.cli.deploy import BuildJob, run_build_jobs
+from rcds.project.journal import DeployJournal
+from rcds.util import JSONCache
+
+
+class StubContainer:
+    """
+    A container which takes ``delay`` seconds to check, and then fails with
+    ``error`` if it is set
+    """
+
+    name: str
+    delay: float
+    error: Optional[Exception]
+    started: threading.Event
+    built: bool
+
+    def __init__(
+        self, name: str, delay: float = 0, error: Optional[Exception] = None
+    ) -> None:
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.started = threading.Event()
+        self.built = False
+
+    def get_full_tag(self) -> str:
+        return f"registry.com/ns/{self.name}:tag"
+
+    def is_built(self) -> bool:
+        self.started.set()
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return False
+
+    def build(self) -> None:
+        self.built = True
+
+
+def _make_jobs(tmp_path: Path, containers: List[StubContainer]) -> List[BuildJob]:
+    project = SimpleNamespace(
+        deploy_journal=DeployJournal(JSONCache(tmp_path / "journal.json"))
+    )
+    return [
+        BuildJob(
+            # Each container belongs to its own challenge, with the same name
+            cast(Any, SimpleNamespace(project=project, config={"id": container.name})),
+            "main",
+            cast(Any, container),
+        )
+        for container in containers
+    ]
+
+
+def test_output_order(tmp_path: Path, capsys) -> None:
+    # Later challenges finish first
+    containers = [StubContainer(f"chall{i}", delay=0.05 * (3 - i)) for i in range(4)]
+    run_build_jobs(_make_jobs(tmp_path, containers), jobs=4)
+    assert all(container.built for container in containers)
+    lines = capsys.readouterr().out.splitlines()
+    assert [line.split(":")[0] for line in lines] == [
+        f"chall{i}" for i in range(4) for _ in range(2)
+    ]
+    assert lines[:2] == [
+        "chall0: checking container main",
+        "chall0: building container main (registry.com/ns/chall0:tag)",
+    ]
+
+
+def test_cancel_after_failure(tmp_path: Path, capsys) -> None:
+    containers = [
+        StubContainer("slow", delay=0.2),
+        StubContainer("failed", error=RuntimeError("build failed")),
+    ] + [StubContainer(f"pending{i}", delay=0.05) for i in range(10)]
+    with pytest.raises(RuntimeError, match="build failed"):
+        run_build_jobs(_make_jobs(tmp_path, containers), jobs=2)
+    # Jobs which were already running are allowed to finish, and their output is
+    # printed
+    assert containers[0].built
+    assert "slow: checking container main" in capsys.readouterr().out
+    # No further jobs are started
+    assert not containers[-1].started.is_set()
+    assert sum(container.started.is_set() for container in containers) < 5
+
+
+def test_deploy_build_failure(datadir: Path, monkeypatch) -> None:
+    monkeypatch.chdir(datadir / "project")
+    monkeypatch.setattr(rcds.cli.deploy.docker, "from_env", mock.Mock())
+    with mock.patch.object(
+        rcds.challenge.docker.BuildableContainer,
+        "is_built",
+        side_effect=RuntimeError("registry unavailable"),
+    ), mock.patch.object(rcds.challenge.docker.BuildableContainer, "build") as build:
+        result = CliRunner().invoke(cli, ["deploy", "--jobs", "1"])
+    assert result.exit_code != 0
+    assert "registry unavailable" in str(result.exception)
+    build.assert_not_called()
+
+
+def test_deploy_sync_error(datadir: Path, monkeypatch) -> None:
+    monkeypatch.chdir(datadir / "project")
+    monkeypatch.setattr(rcds.cli.deploy.docker, "from_env", mock.Mock())
+    error = SyncError({"chall1": RuntimeError("conflict")})
+    backend = mock.Mock()
+    backend.commit.side_effect = error
+
+    def load_backends(project: rcds.Project) -> None:
+        project.container_backend = backend
+
+    monkeypatch.setattr(rcds.Project, "load_backends", load_backends)
+    with mock.patch.object(
+        rcds.challenge.docker.BuildableContainer, "is_built", return_value=True
+    ):
+        result = CliRunner().invoke(cli, ["deploy", "--jobs", "1"])
+    assert result.exit_code == 1
+    assert f"ERROR: {error}" in result.output
+    assert "chall1: conflict" in result.output
+    backend.commit.assert_called_once()
+
+
+@pytest.mark.parametrize("recheck_registry", [False, True])
+def test_deploy_recheck_registry(
+    datadir: Path, monkeypatch, recheck_registry: bool
+) -> None:
+    monkeypatch.chdir(datadir / "project")
+    monkeypatch.setattr(rcds.cli.deploy.docker, "from_env", mock.Mock())
+    backend = mock.Mock()
+    backend.commit.side_effect = SyncError({"chall1": RuntimeError("conflict")})
+
+    def load_backends(project: rcds.Project) -> None:
+        project.container_backend = backend
+
+    monkeypatch.setattr(rcds.Project, "load_backends", load_backends)
+    with mock.patch.object(
+        rcds.challenge.docker.BuildableContainer, "is_built", return_value=True
+    ) as is_built:
+        CliRunner().invoke(cli, ["deploy", "--jobs", "1"])
+        # Both challenges' images were pushed before the backend failed
+        assert is_built.call_count == 2
+        args = ["deploy", "--jobs", "1"]
+        if recheck_registry:
+            args.append("--recheck-registry")
+        CliRunner().invoke(cli, args)
+    assert is_built.call_count == (4 if recheck_registry else 2)
@@ -1,5 +1,10 @@
 import io
+import json
+import os
+import threading
 import time
+from functools import partial
+from hashlib import sha256
 from pathlib import Path
 from textwrap import dedent
 from unittest import mock
@@ -74,12 +79,14 @@ def test_create_from_io(am_fn: assets.AssetManager) -> None:
     ctx = asset_manager.create_context("challenge")
     contents = b"abcd"
     transaction = ctx.transaction()
-    transaction.add("file", time.time(), io.BytesIO(contents))
+    fd = io.BytesIO(contents)
+    transaction.add("file", time.time(), fd)
     transaction.commit()
+    assert fd.closed
     assert set(ctx.ls()) == {"file"}
     asset_file = ctx.get("file")
-    with asset_file.open("rb") as fd:
-        assert fd.read() == contents
+    with asset_file.open("rb") as asset_fd:
+        assert asset_fd.read() == contents
     ctx2 = asset_manager.create_context("challenge")
     assert set(ctx2.ls()) == {"file"}
 
@@ -182,6 +189,195 @@ def test_does_not_update_when_older(am_fn: assets.AssetManager) -> None:
     get_contents.assert_not_called()
 
 
+def test_abort(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx = asset_manager.create_context("challenge")
+    transaction = ctx.transaction()
+    transaction.add("file", 1, b"abcd")
+    transaction.abort()
+    assert len(list(ctx.ls())) == 0
+    transaction = ctx.transaction()
+    transaction.commit()
+
+
+def test_digest(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx = asset_manager.create_context("challenge")
+
+    def get_digest(files) -> str:
+        transaction = ctx.transaction()
+        for name, mtime in files:
+            transaction.add(name, mtime, b"abcd")
+        transaction.abort()
+        return transaction.get_digest()
+
+    assert get_digest([("a", 1), ("b", 2)]) == get_digest([("b", 2), ("a", 1)])
+    assert get_digest([("a", 1), ("b", 2)]) != get_digest([("a", 1), ("b", 3)])
+    assert get_digest([("a", 1)]) != get_digest([("b", 1)])
+
+
+def test_deduplicates_contents(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx1 = asset_manager.create_context("challenge1")
+    ctx2 = asset_manager.create_context("challenge2")
+    for ctx in [ctx1, ctx2]:
+        transaction = ctx.transaction()
+        transaction.add("file", 1, b"abcd")
+        transaction.commit()
+    assert ctx1.get("file").samefile(ctx2.get("file"))
+    digest = sha256(b"abcd").hexdigest()
+    assert asset_manager.blobs.get_refcount(digest) == 2
+
+    transaction = ctx1.transaction()
+    transaction.commit()
+    assert asset_manager.blobs.get_refcount(digest) == 1
+    ctx2.clear()
+    assert asset_manager.blobs.get_refcount(digest) == 0
+    assert not asset_manager.blobs.get_path(digest).exists()
+
+
+def test_update_does_not_modify_shared_contents(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx1 = asset_manager.create_context("challenge1")
+    ctx2 = asset_manager.create_context("challenge2")
+    for ctx in [ctx1, ctx2]:
+        transaction = ctx.transaction()
+        transaction.add("file", 1, b"abcd")
+        transaction.commit()
+    transaction = ctx1.transaction()
+    transaction.add("file", 2, b"efgh")
+    transaction.commit()
+    assert ctx1.get("file").read_bytes() == b"efgh"
+    assert ctx2.get("file").read_bytes() == b"abcd"
+    assert ctx1.get_mtime("file") == 2
+    assert ctx2.get_mtime("file") == 1
+
+
+def test_old_manifest(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx = asset_manager.create_context("challenge")
+    (ctx._root / "files" / "file").write_bytes(b"abcd")
+    (ctx._root / "manifest.json").write_text(json.dumps({"files": ["file"]}))
+    ctx = asset_manager.create_context("challenge")
+    assert ctx.get_mtime("file") == ctx.get("file").stat().st_mtime
+    assert ctx.get_sha256("file") == sha256(b"abcd").hexdigest()
+    transaction = ctx.transaction()
+    transaction.add("file", time.time() + 10, b"efgh")
+    transaction.commit()
+    assert ctx.get("file").read_bytes() == b"efgh"
+
+
+def test_digests(datadir: Path, am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx = asset_manager.create_context("challenge")
+    transaction = ctx.transaction()
+    transaction.add_file("file1", datadir / "file1")
+    transaction.add("file2", 1, b"abcd")
+    transaction.commit()
+    file1 = (datadir / "file1").read_bytes()
+    assert ctx.get_sha256("file1") == sha256(file1).hexdigest()
+    assert ctx.get_size("file1") == len(file1)
+    assert ctx.get_sha256("file2") == sha256(b"abcd").hexdigest()
+    assert ctx.get_size("file2") == 4
+    manifest = json.loads((ctx._root / "manifest.json").read_text())
+    assert manifest["files"]["file2"] == {
+        "mtime": 1,
+        "size": 4,
+        "sha256": sha256(b"abcd").hexdigest(),
+        "blob": sha256(b"abcd").hexdigest(),
+        "target_mtime_ns": None,
+        "target_ctime_ns": None,
+        "target_ino": None,
+    }
+    with mock.patch.object(assets, "hash_file") as hash_file:
+        ctx = asset_manager.create_context("challenge")
+        ctx.get_sha256("file1")
+        hash_file.assert_not_called()
+
+
+def test_digest_of_changed_target(tmp_path: Path, am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    target = tmp_path / "target"
+    target.write_bytes(b"abcd")
+    st = target.stat()
+    ctx = asset_manager.create_context("challenge")
+    transaction = ctx.transaction()
+    transaction.add_file("file", target)
+    transaction.commit()
+    assert ctx.get_sha256("file") == sha256(b"abcd").hexdigest()
+    # Rewrite the file with the same size, keeping its modification time (e.g.
+    # with `cp -p`)
+    target.write_bytes(b"efgh")
+    os.utime(str(target), ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert ctx.get_sha256("file") == sha256(b"efgh").hexdigest()
+    target.write_bytes(b"ijkl")
+    os.utime(str(target), ns=(st.st_atime_ns, st.st_mtime_ns))
+    ctx = asset_manager.create_context("challenge")
+    with mock.patch.object(assets, "hash_file") as hash_file:
+        # The digest was updated when the manifest was loaded
+        assert ctx.get_sha256("file") == sha256(b"ijkl").hexdigest()
+        hash_file.assert_not_called()
+
+
+def test_unchanged_contents_kept(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    ctx = asset_manager.create_context("challenge")
+    transaction = ctx.transaction()
+    transaction.add("file", 1, b"abcd")
+    transaction.commit()
+    inode = ctx.get("file").stat().st_ino
+    with mock.patch.object(asset_manager.blobs, "materialize") as materialize:
+        transaction = ctx.transaction()
+        transaction.add("file", 2, b"abcd")
+        transaction.commit()
+        materialize.assert_not_called()
+    assert ctx.get("file").stat().st_ino == inode
+    assert ctx.get_mtime("file") == 2
+    assert asset_manager.blobs.get_refcount(sha256(b"abcd").hexdigest()) == 1
+
+
+def test_commit_transactions(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+    # Every thunk waits for all the others, so this only completes if all the
+    # thunks (two per transaction) run at the same time
+    barrier = threading.Barrier(4, timeout=5)
+
+    def get_contents(contents: bytes) -> bytes:
+        barrier.wait()
+        return contents
+
+    transactions = []
+    for name in ["chall1", "chall2"]:
+        transaction = asset_manager.create_context(name).transaction()
+        for fname in ["file1", "file2"]:
+            contents = f"{name}/{fname}".encode()
+            transaction.add(fname, 1, partial(get_contents, contents))
+        transactions.append(transaction)
+    asset_manager.commit_transactions(transactions, jobs=4)
+    for name in ["chall1", "chall2"]:
+        ctx = asset_manager.create_context(name)
+        assert set(ctx.ls()) == {"file1", "file2"}
+        assert ctx.get("file2").read_bytes() == f"{name}/file2".encode()
+
+
+def test_commit_transactions_error(am_fn: assets.AssetManager) -> None:
+    asset_manager = am_fn
+
+    def fail() -> bytes:
+        raise ValueError("failed")
+
+    transaction1 = asset_manager.create_context("chall1").transaction()
+    transaction1.add("good", 1, b"good")
+    transaction1.add("bad", 1, fail)
+    transaction2 = asset_manager.create_context("chall2").transaction()
+    transaction2.add("file", 1, b"file")
+    with pytest.raises(ValueError):
+        asset_manager.commit_transactions([transaction1, transaction2], jobs=2)
+    # Assets which were created are still recorded
+    assert set(asset_manager.create_context("chall1").ls()) == {"good"}
+    assert set(asset_manager.create_context("chall2").ls()) == {"file"}
+
+
 def test_context_clear(datadir: Path, am_fn: assets.AssetManager) -> None:
     asset_manager = am_fn
     ctx = asset_manager.create_context("challenge")
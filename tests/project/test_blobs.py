@@ -0,0 +1,70 @@
+import io
+from hashlib import sha256
+from pathlib import Path
+from unittest import mock
+
+from rcds.project import blobs
+from rcds.util import JSONCache
+
+
+def test_add(tmp_path: Path) -> None:
+    store = blobs.BlobStore(tmp_path)
+    digest = store.add(io.BytesIO(b"abcd"))
+    assert digest == sha256(b"abcd").hexdigest()
+    assert store.get_path(digest).read_bytes() == b"abcd"
+    assert store.get_refcount(digest) == 1
+    assert store.add(io.BytesIO(b"abcd")) == digest
+    assert store.get_refcount(digest) == 2
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
+
+
+def test_release(tmp_path: Path) -> None:
+    store = blobs.BlobStore(tmp_path)
+    digest = store.add(io.BytesIO(b"abcd"))
+    store.add(io.BytesIO(b"abcd"))
+    store.release([digest])
+    assert store.get_path(digest).exists()
+    store = blobs.BlobStore(tmp_path)
+    assert store.get_refcount(digest) == 1
+    store.release([digest])
+    assert not store.get_path(digest).exists()
+    assert store.get_refcount(digest) == 0
+
+
+def test_open_generated(tmp_path: Path) -> None:
+    store = blobs.BlobStore(tmp_path / "blobs")
+    index = JSONCache(tmp_path / "index.json")
+    generate = mock.Mock(side_effect=lambda fd: fd.write(b"abcd"))
+    with store.open_generated(index, "key", generate) as fd:
+        assert fd.read() == b"abcd"
+        fd.seek(0)
+        digest = store.add(fd)
+    assert index.get("key") == digest
+    # Contents in the store are not generated again
+    with store.open_generated(index, "key", generate) as fd:
+        assert fd.read() == b"abcd"
+    assert generate.call_count == 1
+    store.release([digest])
+    with store.open_generated(index, "key", generate) as fd:
+        assert fd.read() == b"abcd"
+    assert generate.call_count == 2
+    # Keys whose blobs were deleted are dropped
+    with store.open_generated(index, "other", generate):
+        pass
+    assert [key for key, _ in index.items()] == ["other"]
+
+
+def test_materialize_hardlink(tmp_path: Path) -> None:
+    store = blobs.BlobStore(tmp_path / "blobs")
+    digest = store.add(io.BytesIO(b"abcd"))
+    store.materialize(digest, tmp_path / "file")
+    assert (tmp_path / "file").samefile(store.get_path(digest))
+
+
+def test_materialize_fallback(tmp_path: Path) -> None:
+    store = blobs.BlobStore(tmp_path / "blobs")
+    digest = store.add(io.BytesIO(b"abcd"))
+    with mock.patch.object(blobs.os, "link", side_effect=OSError()):
+        store.materialize(digest, tmp_path / "file")
+    assert (tmp_path / "file").read_bytes() == b"abcd"
+    assert not (tmp_path / "file").samefile(store.get_path(digest))
@@ -0,0 +1,100 @@
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+import pytest  # type: ignore
+
+import rcds
+from rcds.project import changes
+
+
+def _load_project(root: Path) -> rcds.Project:
+    project = rcds.Project(root)
+    project.load_all_challenges()
+    return project
+
+
+def _ids(challenges):
+    return sorted(c.config["id"] for c in challenges)
+
+
+def _set_mtime(path: Path, mtime: float) -> None:
+    os.utime(str(path), (mtime, mtime))
+
+
+class TestSinceTime:
+    @pytest.fixture
+    def project(self, datadir: Path) -> rcds.Project:
+        project = _load_project(datadir / "project")
+        for path in project.root.rglob("*"):
+            _set_mtime(path, 1000)
+        return project
+
+    def test_unchanged(self, project: rcds.Project) -> None:
+        assert changes.get_changed_challenges_since_time(project, 2000) == []
+
+    def test_modified(self, project: rcds.Project) -> None:
+        _set_mtime(project.root / "b" / "file.txt", 3000)
+        assert _ids(changes.get_changed_challenges_since_time(project, 2000)) == ["b"]
+
+    def test_deleted(self, project: rcds.Project) -> None:
+        (project.root / "c" / "file.txt").unlink()
+        assert _ids(changes.get_changed_challenges_since_time(project, 2000)) == ["c"]
+
+    def test_project_config(self, project: rcds.Project) -> None:
+        _set_mtime(project.root / "rcds.yml", 3000)
+        assert _ids(changes.get_changed_challenges_since_time(project, 2000)) == [
+            "a",
+            "b",
+            "c",
+        ]
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+class TestSinceRef:
+    @pytest.fixture
+    def project(self, datadir: Path) -> rcds.Project:
+        project = _load_project(datadir / "project")
+
+        def git(*args: str) -> None:
+            subprocess.run(["git", *args], cwd=str(project.root), check=True)
+
+        git("init", "-q")
+        git("add", ".")
+        git(
+            "-c",
+            "user.name=rcds",
+            "-c",
+            "user.email=rcds@example.com",
+            "commit",
+            "-q",
+            "-m",
+            "init",
+        )
+        return project
+
+    def test_changes(self, project: rcds.Project) -> None:
+        assert changes.get_changed_challenges_since_ref(project, "HEAD") == []
+        (project.root / "a" / "file.txt").write_text("changed")
+        (project.root / "c" / "new.txt").write_text("untracked")
+        assert _ids(changes.get_changed_challenges_since_ref(project, "HEAD")) == [
+            "a",
+            "c",
+        ]
+
+    def test_project_config(self, project: rcds.Project) -> None:
+        (project.root / "rcds.yml").write_text("flagFormat: flag\\{.*\\}\n")
+        assert len(changes.get_changed_challenges_since_ref(project, "HEAD")) == 3
+
+    def test_bad_ref(self, project: rcds.Project) -> None:
+        with pytest.raises(changes.ChangeDetectionError):
+            changes.get_changed_challenges_since_ref(project, "nonexistent")
+
+
+@pytest.mark.skipif(shutil.which("git") is None, reason="git is not installed")
+def test_not_a_repository(datadir: Path, monkeypatch) -> None:
+    project = _load_project(datadir / "project")
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(datadir))
+    with pytest.raises(changes.ChangeDetectionError):
+        changes.get_changed_challenges_since_ref(project, "HEAD")
@@ -0,0 +1,43 @@
+from pathlib import Path
+
+from rcds.project.journal import DeployJournal, get_digest
+from rcds.util import JSONCache
+
+
+def test_digest() -> None:
+    assert get_digest({"a": 1, "b": [2]}) == get_digest({"b": [2], "a": 1})
+    assert get_digest({"a": 1}) != get_digest({"a": 2})
+    assert get_digest("a", "b") != get_digest("ab")
+
+
+def test_journal(tmp_path: Path) -> None:
+    journal = DeployJournal(JSONCache(tmp_path / "journal.json"))
+    assert not journal.is_done("chall", "assets", "digest")
+    journal.mark_done("chall", "assets", "digest")
+    assert journal.is_done("chall", "assets", "digest")
+    assert not journal.is_done("chall", "assets", "other-digest")
+    assert not journal.is_done("chall", "scoreboard-backend", "digest")
+    assert not journal.is_done("other", "assets", "digest")
+
+
+def test_journal_persists(tmp_path: Path) -> None:
+    journal = DeployJournal(JSONCache(tmp_path / "journal.json"))
+    journal.mark_all_done("scoreboard-backend", {"a": "digest-a", "b": "digest-b"})
+    journal = DeployJournal(JSONCache(tmp_path / "journal.json"))
+    assert journal.is_done("a", "scoreboard-backend", "digest-a")
+    assert journal.is_done("b", "scoreboard-backend", "digest-b")
+    journal.clear()
+    journal = DeployJournal(JSONCache(tmp_path / "journal.json"))
+    assert not journal.is_done("a", "scoreboard-backend", "digest-a")
+
+
+def test_clear_steps(tmp_path: Path) -> None:
+    journal = DeployJournal(JSONCache(tmp_path / "journal.json"))
+    journal.mark_all_done("image:main", {"a": "digest-a", "b": "digest-b"})
+    journal.mark_done("a", "image:db", "digest-db")
+    journal.mark_done("a", "assets", "digest-assets")
+    journal.clear_steps("image:")
+    assert not journal.is_done("a", "image:main", "digest-a")
+    assert not journal.is_done("b", "image:main", "digest-b")
+    assert not journal.is_done("a", "image:db", "digest-db")
+    assert journal.is_done("a", "assets", "digest-assets")
@@ -0,0 +1,143 @@
+from pathlib import Path
+from textwrap import dedent
+from unittest import mock
+
+import pytest  # type: ignore
+
+import rcds
+from rcds.challenge.config import ConfigLoader, TargetFileNotFoundError
+from rcds.project.project import find_challenge_roots
+
+
+def _create_challenge(path: Path, config: str = "") -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    (path / "challenge.yml").write_text(
+        "name: Challenge\ndescription: Description\n" + dedent(config)
+    )
+
+
+@pytest.fixture
+def project_root(tmp_path: Path) -> Path:
+    (tmp_path / "rcds.yml").write_text("")
+    for name in ["b", "a", "cat/c", "cat/d"]:
+        _create_challenge(tmp_path / name)
+    (tmp_path / "json").mkdir()
+    (tmp_path / "json" / "challenge.json").write_text(
+        '{"name": "Challenge", "description": "Description"}'
+    )
+    # Ignored trees
+    _create_challenge(tmp_path / ".git" / "x")
+    _create_challenge(tmp_path / ".rcds-cache" / "x")
+    (tmp_path / "a" / ".dockerignore").write_text("node_modules\n")
+    _create_challenge(tmp_path / "a" / "node_modules" / "x")
+    return tmp_path
+
+
+def test_find_challenge_roots(project_root: Path) -> None:
+    roots = [
+        str(p.relative_to(project_root)) for p in find_challenge_roots(project_root)
+    ]
+    assert roots == ["a", "b", "cat/c", "cat/d", "json"]
+
+
+def test_find_challenge_roots_negated_dockerignore(project_root: Path) -> None:
+    (project_root / "a" / ".dockerignore").write_text("*\n!node_modules/x\n")
+    roots = [
+        str(p.relative_to(project_root)) for p in find_challenge_roots(project_root)
+    ]
+    assert "a/node_modules/x" in roots
+
+
+def test_find_challenge_roots_symlinks(project_root: Path, tmp_path_factory) -> None:
+    outside = tmp_path_factory.mktemp("outside")
+    _create_challenge(outside / "e")
+    (project_root / "cat" / "e").symlink_to(outside / "e", target_is_directory=True)
+    # A cycle back to the containing directory is not followed
+    (project_root / "cat" / "c" / "loop").symlink_to(
+        project_root / "cat", target_is_directory=True
+    )
+    roots = [
+        str(p.relative_to(project_root)) for p in find_challenge_roots(project_root)
+    ]
+    assert roots == ["a", "b", "cat/c", "cat/d", "cat/e", "json"]
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_load_all_challenges(project_root: Path, jobs: int) -> None:
+    project = rcds.Project(project_root)
+    project.load_all_challenges(jobs=jobs)
+    assert list(project.challenges.keys()) == [
+        Path(p) for p in ["a", "b", "cat/c", "cat/d", "json"]
+    ]
+    assert project.challenges[Path("cat/c")].config["category"] == "cat"
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_load_all_challenges_error(project_root: Path, jobs: int) -> None:
+    _create_challenge(project_root / "b", "provide: [nonexistent]\n")
+    _create_challenge(project_root / "cat/d", "provide: [other]\n")
+    project = rcds.Project(project_root)
+    with pytest.raises(TargetFileNotFoundError) as exc_info:
+        project.load_all_challenges(jobs=jobs)
+    assert exc_info.value.target == Path("nonexistent")
+
+
+def test_load_all_challenges_warnings(project_root: Path) -> None:
+    _create_challenge(project_root / "b", 'flag: "a\\nb"\n')
+    project = rcds.Project(project_root)
+    with pytest.warns(RuntimeWarning, match="multiple lines"):
+        project.load_all_challenges(jobs=2)
+
+
+def _load_configs(project_root: Path):
+    project = rcds.Project(project_root)
+    project.load_all_challenges()
+    return {str(k): v.config for k, v in project.challenges.items()}
+
+
+def test_config_cache(project_root: Path) -> None:
+    _create_challenge(project_root / "b", "flag:\n  file: flag.txt\n")
+    (project_root / "b" / "flag.txt").write_text("flag{one}\n")
+    first = _load_configs(project_root)
+    assert first["b"]["flag"] == "flag{one}"
+
+    with mock.patch.object(
+        ConfigLoader, "parse_config", side_effect=AssertionError
+    ) as parse_config:
+        assert _load_configs(project_root) == first
+    parse_config.assert_not_called()
+
+    # Changes to the config, or to files read into it, are picked up
+    (project_root / "b" / "flag.txt").write_text("flag{two}\n")
+    _create_challenge(project_root / "a", "name: Renamed\n")
+    with mock.patch.object(
+        ConfigLoader,
+        "parse_config",
+        autospec=True,
+        side_effect=ConfigLoader.parse_config,
+    ) as parse_config:
+        second = _load_configs(project_root)
+    assert second["b"]["flag"] == "flag{two}"
+    assert second["a"]["name"] == "Renamed"
+    assert parse_config.call_count == 2
+
+
+def test_config_cache_project_config(project_root: Path) -> None:
+    first = _load_configs(project_root)
+    assert "value" not in first["a"]
+    (project_root / "rcds.yml").write_text("defaults:\n  value: 100\n")
+    assert _load_configs(project_root)["a"]["value"] == 100
+
+
+def test_config_cache_not_modified(project_root: Path) -> None:
+    project = rcds.Project(project_root)
+    project.load_all_challenges()
+    project.challenges[Path("a")].config["name"] = "Modified"
+    assert _load_configs(project_root)["a"]["name"] == "Challenge"
+
+
+def test_config_cache_warnings(project_root: Path) -> None:
+    _create_challenge(project_root / "b", 'flag: "a\\nb"\n')
+    for _ in range(2):
+        with pytest.warns(RuntimeWarning, match="multiple lines"):
+            _load_configs(project_root)
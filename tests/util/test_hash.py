@@ -0,0 +1,18 @@
+from hashlib import sha256
+from pathlib import Path
+
+from rcds.util import hash_file
+
+
+def test_hash_file(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    # Larger than one chunk
+    contents = bytes(range(256)) * 8192
+    path.write_bytes(contents)
+    assert hash_file(path) == sha256(contents).hexdigest()
+
+
+def test_hash_empty_file(tmp_path: Path) -> None:
+    path = tmp_path / "file"
+    path.write_bytes(b"")
+    assert hash_file(path) == sha256(b"").hexdigest()
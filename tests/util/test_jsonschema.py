@@ -0,0 +1,149 @@
+import gc
+import weakref
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict
+
+import jsonschema  # type: ignore
+import pytest  # type: ignore
+
+from rcds.backend import BackendBase
+from rcds.challenge.config import config_schema, get_config_schema
+from rcds.project.config import config_schema_validator as project_validator
+from rcds.util import load_any
+from rcds.util.jsonschema import (
+    CompiledValidator,
+    DefaultValidatingDraft7Validator,
+    fastjsonschema,
+    get_validator,
+)
+
+project_config_schema = project_validator.schema
+
+repo_root = Path(__file__).parent.parent.parent
+
+
+def _find_files(name: str):
+    return sorted(
+        f
+        for d in ["example", "tests"]
+        for ext in ["yml", "yaml"]
+        for f in (repo_root / d).rglob(f"{name}.{ext}")
+    )
+
+
+challenge_files = _find_files("challenge")
+project_files = _find_files("rcds")
+synthetic_configs = [
+    {"name": "a", "description": "b", "flag": {"file": "flag.txt"}, "value": 1},
+    {
+        "name": "a",
+        "description": "b",
+        "containers": {
+            "main": {"build": {"context": ".", "args": {"a": "b"}}, "ports": [1]},
+            "db": {
+                "image": "postgres",
+                "ports": [5432],
+                "resources": {"limits": {"cpu": "100m", "memory": "1Gi"}},
+            },
+        },
+        "expose": {"main": [{"target": 1, "tcp": 30000}, {"target": 1, "http": "x"}]},
+    },
+    {"name": "a", "description": "b", "containers": {"main": {"ports": ["1"]}}},
+    {"name": 1, "flag": {"regex": "a", "file": "b"}},
+]
+
+
+def _check_parity(schema: Dict[str, Any], config: Dict[str, Any]) -> None:
+    expected_config = deepcopy(config)
+    expected = [
+        e.message
+        for e in DefaultValidatingDraft7Validator(
+            schema, format_checker=jsonschema.draft7_format_checker
+        ).iter_errors(expected_config)
+    ]
+    got_config = deepcopy(config)
+    got = [e.message for e in CompiledValidator(schema).iter_errors(got_config)]
+    assert got == expected
+    assert got_config == expected_config
+    # Instances accepted by the compiled code are not checked again by jsonschema, so
+    # the two must agree on which instances are valid
+    compiled = CompiledValidator(schema)._get_compiled()
+    if compiled is not None:
+        try:
+            compiled(deepcopy(config))
+            compiled_valid = True
+        except fastjsonschema.JsonSchemaException:
+            compiled_valid = False
+        assert compiled_valid == (len(expected) == 0)
+
+
+@pytest.mark.parametrize(
+    "challenge_file", challenge_files, ids=lambda f: str(f.relative_to(repo_root))
+)
+def test_parity(challenge_file: Path) -> None:
+    _check_parity(config_schema, load_any(challenge_file))
+
+
+@pytest.mark.parametrize(
+    "project_file", project_files, ids=lambda f: str(f.relative_to(repo_root))
+)
+def test_parity_project(project_file: Path) -> None:
+    _check_parity(project_config_schema, load_any(project_file))
+
+
+@pytest.mark.parametrize("config", synthetic_configs)
+def test_parity_synthetic(config: Dict[str, Any]) -> None:
+    _check_parity(config_schema, config)
+
+
+def test_compiled() -> None:
+    pytest.importorskip("fastjsonschema")
+    validator = CompiledValidator(config_schema)
+    assert validator.is_valid(deepcopy(synthetic_configs[1]))
+    assert validator._compiled is not None
+
+
+def test_rejected_instance_not_modified() -> None:
+    pytest.importorskip("fastjsonschema")
+    validator = CompiledValidator(config_schema)
+
+    def compiled(instance: Dict[str, Any]) -> None:
+        instance["value"] = 100
+        raise fastjsonschema.JsonSchemaException("rejected")
+
+    validator._compiled = compiled
+    validator._compile_attempted = True
+    config = deepcopy(synthetic_configs[1])
+    expected_config = deepcopy(config)
+    DefaultValidatingDraft7Validator(
+        config_schema, format_checker=jsonschema.draft7_format_checker
+    ).validate(expected_config)
+    # The instance is validated by jsonschema as if the compiled code had not run
+    assert validator.is_valid(config)
+    assert config == expected_config
+
+
+def test_memoized() -> None:
+    assert get_validator(get_config_schema(())) is get_validator(get_config_schema(()))
+
+
+def test_config_schema_patches() -> None:
+    class Backend(BackendBase):
+        max_points = 100
+
+        def patch_challenge_schema(self, schema: Dict[str, Any]) -> None:
+            schema["properties"]["value"]["maximum"] = self.max_points
+
+    backend = Backend()
+    schema = get_config_schema([backend])
+    assert schema["properties"]["value"]["maximum"] == 100
+    assert "maximum" not in config_schema["properties"]["value"]
+    # Changes to a backend's patches are seen
+    backend.max_points = 200
+    assert get_config_schema([backend])["properties"]["value"]["maximum"] == 200
+    # Backends are not kept alive
+    backend_ref = weakref.ref(backend)
+    del backend
+    gc.collect()
+    assert backend_ref() is None
@@ -0,0 +1,34 @@
+from pathlib import Path
+
+import pytest  # type: ignore
+import yaml
+
+from rcds.util import yaml as rcds_yaml
+
+repo_root = Path(__file__).parent.parent.parent
+yaml_files = sorted(
+    f
+    for d in ["example", "tests", "rcds"]
+    for ext in ["yml", "yaml"]
+    for f in (repo_root / d).rglob(f"*.{ext}")
+    if "templates" not in f.parts
+)
+
+
+def test_found_files() -> None:
+    assert len(yaml_files) > 0
+
+
+@pytest.mark.parametrize(
+    "yaml_file", yaml_files, ids=lambda f: str(f.relative_to(repo_root))
+)
+def test_parity(yaml_file: Path) -> None:
+    text = yaml_file.read_text()
+    expected = yaml.load(text, Loader=yaml.SafeLoader)
+    assert rcds_yaml.safe_load(text) == expected
+    assert list(rcds_yaml.safe_load_all(text)) == list(
+        yaml.load_all(text, Loader=yaml.SafeLoader)
+    )
+    if isinstance(expected, (dict, list)):
+        # libyaml omits the document end marker (`...`) after a bare scalar
+        assert rcds_yaml.safe_dump(expected) == yaml.dump(expected)